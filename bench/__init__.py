@@ -0,0 +1,3 @@
+"""
+Rerunnable benchmarks for the bot's hot paths (run from the repo root with python -m bench.<name>)
+"""
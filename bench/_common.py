@@ -0,0 +1,46 @@
+"""
+Shared helpers for the benchmarks
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """
+    Run a benchmark in a throwaway directory holding a copy of config/
+
+    The cogs read config/settings.json and db/ by relative path, so this keeps
+    benchmark databases away from the real ones.
+    
+    Yields:
+        Path of the scratch directory (also the working directory)
+    """
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench-") as path:
+        shutil.copytree(os.path.join(REPO_ROOT, "config"), os.path.join(path, "config"))
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(previous)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    
+    Args:
+        sorted_values: Values in ascending order
+        fraction: Percentile as a fraction (0.99 for p99)
+    
+    Returns:
+        The value at that rank
+    """
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
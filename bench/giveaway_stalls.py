@@ -0,0 +1,171 @@
+"""
+Event-loop stalls while giveaways end under load
+
+Several level-weighted giveaways with many entrants end at the same time while
+a burst of buffered reactions is flushed. A heartbeat task sleeping in short
+steps records how late it wakes up, which is how long the loop was blocked.
+
+    python -m bench.giveaway_stalls
+    python -m bench.giveaway_stalls --entrants 20000 --giveaways 2
+
+To compare with an older cog, extract it and pass it with --cog, e.g.
+
+    git show 219f6b7~1:commands/giveaway.py > /tmp/giveaway_old.py
+    python -m bench.giveaway_stalls --cog /tmp/giveaway_old.py
+"""
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import random
+import sqlite3
+import time
+
+from bench._common import percentile, scratch_dir
+from utils.database import init_databases
+
+
+HEARTBEAT_SECONDS = 0.005
+
+
+class _Message:
+    async def edit(self, **kwargs):
+        pass
+
+
+class _Channel:
+    def get_partial_message(self, message_id):
+        return _Message()
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class _Bot:
+    """Just enough of commands.Bot for a giveaway to end; no guild means no DMs or role checks"""
+
+    def get_guild(self, guild_id):
+        return None
+
+    def get_channel(self, channel_id):
+        return _Channel()
+
+
+def _load_cog_module(path):
+    if path is None:
+        import commands.giveaway as module
+        return module
+
+    spec = importlib.util.spec_from_file_location("giveaway_under_test", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def _seed(giveaways, entrants):
+    """Fill giveaway.db and levels.db with ended-but-undrawn giveaways and their entrants"""
+    user_ids = random.sample(range(10**17, 10**18), entrants)
+
+    con = sqlite3.connect("db/giveaway.db")
+    for message_id in range(1, giveaways + 1):
+        con.execute(
+            "INSERT INTO giveaways (guild_id, message_id, channel_id, end_timestamp, required_invites, prize, "
+            "winner_count, weight_by, min_level, required_role_id, min_account_age_days) "
+            "VALUES (1, ?, 5, ?, 0, 'bench', 3, 'level', 1, NULL, 0)",
+            (message_id, 2**40)
+        )
+        con.executemany(
+            "INSERT INTO entries (giveaway_message_id, user_id) VALUES (?, ?)",
+            [(message_id, user_id) for user_id in user_ids]
+        )
+    con.commit()
+    con.close()
+
+    levels = sqlite3.connect("db/levels.db")
+    levels.executemany(
+        "INSERT INTO users (user_id, guild_id, level, xp) VALUES (?, 1, ?, 0)",
+        [(user_id, random.randint(0, 10)) for user_id in user_ids]
+    )
+    levels.commit()
+    levels.close()
+
+
+async def _fetch_giveaway(cog, message_id):
+    query = "SELECT * FROM giveaways WHERE message_id = ?"
+    if isinstance(cog.con, sqlite3.Connection):
+        return cog.con.execute(query, (message_id,)).fetchone()
+    async with cog.con.execute(query, (message_id,)) as cursor:
+        return await cursor.fetchone()
+
+
+async def run(module, giveaways, entrants, reactions):
+    with open("config/settings.json", encoding="utf-8") as f:
+        await init_databases(json.load(f)["database"])
+    _seed(giveaways, entrants)
+
+    cog = module.GiveawayCog(_Bot())
+    await _maybe_await(cog.cog_load())
+
+    lags = []
+    stopped = False
+
+    async def heartbeat():
+        while not stopped:
+            started = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            lags.append(time.perf_counter() - started - HEARTBEAT_SECONDS)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.05)
+
+    message_ids = range(1, giveaways + 1)
+    for message_id in message_ids:
+        cog.active_giveaways.add(message_id)
+    for _ in range(reactions):
+        cog.pending_entries[(giveaways + 1, random.randint(1, 10**9))] = True
+
+    async def end(message_id):
+        gw = await _fetch_giveaway(cog, message_id)
+        await _maybe_await(cog._end_giveaway_task(cog._giveaway_data(gw)))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        _maybe_await(cog._flush_pending_entries()),
+        *(end(message_id) for message_id in message_ids)
+    )
+    total = time.perf_counter() - started
+
+    stopped = True
+    await beat
+    await _maybe_await(cog.cog_unload())
+
+    lags.sort()
+    print(
+        f"{giveaways} giveaways x {entrants} entrants, {reactions} reactions: total {total:.2f} s, "
+        f"{len(lags)} heartbeats, longest stall {lags[-1] * 1000:.0f} ms, "
+        f"p99 {percentile(lags, 0.99) * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--giveaways", type=int, default=3)
+    parser.add_argument("--entrants", type=int, default=100_000)
+    parser.add_argument("--reactions", type=int, default=20_000)
+    parser.add_argument("--cog", help="path to an alternative commands/giveaway.py to measure")
+    args = parser.parse_args()
+
+    module = _load_cog_module(args.cog)
+    with scratch_dir():
+        asyncio.run(run(module, args.giveaways, args.entrants, args.reactions))
+
+
+if __name__ == "__main__":
+    main()
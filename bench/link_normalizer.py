@@ -0,0 +1,109 @@
+"""
+Link normalizer and anti-link matcher throughput
+
+Times normalize_link_text alone and AntiLink.is_link (normalize plus the
+compiled invite, blocked-domain and link patterns) over a corpus of chat
+messages. The default corpus is generated from a fixed seed and mixes plain
+chat with obfuscated invites and links; pass --corpus to use real messages
+instead (one per line).
+
+    python -m bench.link_normalizer
+    python -m bench.link_normalizer --corpus messages.txt --repeat 5
+"""
+import argparse
+import random
+import time
+
+from bench._common import scratch_dir
+from commands.antilink import AntiLink
+from utils.link_normalizer import normalize_link_text
+
+
+CLEAN_MESSAGES = [
+    "gg everyone, that was a close one",
+    "see you on discord. GG everyone",
+    "That was fun. Me and him should play again.",
+    "can someone help me with the ticket form? it says the subject is too short",
+    "**bold** and __underlined__ text with `code` and ||spoilers||",
+    "lol 😂😂 nice one",
+    "I reported it to discordapp. Com support said no",
+    "the meeting is at 5.30 tomorrow, bring the notes from 2.1 and 2.2",
+]
+
+OBFUSCATED_LINKS = [
+    "discord . gg/{code}",
+    "discord dot gg/{code}",
+    "DISCORD[DOT]GG/{code}",
+    "ｄｉｓｃｏｒｄ．ｇｇ/{code}",
+    "dis​cord.gg/{code}",
+    "join us: discord.com/invite/{code}",
+    "HXXPS://free-nitro{code}.com/claim",
+    "[click here](https://evil{code}.xyz/login)",
+    "https://example.com/{code}",
+]
+
+
+def generated_corpus(size, seed=26, link_ratio=0.2):
+    """
+    Build a reproducible mix of clean chat and obfuscated links
+
+    Args:
+        size: Number of messages
+        seed: Random seed
+        link_ratio: Fraction of messages carrying a (possibly obfuscated) link
+
+    Returns:
+        List of message strings
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        message = rng.choice(CLEAN_MESSAGES)
+        if rng.random() < link_ratio:
+            code = "".join(rng.choice("abcdefghijkLMNOP0123") for _ in range(8))
+            message = f"{message} {rng.choice(OBFUSCATED_LINKS).format(code=code)}"
+        corpus.append(message)
+    return corpus
+
+
+def _time_per_message(function, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in corpus:
+            function(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", help="file with one message per line (default: generated)")
+    parser.add_argument("--size", type=int, default=20_000, help="size of the generated corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best one is reported")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        corpus = generated_corpus(args.size)
+
+    # AntiLink reads config/settings.json by relative path
+    with scratch_dir():
+        antilink = AntiLink(bot=None)
+
+    flagged = sum(antilink.is_link(message) is not None for message in corpus)
+    normalize = _time_per_message(normalize_link_text, corpus, args.repeat)
+    is_link = _time_per_message(antilink.is_link, corpus, args.repeat)
+
+    print(
+        f"{len(corpus)} messages ({flagged} flagged): "
+        f"normalize_link_text {normalize * 1e6:.1f} us/message, "
+        f"AntiLink.is_link {is_link * 1e6:.1f} us/message "
+        f"({1 / is_link:,.0f} messages/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Ticket creation latency and REST calls, channel mode vs thread mode
+
+Drives TicketFormModal.on_submit against a simulated guild whose REST routes
+sleep for a modelled latency (with +-20 % jitter) and count their calls, so
+the two ticket modes can be compared without a live Discord connection.
+
+    python -m bench.ticket_modes
+    python -m bench.ticket_modes --tickets 1 40 300 --modes thread
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import random
+import statistics
+import time
+import types
+
+import discord
+
+from bench._common import percentile, scratch_dir
+from commands import ticket as ticket_module
+from utils.database import init_databases
+
+
+# Modelled REST latency per route, in seconds
+REST_LATENCY = {
+    "create_channel": 0.30,
+    "create_category": 0.30,
+    "create_thread": 0.15,
+    "message": 0.12,
+    "thread_member": 0.10,
+    "followup": 0.12,
+}
+
+
+class _Rest:
+    def __init__(self):
+        self.calls = {route: 0 for route in REST_LATENCY}
+
+    async def __call__(self, route):
+        self.calls[route] += 1
+        await asyncio.sleep(REST_LATENCY[route] * random.uniform(0.8, 1.2))
+
+
+class _Category(discord.CategoryChannel):
+    def __init__(self, guild, name, position):
+        self.id = next(guild.ids)
+        self.name = name
+        self.guild = guild
+        self.position = position
+        self.category_id = None
+
+    @property
+    def overwrites(self):
+        return {}
+
+    @property
+    def channels(self):
+        return [c for c in self.guild.channels if c.category_id == self.id]
+
+    @property
+    def text_channels(self):
+        return self.channels
+
+
+class _Channel:
+    """A ticket channel or thread; only the calls the creation path makes"""
+
+    def __init__(self, guild, name, category_id):
+        self.id = next(guild.ids)
+        self.name = name
+        self.guild = guild
+        self.category_id = category_id
+        self.mention = f"<#{self.id}>"
+
+    async def send(self, *args, **kwargs):
+        await self.guild.rest("message")
+
+    async def add_user(self, user):
+        await self.guild.rest("thread_member")
+
+
+class _Parent(discord.TextChannel):
+    def __init__(self, guild):
+        self.id = next(guild.ids)
+        self.guild = guild
+        self.category_id = None
+        self.name = "tickets"
+
+    async def create_thread(self, **kwargs):
+        await self.guild.rest("create_thread")
+        return _Channel(self.guild, kwargs["name"], None)
+
+
+class _User:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+    def __hash__(self):
+        return self.id
+
+    def __eq__(self, other):
+        return getattr(other, "id", None) == self.id
+
+    def __str__(self):
+        return self.name
+
+
+class _Guild:
+    def __init__(self, rest):
+        self.id = 1
+        self.ids = itertools.count(10**17)
+        self.rest = rest
+        self.channels = []
+        self.me = _User(999)
+        self.default_role = object()
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+    def get_role(self, role_id):
+        return None
+
+    @property
+    def categories(self):
+        return [c for c in self.channels if isinstance(c, _Category)]
+
+    async def create_text_channel(self, name, category, overwrites, reason):
+        await self.rest("create_channel")
+        channel = _Channel(self, name, category.id)
+        self.channels.append(channel)
+        return channel
+
+    async def create_category(self, name, overwrites, position, reason):
+        await self.rest("create_category")
+        category = _Category(self, name, position)
+        self.channels.append(category)
+        return category
+
+
+async def run(mode, tickets):
+    rest = _Rest()
+    guild = _Guild(rest)
+    base = _Category(guild, "Tickets", 3)
+    parent = _Parent(guild)
+    guild.channels += [base, parent]
+
+    # The cog reads its settings once on construction, so point the scratch copy at the simulated guild
+    with open("config/settings.json", encoding="utf-8") as f:
+        config = json.load(f)
+    config["categories"]["ticket_category_id"] = base.id
+    config["channels"]["ticket_channel_id"] = parent.id
+    config["features"]["ticket"]["mode"] = mode
+    with open("config/settings.json", "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    await init_databases(config["database"])
+
+    cog = ticket_module.TicketSystem(types.SimpleNamespace(get_channel=guild.get_channel, guilds=[guild]))
+    await cog.cog_load()
+
+    latencies = []
+
+    async def submit(user_id):
+        async def send(content, **kwargs):
+            if content.startswith("✅"):
+                await rest("followup")
+
+        async def defer(**kwargs):
+            pass
+
+        interaction = types.SimpleNamespace(
+            guild=guild, guild_id=guild.id, user=_User(user_id), channel=parent,
+            response=types.SimpleNamespace(defer=defer, send_message=send),
+            followup=types.SimpleNamespace(send=send)
+        )
+        modal = ticket_module.TicketFormModal(cog)
+        for field in (modal.name, modal.subject, modal.description):
+            field._value = "benchmark ticket"
+
+        started = time.perf_counter()
+        await modal.on_submit(interaction)
+        latencies.append(time.perf_counter() - started)
+
+    # The cog logs every ticket it opens
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(submit(user_id) for user_id in range(1, tickets + 1)))
+        await cog.cog_unload()
+
+    latencies.sort()
+    total_calls = sum(rest.calls.values())
+    used = {route: count for route, count in rest.calls.items() if count}
+    print(
+        f"{mode:7} x{tickets:<4} median {statistics.median(latencies) * 1000:.0f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms  "
+        f"REST {total_calls} ({total_calls / tickets:.2f}/ticket) {used}  "
+        f"guild channels used: {len(guild.channels) - 2}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tickets", type=int, nargs="+", default=[1, 40, 300],
+                        help="numbers of tickets submitted at once")
+    parser.add_argument("--modes", nargs="+", choices=["channel", "thread"], default=["channel", "thread"])
+    args = parser.parse_args()
+
+    for tickets in args.tickets:
+        for mode in args.modes:
+            with scratch_dir():
+                asyncio.run(run(mode, tickets))
+
+
+if __name__ == "__main__":
+    main()
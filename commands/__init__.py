@@ -6,6 +6,7 @@ __all__ = [
     'leveling',
     'antispam',
     'antilink',
+    'automod',
     'giveaway',
     'utility'
 ]
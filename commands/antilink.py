@@ -8,7 +8,9 @@ from discord.ext import commands
 from datetime import timedelta
 import re
 import json
-from utils import create_embed
+from utils import create_embed, normalize_link_text, collect_message_text
+from utils.message_cache import EditDedupeCache, message_from_edit_payload
+from utils.automod_sync import sync_antilink_automod
 
 
 def get_config():
@@ -22,8 +24,6 @@ class AntiLink(commands.Cog):
     
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.config = get_config()
-        self.antilink_config = self.config['features'].get('antilink', {})
         
         # Discord invite patterns
         self.discord_invite_patterns = [
@@ -32,12 +32,31 @@ class AntiLink(commands.Cog):
             r'discordapp\.com/invite/[\w]+',
             r'https?://(?:www\.)?(?:discord\.gg|discordapp\.com/invite|discord\.com/invite)/[\w]+'
         ]
+        self.load_antilink_config()
+        
+        # Content hashes of recent messages, so embed-only edits are not rescanned
+        self.edit_cache = EditDedupeCache()
+    
+    def load_antilink_config(self):
+        """Read the anti-link settings and compile the patterns built from them"""
+        self.config = get_config()
+        self.antilink_config = self.config['features'].get('antilink', {})
         
         self.blocked_domains = self.antilink_config.get('blocked_domains', [
             'discord.gg',
             'discordapp.com',
             'discord.com/invite'
         ])
+        
+        # Patterns run against normalized (lowercase) text, so compile them once per config load
+        self.invite_regex = re.compile('|'.join(self.discord_invite_patterns))
+        blocked_terms = self.blocked_domains + [
+            keyword.strip('*') for keyword in self.antilink_config.get('blocked_keywords', [])
+        ]
+        self.blocked_domain_regex = re.compile(
+            '|'.join(re.escape(term.lower()) for term in blocked_terms if term)
+        ) if any(blocked_terms) else None
+        self.link_regex = re.compile(r'https?://[\w\-\.]+')
     
     @commands.Cog.listener()
     async def on_ready(self):
@@ -47,16 +66,23 @@ class AntiLink(commands.Cog):
         """
         Check if message contains links
         
+        Obfuscated spellings (``discord . gg``, ``hxxps://``, fullwidth
+        characters, zero-width joiners, masked links) are normalized first.
+        
         Returns:
             Type of link found or None
         """
+        normalized = normalize_link_text(message_content)
+        
         # Check for Discord invites first
-        for pattern in self.discord_invite_patterns:
-            if re.search(pattern, message_content, re.IGNORECASE):
-                return "discord_invite"
+        if self.invite_regex.search(normalized):
+            return "discord_invite"
         
-        # Check for other links
-        if re.search(r'https?://[\w\-\.]+', message_content, re.IGNORECASE):
+        # Check for blocked domains and other links
+        if self.blocked_domain_regex and self.blocked_domain_regex.search(normalized):
+            return "link"
+        
+        if self.link_regex.search(normalized):
             return "link"
         
         return None
@@ -82,6 +108,28 @@ class AntiLink(commands.Cog):
         if message.author.bot or not message.guild:
             return
         
+        self.edit_cache.remember(message.id, message.content)
+        await self.check_message(message)
+    
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Rescan edited messages whose text changed"""
+        if payload.guild_id is None:
+            return
+        
+        # Embed-only updates carry no content, or the same content as before
+        content = payload.data.get('content')
+        if content is None or not self.edit_cache.changed(payload.message_id, content):
+            return
+        
+        message = message_from_edit_payload(self.bot, payload)
+        if message is None or message.author.bot:
+            return
+        
+        await self.check_message(message)
+    
+    async def check_message(self, message: discord.Message):
+        """Check a guild message for links and punish the author"""
         # Skip if anti-link is disabled
         if not self.antilink_config.get('enabled', True):
             return
@@ -95,8 +143,8 @@ class AntiLink(commands.Cog):
             if message.author.guild_permissions.administrator:
                 return
         
-        # Check for links
-        link_type = self.is_link(message.content)
+        # Check for links in content, embed URLs and attachment filenames
+        link_type = self.is_link(collect_message_text(message))
         
         if not link_type:
             return
@@ -246,6 +294,49 @@ class AntiLink(commands.Cog):
             color=discord.Color.blue()
         )
         await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @app_commands.command(name="antilink_automod_sync", description="Push anti-link rules to Discord AutoMod")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def automod_sync(self, interaction: discord.Interaction):
+        """Sync blocked domains and keywords to native AutoMod rules"""
+        await interaction.response.defer(ephemeral=True)
+        
+        # Re-read the config so whitelist and blocked-domain changes apply here and to the local filter
+        self.load_antilink_config()
+        
+        try:
+            result = await sync_antilink_automod(
+                interaction.guild,
+                self.antilink_config,
+                reason=f"Anti-link sync by {interaction.user}"
+            )
+        except discord.Forbidden:
+            embed = create_embed(
+                description="❌ I need the **Manage Server** permission to manage AutoMod rules.",
+                color=discord.Color.red()
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+        except discord.HTTPException as e:
+            embed = create_embed(
+                description=f"❌ AutoMod sync failed: {str(e)[:100]}",
+                color=discord.Color.red()
+            )
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            return
+        
+        embed = create_embed(
+            title="AutoMod Sync Complete",
+            description="Blocked links are now enforced by Discord before messages reach the bot.",
+            color=discord.Color.green(),
+            fields=[
+                ("Created", str(result['created']), True),
+                ("Updated", str(result['updated']), True),
+                ("Deleted", str(result['deleted']), True),
+                ("Unchanged", str(result['unchanged']), True)
+            ]
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 async def setup(bot: commands.Bot):
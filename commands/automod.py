@@ -0,0 +1,314 @@
+"""
+Automod Rule Engine Cog
+Evaluates declarative per-guild rules with one compiled pass per message
+"""
+import discord
+from discord import app_commands
+from discord.ext import commands
+from datetime import timedelta
+import json
+from utils import create_embed
+from utils.message_cache import EditDedupeCache, message_from_edit_payload
+from utils.rule_engine import compile_guild_rules, validate_rule
+
+
+def get_config():
+    """Load configuration"""
+    with open("config/settings.json", "r") as f:
+        return json.load(f)
+
+
+class AutoModRules(commands.GroupCog, name="automod"):
+    """Declarative automod rules compiled into one evaluator per guild"""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.automod_config = get_config()['features'].get('automod', {})
+        self.evaluators = {}
+        self.rule_stats = {}
+        self.edit_cache = EditDedupeCache()
+        self.compile_all()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        print("✓ Automod rule engine loaded successfully")
+
+    def compile_all(self):
+        """Compile every guild's rules, skipping guilds with invalid rules"""
+        evaluators = {}
+        for guild_id, rules in self.automod_config.get('guilds', {}).items():
+            if not rules:
+                continue
+            try:
+                stats = self.rule_stats.setdefault(int(guild_id), {})
+                evaluators[int(guild_id)] = compile_guild_rules(rules, stats)
+            except ValueError as e:
+                print(f"[AUTOMOD] Invalid rules for guild {guild_id}: {e}")
+        self.evaluators = evaluators
+
+    def _save_guild_rules(self, guild_id: int, rules: list):
+        """Persist a guild's rules to settings.json and recompile"""
+        config = get_config()
+        automod = config['features'].setdefault('automod', {})
+        automod.setdefault('guilds', {})[str(guild_id)] = rules
+
+        with open("config/settings.json", "w") as f:
+            json.dump(config, f, indent=2)
+
+        self.automod_config = automod
+        self.compile_all()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Evaluate automod rules for new messages"""
+        if message.author.bot or not message.guild:
+            return
+
+        self.edit_cache.remember(message.id, message.content)
+        await self.check_message(message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Evaluate automod rules for edits that change the message text"""
+        if payload.guild_id not in self.evaluators:
+            return
+
+        content = payload.data.get('content')
+        if content is None or not self.edit_cache.changed(payload.message_id, content):
+            return
+
+        message = message_from_edit_payload(self.bot, payload)
+        if message is None or message.author.bot:
+            return
+
+        await self.check_message(message)
+
+    async def check_message(self, message: discord.Message):
+        """Run the guild's compiled evaluator and apply the matching rule's actions"""
+        if not self.automod_config.get('enabled', True):
+            return
+
+        evaluate = self.evaluators.get(message.guild.id)
+        if evaluate is None:
+            return
+
+        if isinstance(message.author, discord.Member) and message.author.guild_permissions.administrator:
+            return
+
+        rule = evaluate(message)
+        if rule is None:
+            return
+
+        await self.apply_actions(rule, message)
+
+    async def apply_actions(self, rule, message: discord.Message):
+        """Apply a rule's actions to the offending message and author"""
+        try:
+            if "delete" in rule.actions:
+                await message.delete()
+
+            if "timeout" in rule.actions and isinstance(message.author, discord.Member):
+                await message.author.timeout(timedelta(minutes=rule.timeout_minutes), reason=rule.reason)
+
+            if "kick" in rule.actions and isinstance(message.author, discord.Member):
+                await message.author.kick(reason=rule.reason)
+        except discord.NotFound:
+            pass  # Message already deleted
+        except discord.Forbidden:
+            print(f"[AUTOMOD] Missing permissions to apply rule '{rule.name}' to {message.author}")
+        except discord.HTTPException as e:
+            print(f"[AUTOMOD] Error applying rule '{rule.name}': {e}")
+
+        if "log" in rule.actions:
+            await self.log_match(rule, message)
+
+    async def log_match(self, rule, message: discord.Message):
+        """Send a rule match to the configured log channel"""
+        log_channel_id = self.automod_config.get('log_channel_id')
+        log_channel = message.guild.get_channel(log_channel_id) if log_channel_id else None
+        if log_channel is None:
+            return
+
+        embed = create_embed(
+            title="🛡️ Automod Rule Matched",
+            description=(
+                f"**Rule:** {rule.name}\n"
+                f"**User:** {message.author.mention}\n"
+                f"**Channel:** {message.channel.mention}\n"
+                f"**Actions:** {', '.join(rule.actions)}"
+            ),
+            color=discord.Color.orange()
+        )
+        if message.content:
+            embed.add_field(name="Content", value=message.content[:1024], inline=False)
+
+        try:
+            await log_channel.send(embed=embed)
+        except discord.HTTPException as e:
+            print(f"[AUTOMOD] Error logging rule match: {e}")
+
+    @app_commands.command(name="add", description="Add or replace an automod rule (JSON)")
+    @app_commands.describe(rule="Rule definition as JSON, e.g. {\"name\": ..., \"conditions\": {...}, \"actions\": [...]}")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def add_rule(self, interaction: discord.Interaction, rule: str):
+        """Add or replace an automod rule"""
+        try:
+            spec = json.loads(rule)
+            validate_rule(spec)
+        except (json.JSONDecodeError, ValueError) as e:
+            embed = create_embed(
+                title="❌ Invalid rule",
+                description=str(e)[:1000],
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        rules = [
+            r for r in self.automod_config.get('guilds', {}).get(str(interaction.guild.id), [])
+            if r.get('name') != spec['name']
+        ]
+        rules.append(spec)
+        self.rule_stats.get(interaction.guild.id, {}).pop(spec['name'], None)
+        self._save_guild_rules(interaction.guild.id, rules)
+
+        embed = create_embed(
+            description=f"✅ Rule **{spec['name']}** saved ({len(rules)} rule(s) active).",
+            color=discord.Color.green()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="remove", description="Remove an automod rule")
+    @app_commands.describe(name="Name of the rule to remove")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def remove_rule(self, interaction: discord.Interaction, name: str):
+        """Remove an automod rule"""
+        current = self.automod_config.get('guilds', {}).get(str(interaction.guild.id), [])
+        rules = [r for r in current if r.get('name') != name]
+
+        if len(rules) == len(current):
+            embed = create_embed(
+                description=f"❌ No rule named **{name}**.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        self.rule_stats.get(interaction.guild.id, {}).pop(name, None)
+        self._save_guild_rules(interaction.guild.id, rules)
+
+        embed = create_embed(
+            description=f"✅ Rule **{name}** removed.",
+            color=discord.Color.green()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="rules", description="List automod rules")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def list_rules(self, interaction: discord.Interaction):
+        """List this server's automod rules in evaluation order"""
+        rules = self.automod_config.get('guilds', {}).get(str(interaction.guild.id), [])
+
+        if not rules:
+            embed = create_embed(
+                description="No automod rules are configured.",
+                color=discord.Color.blue()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        lines = [
+            f"**{i}.** `{r['name']}` [{r.get('mode', 'enforce')}] — "
+            f"{', '.join(r.get('conditions', {}))} → {', '.join(r.get('actions', []))}"
+            for i, r in enumerate(rules, start=1)
+        ]
+        embed = create_embed(
+            title="Automod Rules",
+            description="\n".join(lines)[:4000],
+            color=discord.Color.blue()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="mode", description="Switch a rule between shadow (dry-run) and enforce")
+    @app_commands.describe(name="Name of the rule", mode="shadow only records hits; enforce applies actions")
+    @app_commands.choices(mode=[
+        app_commands.Choice(name="shadow", value="shadow"),
+        app_commands.Choice(name="enforce", value="enforce")
+    ])
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_mode(self, interaction: discord.Interaction, name: str, mode: app_commands.Choice[str]):
+        """Switch a rule between shadow and enforce mode, keeping its counters"""
+        rules = self.automod_config.get('guilds', {}).get(str(interaction.guild.id), [])
+        rule = next((r for r in rules if r.get('name') == name), None)
+
+        if rule is None:
+            embed = create_embed(
+                description=f"❌ No rule named **{name}**.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        rule['mode'] = mode.value
+        self._save_guild_rules(interaction.guild.id, rules)
+
+        embed = create_embed(
+            description=f"✅ Rule **{name}** is now in **{mode.value}** mode.",
+            color=discord.Color.green()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="stats", description="Show per-rule hit counts and evaluation cost")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def rule_stats_command(self, interaction: discord.Interaction):
+        """Report hit rates, samples and CPU cost for every rule since startup"""
+        evaluate = self.evaluators.get(interaction.guild.id)
+
+        if evaluate is None:
+            embed = create_embed(
+                description="No automod rules are configured.",
+                color=discord.Color.blue()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        embed = create_embed(
+            title="Automod Rule Stats",
+            description="Counters since the bot started. Shadow rules never take action.",
+            color=discord.Color.blue()
+        )
+
+        for rule in evaluate.rules[:25]:
+            stats = rule.stats
+            value = (
+                f"Evaluated: `{stats.evaluated}` · Hits: `{stats.hits}` ({stats.hit_rate:.2%})\n"
+                f"Avg: `{stats.avg_ns / 1000:.1f} µs` · Max: `{stats.max_ns / 1000:.1f} µs` · "
+                f"Total: `{stats.total_ns / 1e6:.1f} ms`"
+            )
+            for author_id, jump_url, content in stats.samples:
+                value += f"\n• <@{author_id}> [{discord.utils.escape_markdown(content[:40]) or 'jump'}]({jump_url})"
+
+            embed.add_field(
+                name=f"{rule.name} [{'shadow' if rule.shadow else 'enforce'}]",
+                value=value[:1024],
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="reload", description="Reload automod rules from settings.json")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def reload_rules(self, interaction: discord.Interaction):
+        """Recompile rules after editing settings.json by hand"""
+        self.automod_config = get_config()['features'].get('automod', {})
+        self.compile_all()
+
+        embed = create_embed(
+            description=f"✅ Compiled rules for {len(self.evaluators)} server(s).",
+            color=discord.Color.green()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(AutoModRules(bot))
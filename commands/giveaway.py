@@ -3,12 +3,42 @@ Giveaway System Cog
 """
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+import aiosqlite
 import sqlite3
-import random
-from datetime import datetime, timedelta
+import sys
+import time
+from array import array
+from datetime import timedelta
 import asyncio
 import json
+from utils.scheduler import DeadlineScheduler
+from utils.sampling import weighted_sample
+
+
+# Joins arriving within this window share one guild.invites() fetch
+JOIN_COALESCE_SECONDS = 1.5
+
+# INVITE_DELETE for an invite used up by a join can arrive before that join's GUILD_MEMBER_ADD,
+# so deleted invites stay available to the next join diff for this long
+DELETED_INVITE_SECONDS = 10.0
+
+# Per-entrant weight expressions for weighted giveaways (i = invites, u = levels.users)
+WEIGHT_EXPRESSIONS = {
+    "none": "1",
+    "invites": "1 + MAX(COALESCE(i.invite_count, 0), 0)",
+    "level": "COALESCE(u.level, 1)"
+}
+
+# Drop buttons carry the drop ID in their custom_id
+DROP_CUSTOM_ID_PREFIX = "gdrop:"
+
+# Winners are answered directly if their claim batch commits within this time, otherwise
+# the click is deferred so a busy write lock cannot push it past Discord's 3 s deadline
+CLAIM_ACK_SECONDS = 2.0
+
+# Snowflake IDs embed their creation time: (id >> 22) + DISCORD_EPOCH_MS
+DISCORD_EPOCH_MS = 1420070400000
 
 
 def get_config():
@@ -38,88 +68,849 @@ def parse_duration(duration_str: str) -> timedelta:
         raise ValueError("Invalid duration format. Example: `7d`, `12h`, `30m`.")
 
 
+def pack_ids(ids) -> bytes:
+    """Pack user IDs into a little-endian uint64 BLOB"""
+    packed = array('Q', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(blob) -> list:
+    """Unpack a BLOB written by pack_ids"""
+    packed = array('Q')
+    packed.frombytes(blob or b"")
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tolist()
+
+
+def pack_weights(weights) -> bytes:
+    """Pack draw weights into a little-endian float64 BLOB"""
+    packed = array('d', weights)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_weights(blob) -> list:
+    """Unpack a BLOB written by pack_weights"""
+    packed = array('d')
+    packed.frombytes(blob or b"")
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tolist()
+
+
+def draw_winners(rows, weight_by: str, winner_count: int, role_members=None):
+    """
+    Filter eligible entrant rows and draw the winners
+    
+    Args:
+        rows: (user_id, weight) rows from the eligibility query
+        weight_by: Weighting mode; "none" draws uniformly
+        winner_count: Number of winners to draw
+        role_members: IDs allowed to win, or None for no role requirement
+    
+    Returns:
+        Tuple of (eligible user IDs, their weights or None, winners)
+    """
+    if role_members is not None:
+        rows = [row for row in rows if row[0] in role_members]
+    
+    eligible_entrants = [row[0] for row in rows]
+    weights = [row[1] for row in rows] if weight_by != "none" else None
+    
+    # Alias-table draw without replacement; uniform when unweighted
+    winners = weighted_sample(eligible_entrants, weights, winner_count)
+    return eligible_entrants, weights, winners
+
+
 class GiveawayCog(commands.Cog):
     """Giveaway system for contests and rewards"""
     
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        
+        # guild_id -> {code: (inviter_id, uses, max_uses)}
         self.server_invites = {}
-        self.con = sqlite3.connect("db/giveaway.db")
-        self.con.row_factory = sqlite3.Row
+        # guild_id -> {code: ((inviter_id, uses, max_uses), deleted at, monotonic)}
+        self.deleted_invites = {}
+        self.pending_joins = {}
+        self.pending_leaves = {}
+        self.join_diff_tasks = {}
+        
+        # Ordered join/leave events, applied to the join log and net counts on flush
+        self.pending_invite_events = []
+        self.fake_account_age = timedelta(
+            days=get_config()['features'].get('giveaway', {}).get('fake_account_age_days', 7)
+        )
+        
+        # One long-lived aiosqlite connection (opened in cog_load) runs every query on its
+        # own thread; write transactions take write_lock so they never interleave
+        self.con = None
+        self.write_lock = asyncio.Lock()
+        self.scheduler = DeadlineScheduler(self._on_giveaway_deadline, name="giveaway-scheduler")
+        self.reaction_emoji = get_config()['features'].get('giveaway', {}).get('reaction_emoji', "🎉")
+        
+        # Message IDs of running giveaways, and reaction changes waiting to be written
+        self.active_giveaways = set()
+        self.pending_entries = {}
+        
+        # Reactions made while the bot was down are read back once per giveaway; live
+        # events seen during that listing are newer than it, so their users are skipped
+        self.backfill_tasks = {}
+        self.backfill_touched = {}
+        
+        # Live entrant counters: the IDs counted per giveaway, so only a counted user's
+        # reaction removal lowers the count; the embed is edited at most once per interval
+        self.entrants = {}
+        self.rendered_counts = {}
+        self.last_counter_edit = {}
+        self.counter_tasks = {}
+        self.counter_interval = get_config()['features'].get('giveaway', {}).get(
+            'entrant_counter_interval_seconds', 10
+        )
+        
+        # First-come drops: drop_id -> state, and claims waiting for the next group commit
+        self.drops = {}
+        self.pending_claims = []
+        self.claim_writer = None
+        self.snapshot_retention = timedelta(
+            days=get_config()['features'].get('giveaway', {}).get('snapshot_retention_days', 14)
+        )
     
-    def cog_unload(self):
-        self.con.close()
+    async def cog_unload(self):
+        self.scheduler.stop()
+        self.flush_buffers.cancel()
+        self.purge_snapshots.cancel()
+        for task in (
+            list(self.join_diff_tasks.values()) + list(self.counter_tasks.values()) + list(self.backfill_tasks.values())
+        ):
+            task.cancel()
+        await self._flush_pending_entries()
+        await self._flush_pending_invites()
+        if self.claim_writer is not None:
+            await self.claim_writer
+        await self.con.close()
         print("[INFO] Closed database connection for GiveawayCog.")
     
     async def cog_load(self):
-        print("[INFO] GiveawayCog loaded. Caching invites and resuming giveaways...")
+        print("[INFO] GiveawayCog loaded. Resuming giveaways...")
+        
+        self.con = await aiosqlite.connect("db/giveaway.db")
+        self.con.row_factory = aiosqlite.Row
+        
+        # Level-weighted draws join entries against levels.db in the same query
+        levels_db = get_config().get('database', {}).get('levels_db', "db/levels.db")
+        await self.con.execute("ATTACH DATABASE ? AS levels", (levels_db,))
+        
+        # Reads the end_timestamp index; overdue giveaways fire as soon as the bot is ready
+        rows = await self.con.execute_fetchall("SELECT message_id, end_timestamp FROM giveaways ORDER BY end_timestamp")
+        for gw in rows:
+            self.active_giveaways.add(gw['message_id'])
+            self.scheduler.schedule(gw['message_id'], gw['end_timestamp'])
+        
+        for message_id in self.active_giveaways:
+            self.entrants[message_id] = set()
+        async with self.con.execute("SELECT giveaway_message_id, user_id FROM entries") as cur:
+            async for row in cur:
+                entrants = self.entrants.get(row['giveaway_message_id'])
+                if entrants is not None:
+                    entrants.add(row['user_id'])
+        for message_id, entrants in self.entrants.items():
+            self.rendered_counts[message_id] = len(entrants)
+        
+        if len(self.scheduler):
+            print(f"[INFO] Resuming {len(self.scheduler)} giveaway(s)")
+        
+        for drop in await self.con.execute_fetchall("SELECT * FROM giveaway_drops WHERE ended = 0"):
+            self.drops[drop['drop_id']] = {
+                'guild_id': drop['guild_id'],
+                'channel_id': drop['channel_id'],
+                'message_id': drop['message_id'],
+                'prize': drop['prize'],
+                'slots': drop['slots'],
+                'claims': {},
+                'saved': set()
+            }
+        for row in await self.con.execute_fetchall("SELECT drop_id, user_id FROM drop_claims ORDER BY claimed_at"):
+            drop = self.drops.get(row['drop_id'])
+            if drop is not None:
+                drop['claims'][row['user_id']] = len(drop['claims']) + 1
+                drop['saved'].add(row['user_id'])
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Deadlines need a logged-in client, so the scheduler starts here
+        self.scheduler.start()
+        if not self.flush_buffers.is_running():
+            self.flush_buffers.start()
+        if not self.purge_snapshots.is_running():
+            self.purge_snapshots.start()
+        
+        # Drops that filled up right before a restart still need their results posted
+        for drop_id, drop in list(self.drops.items()):
+            if len(drop['saved']) >= drop['slots']:
+                asyncio.create_task(self._finish_drop(drop_id))
+        
+        rows = await self.con.execute_fetchall("SELECT message_id, channel_id FROM giveaways")
+        for gw in rows:
+            if gw['message_id'] in self.active_giveaways and gw['message_id'] not in self.backfill_tasks:
+                self.backfill_touched[gw['message_id']] = set()
+                self.backfill_tasks[gw['message_id']] = asyncio.create_task(
+                    self._backfill_entries(gw['message_id'], gw['channel_id'])
+                )
         
+        # Guilds are only known once the bot is ready
         for guild in self.bot.guilds:
-            try:
-                self.server_invites[guild.id] = {
-                    invite.code: invite.uses for invite in await guild.invites()
-                }
-            except discord.Forbidden:
-                print(f"[WARNING] Missing permissions to view invites in {guild.name}")
-        
-        cur = self.con.cursor()
-        cur.execute("SELECT * FROM giveaways")
-        active_giveaways = cur.fetchall()
-        
-        current_time = int(datetime.utcnow().timestamp())
-        for gw in active_giveaways:
-            remaining_time = gw['end_timestamp'] - current_time
-            giveaway_data = (
-                gw['guild_id'],
-                gw['message_id'],
-                gw['channel_id'],
-                gw['required_invites'],
-                gw['prize'],
-                gw['winner_count']
-            )
+            if guild.id not in self.server_invites:
+                await self._cache_guild_invites(guild)
+    
+    async def _cache_guild_invites(self, guild: discord.Guild):
+        """Fetch and cache every invite of a guild"""
+        try:
+            invites = await guild.invites()
+        except discord.Forbidden:
+            print(f"[WARNING] Missing permissions to view invites in {guild.name}")
+            return None
+        except discord.HTTPException as e:
+            print(f"[ERROR] Failed to fetch invites for {guild.name}: {e}")
+            return None
+        
+        self.server_invites[guild.id] = {
+            invite.code: (invite.inviter.id if invite.inviter else None, invite.uses or 0, invite.max_uses or 0)
+            for invite in invites
+        }
+        return invites
+    
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        await self._cache_guild_invites(guild)
+    
+    @commands.Cog.listener()
+    async def on_invite_create(self, invite: discord.Invite):
+        """Keep the invite cache current without refetching"""
+        if invite.guild is None or invite.guild.id not in self.server_invites:
+            return
+        
+        self.server_invites[invite.guild.id][invite.code] = (
+            invite.inviter.id if invite.inviter else None,
+            invite.uses or 0,
+            invite.max_uses or 0
+        )
+    
+    @commands.Cog.listener()
+    async def on_invite_delete(self, invite: discord.Invite):
+        """Drop deleted invites, remembering them briefly for the next join diff"""
+        if invite.guild is None or invite.guild.id not in self.server_invites:
+            return
+        
+        # Invites that hit max_uses are deleted by the join that used them, and the
+        # join itself may not have been dispatched yet
+        entry = self.server_invites[invite.guild.id].pop(invite.code, None)
+        if entry:
+            deleted = self._recent_deleted_invites(invite.guild.id)
+            deleted[invite.code] = (entry, time.monotonic())
+            self.deleted_invites[invite.guild.id] = deleted
+    
+    def _recent_deleted_invites(self, guild_id):
+        """Take a guild's deleted invites, dropping those older than DELETED_INVITE_SECONDS"""
+        cutoff = time.monotonic() - DELETED_INVITE_SECONDS
+        return {
+            code: (entry, deleted_at)
+            for code, (entry, deleted_at) in self.deleted_invites.pop(guild_id, {}).items()
+            if deleted_at >= cutoff
+        }
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        """Queue a join for invite attribution"""
+        if member.bot or member.guild.id not in self.server_invites:
+            return
+        
+        guild = member.guild
+        self.pending_joins.setdefault(guild.id, []).append(member)
+        
+        if guild.id not in self.join_diff_tasks:
+            self.join_diff_tasks[guild.id] = asyncio.create_task(self._attribute_joins(guild))
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        """Queue a leave so the inviter's net count drops"""
+        if member.bot:
+            return
+        
+        event = ('leave', member.guild.id, member.id, int(time.time()))
+        
+        # A leave must be applied after the join it belongs to
+        if member.guild.id in self.join_diff_tasks:
+            self.pending_leaves.setdefault(member.guild.id, []).append(event)
+        else:
+            self.pending_invite_events.append(event)
+    
+    async def _attribute_joins(self, guild: discord.Guild):
+        """Attribute a burst of joins to inviters with a single invite fetch and diff"""
+        try:
+            await asyncio.sleep(JOIN_COALESCE_SECONDS)
             
-            if remaining_time > 0:
-                print(f"[INFO] Resuming giveaway {gw['message_id']}")
-                self.bot.loop.create_task(self._schedule_giveaway_end(remaining_time, giveaway_data))
+            old_invites = self.server_invites.get(guild.id, {})
+            invites = await self._cache_guild_invites(guild)
+        finally:
+            self.join_diff_tasks.pop(guild.id, None)
+            joins = self.pending_joins.pop(guild.id, [])
+            leaves = self.pending_leaves.pop(guild.id, [])
+            deleted = self._recent_deleted_invites(guild.id)
+        
+        if invites is None:
+            self.pending_invite_events.extend(leaves)
+            return
+        
+        # Uses gained since the last snapshot, per invite
+        used = {}
+        for invite in invites:
+            _, old_uses, _ = old_invites.get(invite.code, (None, 0, 0))
+            delta = (invite.uses or 0) - old_uses
+            if delta > 0:
+                used[invite.code] = (invite.inviter.id if invite.inviter else None, delta)
+        
+        # Invites consumed (and deleted) by max_uses gained their remaining uses
+        for code, ((inviter_id, uses, max_uses), _) in deleted.items():
+            if max_uses and uses < max_uses:
+                used[code] = (inviter_id, max_uses - uses)
+        
+        # The diff only says how often each invite was used, not by whom, so joins are only
+        # attributed when every join of the burst went through the same invite. Anything else
+        # (several invites, vanity URL, widget, ...) is logged without an inviter and not counted
+        code, inviter_id = None, None
+        if len(used) == 1:
+            only_code, (only_inviter, delta) = next(iter(used.items()))
+            if delta == len(joins):
+                code, inviter_id = only_code, only_inviter
+        
+        now = discord.utils.utcnow()
+        
+        for member in joins:
+            is_fake = now - member.created_at < self.fake_account_age
+            joined_at = int((member.joined_at or now).timestamp())
+            self.pending_invite_events.append(
+                ('join', guild.id, member.id, joined_at, inviter_id, code, is_fake)
+            )
+        
+        self.pending_invite_events.extend(leaves)
+    
+    async def _apply_invite_join(self, guild_id, joiner_id, joined_at, inviter_id, code, is_fake):
+        """Log a join and update the inviter's counters"""
+        async with self.con.execute(
+            "SELECT 1 FROM invite_joins WHERE guild_id = ? AND joiner_id = ? LIMIT 1",
+            (guild_id, joiner_id)
+        ) as cur:
+            is_rejoin = await cur.fetchone() is not None
+        counted = int(inviter_id is not None and not is_fake and not is_rejoin)
+        
+        await self.con.execute(
+            """
+            INSERT INTO invite_joins (guild_id, inviter_id, joiner_id, invite_code, joined_at, counted)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (guild_id, inviter_id, joiner_id, code, joined_at, counted)
+        )
+        
+        if inviter_id is None:
+            return
+        
+        await self.con.execute(
+            """
+            INSERT INTO invites (guild_id, user_id, invite_count, joins, fakes, rejoins) VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                invite_count = invite_count + excluded.invite_count,
+                joins = joins + 1,
+                fakes = fakes + excluded.fakes,
+                rejoins = rejoins + excluded.rejoins
+            """,
+            (guild_id, inviter_id, counted, int(is_fake), int(is_rejoin))
+        )
+    
+    async def _apply_invite_leave(self, guild_id, joiner_id, left_at):
+        """Close the member's open join log row and take back a counted invite"""
+        async with self.con.execute(
+            """
+            SELECT id, inviter_id, counted FROM invite_joins
+            WHERE guild_id = ? AND joiner_id = ? AND left_at IS NULL
+            ORDER BY joined_at DESC LIMIT 1
+            """,
+            (guild_id, joiner_id)
+        ) as cur:
+            row = await cur.fetchone()
+        if not row:
+            return
+        
+        await self.con.execute("UPDATE invite_joins SET left_at = ? WHERE id = ?", (left_at, row['id']))
+        
+        if row['inviter_id'] is not None:
+            await self.con.execute(
+                """
+                UPDATE invites SET leaves = leaves + 1, invite_count = invite_count - ?
+                WHERE guild_id = ? AND user_id = ?
+                """,
+                (row['counted'], guild_id, row['inviter_id'])
+            )
+    
+    async def _flush_pending_invites(self):
+        """Apply buffered join/leave events to the join log and net counts in one transaction"""
+        if not self.pending_invite_events:
+            return
+        
+        pending, self.pending_invite_events = self.pending_invite_events, []
+        
+        async with self.write_lock:
+            try:
+                for event in pending:
+                    if event[0] == 'join':
+                        await self._apply_invite_join(*event[1:])
+                    else:
+                        await self._apply_invite_leave(*event[1:])
+                await self.con.commit()
+            except sqlite3.Error as e:
+                await self.con.rollback()
+                print(f"[ERROR] Failed to write invite events: {e}")
+                
+                # Retried on the next flush, ahead of events queued meanwhile
+                self.pending_invite_events[:0] = pending
     
-    async def _schedule_giveaway_end(self, delay, data):
-        """Schedule giveaway end"""
-        await asyncio.sleep(delay)
-        await self._end_giveaway_task(data)
+    async def _backfill_entries(self, message_id, channel_id):
+        """Reconcile stored entries with the reactions a giveaway message has after downtime"""
+        reactors = set()
+        try:
+            channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+            message = await channel.fetch_message(message_id)
+            reaction = discord.utils.find(lambda r: str(r.emoji) == self.reaction_emoji, message.reactions)
+            if reaction is not None:
+                async for user in reaction.users(limit=None):
+                    if not user.bot:
+                        reactors.add(user.id)
+        except discord.HTTPException as e:
+            print(f"[ERROR] Could not backfill entries for giveaway {message_id}: {e}")
+            self.backfill_touched.pop(message_id, None)
+            return
+        
+        # Gone if the reactions were cleared meanwhile; that event already withdrew everything
+        touched = self.backfill_touched.pop(message_id, None)
+        if touched is None:
+            return
+        
+        entrants = self.entrants.setdefault(message_id, set())
+        added = reactors - entrants - touched
+        removed = entrants - reactors - touched
+        for user_id in added:
+            self.pending_entries[(message_id, user_id)] = True
+        for user_id in removed:
+            self.pending_entries[(message_id, user_id)] = False
+        entrants |= added
+        entrants -= removed
+        
+        if added or removed:
+            print(f"[INFO] Giveaway {message_id}: backfilled {len(added)} entr(ies), withdrew {len(removed)}")
+            self._schedule_counter_edit(message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """Record a giveaway entry as soon as someone reacts"""
+        if payload.message_id not in self.active_giveaways or str(payload.emoji) != self.reaction_emoji:
+            return
+        if payload.user_id == self.bot.user.id or (payload.member and payload.member.bot):
+            return
+        
+        self.pending_entries[(payload.message_id, payload.user_id)] = True
+        self.entrants.setdefault(payload.message_id, set()).add(payload.user_id)
+        self._mark_backfill_touched(payload.message_id, payload.user_id)
+        self._schedule_counter_edit(payload.message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        """Withdraw a giveaway entry when the reaction is removed"""
+        if payload.message_id not in self.active_giveaways or str(payload.emoji) != self.reaction_emoji:
+            return
+        
+        self._mark_backfill_touched(payload.message_id, payload.user_id)
+        
+        # Bots and anyone else whose reaction was never counted are ignored
+        entrants = self.entrants.get(payload.message_id)
+        if not entrants or payload.user_id not in entrants:
+            return
+        
+        entrants.discard(payload.user_id)
+        self.pending_entries[(payload.message_id, payload.user_id)] = False
+        self._schedule_counter_edit(payload.message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        """Withdraw every entry when all reactions are removed from a giveaway"""
+        self._withdraw_all_entries(payload.message_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload: discord.RawReactionClearEmojiEvent):
+        """Withdraw every entry when the giveaway emoji is removed from a giveaway"""
+        if str(payload.emoji) == self.reaction_emoji:
+            self._withdraw_all_entries(payload.message_id)
+    
+    def _withdraw_all_entries(self, message_id):
+        """Queue the removal of every counted entry of a giveaway"""
+        if message_id not in self.active_giveaways:
+            return
+        
+        # A backfill listing taken before the clear is stale
+        self.backfill_touched.pop(message_id, None)
+        
+        entrants = self.entrants.get(message_id)
+        if not entrants:
+            return
+        
+        for user_id in entrants:
+            self.pending_entries[(message_id, user_id)] = False
+        entrants.clear()
+        self._schedule_counter_edit(message_id)
+    
+    def _mark_backfill_touched(self, message_id, user_id):
+        """Keep a running backfill from overriding a live reaction event"""
+        touched = self.backfill_touched.get(message_id)
+        if touched is not None:
+            touched.add(user_id)
+    
+    def _schedule_counter_edit(self, message_id):
+        """Make sure one debounced counter edit is pending for a giveaway"""
+        if message_id not in self.counter_tasks:
+            self.counter_tasks[message_id] = asyncio.create_task(self._debounced_counter_edit(message_id))
+    
+    async def _debounced_counter_edit(self, message_id):
+        """Edit the entrant count into the giveaway embed, at most once per interval"""
+        # The task stays registered until it returns, so reactions arriving while it sleeps or
+        # edits never start a second editor; it loops for as long as the count keeps changing
+        try:
+            while message_id in self.active_giveaways:
+                last_edit = self.last_counter_edit.get(message_id, 0)
+                await asyncio.sleep(max(0, last_edit + self.counter_interval - time.monotonic()))
+                
+                count = len(self.entrants.get(message_id, ()))
+                if message_id not in self.active_giveaways or self.rendered_counts.get(message_id) == count:
+                    return
+                
+                async with self.con.execute("SELECT * FROM giveaways WHERE message_id = ?", (message_id,)) as cur:
+                    gw = await cur.fetchone()
+                channel = self.bot.get_channel(gw['channel_id']) if gw else None
+                if channel is None:
+                    return
+                
+                self.last_counter_edit[message_id] = time.monotonic()
+                self.rendered_counts[message_id] = count
+                try:
+                    await channel.get_partial_message(message_id).edit(embed=self._build_giveaway_embed(
+                        gw['prize'],
+                        gw['end_timestamp'],
+                        gw['winner_count'],
+                        gw['required_invites'],
+                        gw['weight_by'] or "none",
+                        count,
+                        gw['min_level'] or 0,
+                        gw['required_role_id'],
+                        gw['min_account_age_days'] or 0
+                    ))
+                except discord.HTTPException as e:
+                    print(f"[ERROR] Failed to update entrant count for giveaway {message_id}: {e}")
+        finally:
+            if self.counter_tasks.get(message_id) is asyncio.current_task():
+                del self.counter_tasks[message_id]
+    
+    def _build_giveaway_embed(self, prize, end_timestamp, winners, required_invites, weight_by, entrants=0,
+                              min_level=0, required_role_id=None, min_account_age_days=0):
+        """Build the embed shown while a giveaway is running"""
+        requirements = []
+        if required_invites > 0:
+            requirements.append(f"Invite **{required_invites}** new member(s)")
+        if min_level > 0:
+            requirements.append(f"Reach level **{min_level}**")
+        if required_role_id:
+            requirements.append(f"Have the <@&{required_role_id}> role")
+        if min_account_age_days > 0:
+            requirements.append(f"Account older than **{min_account_age_days}** day(s)")
+        requirements_text = "\n".join(requirements) or "None — Anyone can enter!"
+        
+        embed = discord.Embed(
+            title="🎉 GIVEAWAY STARTED 🎉",
+            description=f"**Prize:** {prize}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="Ends In", value=f"<t:{end_timestamp}:R>", inline=False)
+        embed.add_field(name="Winners", value=f"**{winners}**", inline=True)
+        embed.add_field(name="Requirements", value=requirements_text, inline=True)
+        embed.add_field(name="Entrants", value=f"**{entrants}**", inline=True)
+        if weight_by != "none":
+            embed.add_field(name="Weighted By", value=f"Higher {weight_by} = more chances", inline=False)
+        embed.set_footer(text=f"React with {self.reaction_emoji} to enter!")
+        return embed
+    
+    async def _flush_pending_entries(self):
+        """Write buffered reaction changes to the entries table in one transaction"""
+        if not self.pending_entries:
+            return
+        
+        # Swap the buffer first; later reactions land in the new one
+        pending, self.pending_entries = self.pending_entries, {}
+        added = [key for key, entered in pending.items() if entered]
+        removed = [key for key, entered in pending.items() if not entered]
+        
+        async with self.write_lock:
+            try:
+                await self.con.executemany(
+                    "INSERT OR IGNORE INTO entries (giveaway_message_id, user_id) VALUES (?, ?)",
+                    added
+                )
+                await self.con.executemany(
+                    "DELETE FROM entries WHERE giveaway_message_id = ? AND user_id = ?",
+                    removed
+                )
+                await self.con.commit()
+            except sqlite3.Error as e:
+                # The connection is shared, so a half-written batch must not ride along with the next commit
+                await self.con.rollback()
+                print(f"[ERROR] Failed to write giveaway entries: {e}")
+                
+                # Retried on the next flush; reactions recorded meanwhile are newer and win
+                for key, entered in pending.items():
+                    if key[0] in self.entrants:
+                        self.pending_entries.setdefault(key, entered)
+    
+    @tasks.loop(seconds=2)
+    async def flush_buffers(self):
+        """Periodically flush buffered giveaway entries and invite counts"""
+        await self._flush_pending_entries()
+        await self._flush_pending_invites()
+    
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        """Claim a drop slot for whoever clicks a drop button"""
+        if interaction.type != discord.InteractionType.component:
+            return
+        custom_id = (interaction.data or {}).get('custom_id', "")
+        if not custom_id.startswith(DROP_CUSTOM_ID_PREFIX):
+            return
+        
+        try:
+            drop_id = int(custom_id[len(DROP_CUSTOM_ID_PREFIX):])
+        except ValueError:
+            return
+        
+        drop = self.drops.get(drop_id)
+        user_id = interaction.user.id
+        
+        # No await between the check and the claim, so claims cannot interleave
+        # and exactly `slots` users win however many click at once
+        new_claim = False
+        if drop is None:
+            slot = None
+        elif user_id in drop['claims']:
+            slot = drop['claims'][user_id]
+        elif len(drop['claims']) < drop['slots']:
+            slot = len(drop['claims']) + 1
+            drop['claims'][user_id] = slot
+            new_claim = True
+        else:
+            slot = None
+        
+        respond = interaction.response.send_message
+        
+        # Only winners write, and a winner is told so only once the claim is on disk
+        saved = True
+        if new_claim:
+            future = self._queue_claim(drop_id, user_id)
+            try:
+                saved = await asyncio.wait_for(asyncio.shield(future), CLAIM_ACK_SECONDS)
+            except asyncio.TimeoutError:
+                respond = interaction.followup.send
+                try:
+                    await interaction.response.defer(ephemeral=True)
+                except discord.HTTPException:
+                    pass
+                saved = await future
+            self._settle_claim(drop_id, drop, user_id, saved)
+        
+        if not saved:
+            content = "⚠️ Your claim could not be saved, please click again."
+        elif slot is None:
+            content = "😭 Too late — every slot of this drop has been claimed."
+        elif user_id not in drop['saved']:
+            content = "⏳ Your claim is still being saved, please click again in a moment."
+        else:
+            content = f"🎉 You claimed slot **{slot}** of **{drop['slots']}** for **{drop['prize']}**!"
+        
+        # Usually the interaction response is the only REST call made per click
+        try:
+            await respond(content, ephemeral=True)
+        except discord.HTTPException:
+            pass
+    
+    def _queue_claim(self, drop_id, user_id) -> asyncio.Future:
+        """Queue a claim for the next group commit; the future resolves to whether it was saved"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_claims.append((drop_id, user_id, time.time(), future))
+        if self.claim_writer is None:
+            self.claim_writer = asyncio.create_task(self._write_claims())
+        return future
+    
+    async def _write_claims(self):
+        """Write queued drop claims in one transaction per batch, then answer the whole batch"""
+        try:
+            # Claims queued while a batch is being written form the next batch
+            while self.pending_claims:
+                batch, self.pending_claims = self.pending_claims, []
+                async with self.write_lock:
+                    try:
+                        await self.con.executemany(
+                            "INSERT OR IGNORE INTO drop_claims (drop_id, user_id, claimed_at) VALUES (?, ?, ?)",
+                            [claim[:3] for claim in batch]
+                        )
+                        await self.con.commit()
+                        saved = True
+                    except sqlite3.Error as e:
+                        await self.con.rollback()
+                        print(f"[ERROR] Failed to write drop claims: {e}")
+                        saved = False
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_result(saved)
+        finally:
+            self.claim_writer = None
+    
+    def _settle_claim(self, drop_id, drop, user_id, saved):
+        """Confirm a written claim, or free its slot again if it could not be saved"""
+        if not saved:
+            drop['claims'].pop(user_id, None)
+            return
+        
+        # The drop ends once every slot is saved, not merely taken
+        drop['saved'].add(user_id)
+        if len(drop['saved']) == drop['slots']:
+            asyncio.create_task(self._finish_drop(drop_id))
+    
+    async def _finish_drop(self, drop_id):
+        """Persist a filled drop and announce its winners"""
+        drop = self.drops.pop(drop_id, None)
+        if drop is None:
+            return
+        
+        async with self.write_lock:
+            try:
+                await self.con.execute("UPDATE giveaway_drops SET ended = 1 WHERE drop_id = ?", (drop_id,))
+                await self.con.commit()
+            except sqlite3.Error as e:
+                await self.con.rollback()
+                print(f"[ERROR] Failed to close drop {drop_id}: {e}")
+        
+        channel = self.bot.get_channel(drop['channel_id'])
+        if channel is None:
+            return
+        
+        winner_mentions = ", ".join(f"<@{user_id}>" for user_id in drop['claims'])
+        embed = discord.Embed(
+            title="⚡ DROP CLAIMED ⚡",
+            description=f"**Prize:** {drop['prize']}\n**Winner(s):** {winner_mentions}",
+            color=discord.Color.gold()
+        )
+        try:
+            await channel.get_partial_message(drop['message_id']).edit(embed=embed, view=None)
+            await channel.send(f"Congratulations {winner_mentions}! You won the **{drop['prize']}**!")
+        except discord.HTTPException as e:
+            print(f"[ERROR] Failed to announce drop results: {e}")
+    
+    async def _on_giveaway_deadline(self, message_id):
+        """Scheduler callback: end a giveaway whose deadline passed"""
+        await self.bot.wait_until_ready()
+        
+        async with self.con.execute("SELECT * FROM giveaways WHERE message_id = ?", (message_id,)) as cur:
+            gw = await cur.fetchone()
+        
+        # Already ended (e.g. through /gend)
+        if not gw:
+            return
+        
+        await self._end_giveaway_task(self._giveaway_data(gw))
+    
+    @staticmethod
+    def _giveaway_data(gw):
+        """Build the tuple _end_giveaway_task expects from a giveaways row"""
+        return (
+            gw['guild_id'],
+            gw['message_id'],
+            gw['channel_id'],
+            gw['required_invites'],
+            gw['prize'],
+            gw['winner_count'],
+            gw['weight_by'] or "none",
+            gw['min_level'] or 0,
+            gw['required_role_id'],
+            gw['min_account_age_days'] or 0
+        )
     
     async def _end_giveaway_task(self, giveaway_data):
         """End giveaway and pick winner"""
-        guild_id, message_id, channel_id, required_invites, prize, winner_count = giveaway_data
+        (
+            guild_id, message_id, channel_id, required_invites, prize, winner_count, weight_by,
+            min_level, required_role_id, min_account_age_days
+        ) = giveaway_data
+        
+        # Guards against ending twice; also stops recording new reactions
+        if message_id not in self.active_giveaways:
+            return
+        self.active_giveaways.discard(message_id)
         
         try:
             channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
-            message = await channel.fetch_message(message_id)
         except (discord.NotFound, discord.Forbidden) as e:
-            print(f"[ERROR] Could not find giveaway message {message_id}: {e}")
-            self._cleanup_db_for_giveaway(message_id)
+            print(f"[ERROR] Could not find giveaway channel {channel_id}: {e}")
+            await self._cleanup_db_for_giveaway(message_id)
             return
         
-        reaction = discord.utils.get(message.reactions, emoji="🎉")
-        participants = [user async for user in reaction.users() if not user.bot] if reaction else []
+        # Entries were recorded from reaction events; only a startup backfill may still be running
+        backfill = self.backfill_tasks.get(message_id)
+        if backfill is not None and not backfill.done():
+            await asyncio.wait([backfill])
+        await self._flush_pending_entries()
+        await self._flush_pending_invites()
+        weight_expression = WEIGHT_EXPRESSIONS.get(weight_by, "1")
         
-        cur = self.con.cursor()
-        cur.execute(
-            "SELECT user_id FROM entries WHERE giveaway_message_id = ? AND invite_count >= ?",
-            (message_id, required_invites)
+        # Invite, level and account age requirements are all resolved by this one query;
+        # account age comes from the snowflake timestamp, so no member lookups are needed
+        created_before_ms = int((time.time() - min_account_age_days * 86400) * 1000)
+        rows = await self.con.execute_fetchall(
+            f"""
+            SELECT e.user_id, {weight_expression} AS weight FROM entries e
+            LEFT JOIN invites i ON i.guild_id = ? AND i.user_id = e.user_id
+            LEFT JOIN levels.users u ON u.guild_id = ? AND u.user_id = e.user_id
+            WHERE e.giveaway_message_id = ?
+            AND COALESCE(i.invite_count, 0) >= ?
+            AND COALESCE(u.level, 0) >= ?
+            AND (e.user_id >> 22) + ? <= ?
+            """,
+            (guild_id, guild_id, message_id, required_invites, min_level, DISCORD_EPOCH_MS, created_before_ms)
         )
-        db_eligible_ids = {row['user_id'] for row in cur.fetchall()}
         
-        eligible_entrants = [p for p in participants if p.id in db_eligible_ids]
+        # Role requirement: one set built from the member cache, then O(1) lookups per entrant
+        role_members = None
+        if required_role_id:
+            guild = self.bot.get_guild(guild_id)
+            role = guild.get_role(required_role_id) if guild else None
+            role_members = {member.id for member in role.members} if role else set()
         
-        if not eligible_entrants:
-            winners = []
-        else:
-            num_winners = min(winner_count, len(eligible_entrants))
-            winners = random.sample(eligible_entrants, k=num_winners)
+        # The draw is CPU-bound for large giveaways, so it runs off the event loop
+        eligible_entrants, weights, winners = await asyncio.to_thread(
+            draw_winners, rows, weight_by, winner_count, role_members
+        )
+        
+        await self._save_snapshot(guild_id, message_id, channel_id, prize, weight_by, eligible_entrants, weights, winners)
         
         # Create result embed
         if winners:
-            winner_mentions = ", ".join(w.mention for w in winners)
+            winner_mentions = ", ".join(f"<@{user_id}>" for user_id in winners)
             title = "🎊 WINNERS ANNOUNCED 🎊" if len(winners) > 1 else "🎊 WINNER ANNOUNCED 🎊"
             embed = discord.Embed(
                 title=title,
@@ -136,22 +927,75 @@ class GiveawayCog(commands.Cog):
             announcement = f"The giveaway for **{prize}** has ended. No eligible participants."
         
         try:
-            await message.edit(embed=embed)
+            await channel.get_partial_message(message_id).edit(embed=embed)
             await channel.send(announcement)
         except (discord.Forbidden, discord.HTTPException) as e:
             print(f"[ERROR] Failed to announce giveaway: {e}")
         
-        self._cleanup_db_for_giveaway(message_id)
+        await self._cleanup_db_for_giveaway(message_id)
     
-    def _cleanup_db_for_giveaway(self, message_id):
+    async def _save_snapshot(self, guild_id, message_id, channel_id, prize, weight_by, entrants, weights, winners):
+        """Persist the eligible entrants so /greroll needs no Discord API calls"""
+        async with self.write_lock:
+            try:
+                await self.con.execute(
+                    """
+                    INSERT OR REPLACE INTO giveaway_snapshots
+                    (message_id, guild_id, channel_id, prize, weight_by, entrants, weights, winners, ended_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        message_id,
+                        guild_id,
+                        channel_id,
+                        prize,
+                        weight_by,
+                        pack_ids(entrants),
+                        pack_weights(weights) if weights is not None else None,
+                        pack_ids(winners),
+                        int(time.time())
+                    )
+                )
+                await self.con.commit()
+            except sqlite3.Error as e:
+                await self.con.rollback()
+                print(f"[ERROR] Failed to save giveaway snapshot: {e}")
+    
+    @tasks.loop(hours=1)
+    async def purge_snapshots(self):
+        """Delete entrant snapshots older than the retention window"""
+        cutoff = int(time.time() - self.snapshot_retention.total_seconds())
+        async with self.write_lock:
+            try:
+                await self.con.execute("DELETE FROM giveaway_snapshots WHERE ended_at < ?", (cutoff,))
+                await self.con.commit()
+            except sqlite3.Error as e:
+                await self.con.rollback()
+                print(f"[ERROR] Failed to purge giveaway snapshots: {e}")
+    
+    async def _cleanup_db_for_giveaway(self, message_id):
         """Clean up database entries"""
-        try:
-            cur = self.con.cursor()
-            cur.execute("DELETE FROM giveaways WHERE message_id = ?", (message_id,))
-            cur.execute("DELETE FROM entries WHERE giveaway_message_id = ?", (message_id,))
-            self.con.commit()
-        except sqlite3.Error as e:
-            print(f"[ERROR] Database error: {e}")
+        self.scheduler.cancel(message_id)
+        self.active_giveaways.discard(message_id)
+        
+        counter_task = self.counter_tasks.pop(message_id, None)
+        if counter_task:
+            counter_task.cancel()
+        backfill = self.backfill_tasks.pop(message_id, None)
+        if backfill:
+            backfill.cancel()
+        self.backfill_touched.pop(message_id, None)
+        for counter in (self.entrants, self.rendered_counts, self.last_counter_edit):
+            counter.pop(message_id, None)
+        
+        async with self.write_lock:
+            try:
+                await self.con.execute("DELETE FROM giveaways WHERE message_id = ?", (message_id,))
+                await self.con.execute("DELETE FROM entries WHERE giveaway_message_id = ?", (message_id,))
+                await self.con.commit()
+            except sqlite3.Error as e:
+                await self.con.rollback()
+                print(f"[ERROR] Database error: {e}")
     
     @app_commands.command(name="gstart", description="Start a giveaway with optional invite requirements")
     @app_commands.describe(
@@ -159,8 +1003,17 @@ class GiveawayCog(commands.Cog):
         winners="Number of winners",
         prize="Prize description",
         require_invites="Require invites to participate? (yes/no)",
-        invite_count="Number of invites required (if require_invites=yes)"
+        invite_count="Number of invites required (if require_invites=yes)",
+        weight_by="Give entrants extra chances based on invites or level",
+        min_level="Minimum level required to win",
+        required_role="Role required to win",
+        min_account_age_days="Minimum account age in days"
     )
+    @app_commands.choices(weight_by=[
+        app_commands.Choice(name="none", value="none"),
+        app_commands.Choice(name="invites", value="invites"),
+        app_commands.Choice(name="level", value="level")
+    ])
     @app_commands.checks.has_permissions(manage_guild=True)
     async def gstart(
         self,
@@ -169,19 +1022,14 @@ class GiveawayCog(commands.Cog):
         winners: int,
         prize: str,
         require_invites: str = "no",
-        invite_count: int = 0
+        invite_count: int = 0,
+        weight_by: app_commands.Choice[str] = None,
+        min_level: int = 0,
+        required_role: discord.Role = None,
+        min_account_age_days: int = 0
     ):
         """Start a giveaway with optional invite requirements"""
-        cur = self.con.cursor()
-        cur.execute("SELECT 1 FROM giveaways WHERE guild_id = ?", (interaction.guild.id,))
-        
-        if cur.fetchone():
-            embed = discord.Embed(
-                description="❌ A giveaway is already running in this server.",
-                color=discord.Color.red()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            return
+        weight_by_value = weight_by.value if weight_by else "none"
         
         if winners < 1:
             embed = discord.Embed(
@@ -213,6 +1061,14 @@ class GiveawayCog(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
         
+        if min_level < 0 or min_account_age_days < 0:
+            embed = discord.Embed(
+                description="❌ Level and account age requirements cannot be negative.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
         # Set invite count to 0 if not requiring invites
         final_invite_count = invite_count if should_require_invites else 0
         
@@ -227,106 +1083,278 @@ class GiveawayCog(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
         
-        end_time = datetime.utcnow() + giveaway_duration
+        end_time = discord.utils.utcnow() + giveaway_duration
         end_timestamp = int(end_time.timestamp())
         
-        # Build requirements field text
-        if should_require_invites and final_invite_count > 0:
-            requirements_text = f"Invite **{final_invite_count}** new member(s)"
-        elif should_require_invites:
-            requirements_text = "Have at least **1** invite"
-        else:
-            requirements_text = "None — Anyone can enter!"
+        required_role_id = required_role.id if required_role else None
+        embed = self._build_giveaway_embed(
+            prize, end_timestamp, winners, final_invite_count, weight_by_value,
+            min_level=min_level, required_role_id=required_role_id, min_account_age_days=min_account_age_days
+        )
+        
+        await interaction.response.send_message("✅ Giveaway starting...", ephemeral=True)
+        
+        giveaway_message = await interaction.channel.send(embed=embed, content="@everyone")
+        self.active_giveaways.add(giveaway_message.id)
+        await giveaway_message.add_reaction(self.reaction_emoji)
+        
+        async with self.write_lock:
+            await self.con.execute(
+                """
+                INSERT INTO giveaways
+                (guild_id, message_id, channel_id, end_timestamp, required_invites, prize, winner_count, weight_by,
+                 min_level, required_role_id, min_account_age_days)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    interaction.guild.id,
+                    giveaway_message.id,
+                    giveaway_message.channel.id,
+                    end_timestamp,
+                    final_invite_count,
+                    prize,
+                    winners,
+                    weight_by_value,
+                    min_level,
+                    required_role_id,
+                    min_account_age_days
+                )
+            )
+            await self.con.commit()
+        
+        self.scheduler.schedule(giveaway_message.id, end_timestamp)
+    
+    @app_commands.command(name="gdrop", description="Start a drop where the first clickers win")
+    @app_commands.describe(
+        winners="Number of slots (first N clickers win)",
+        prize="Prize description"
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def gdrop(self, interaction: discord.Interaction, winners: int, prize: str):
+        """Start a first-come drop claimed with a button"""
+        if winners < 1:
+            embed = discord.Embed(
+                description="❌ The number of winners must be at least 1.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        # The interaction ID is unique, so it doubles as the drop ID in the button's custom_id
+        drop_id = interaction.id
+        view = discord.ui.View(timeout=None)
+        view.add_item(discord.ui.Button(
+            label="Claim",
+            emoji="⚡",
+            style=discord.ButtonStyle.success,
+            custom_id=f"{DROP_CUSTOM_ID_PREFIX}{drop_id}"
+        ))
+        view.stop()  # Clicks are handled by on_interaction, not by the view
         
         embed = discord.Embed(
-            title="🎉 GIVEAWAY STARTED 🎉",
+            title="⚡ DROP ⚡",
             description=f"**Prize:** {prize}",
             color=discord.Color.blue()
         )
-        embed.add_field(name="Ends In", value=f"<t:{end_timestamp}:R>", inline=False)
-        embed.add_field(name="Winners", value=f"**{winners}**", inline=True)
-        embed.add_field(name="Requirements", value=requirements_text, inline=True)
-        embed.set_footer(text="React with 🎉 to enter!")
+        embed.add_field(name="Winners", value=f"First **{winners}** to click", inline=True)
+        embed.set_footer(text="Click the button to claim a slot!")
         
-        await interaction.response.send_message("✅ Giveaway starting...", ephemeral=True)
+        await interaction.response.send_message("✅ Drop starting...", ephemeral=True)
+        drop_message = await interaction.channel.send(embed=embed, view=view)
         
-        giveaway_message = await interaction.channel.send(embed=embed, content="@everyone")
-        await giveaway_message.add_reaction("🎉")
-        
-        cur.execute(
-            "INSERT INTO giveaways (guild_id, message_id, channel_id, end_timestamp, required_invites, prize, winner_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (
-                interaction.guild.id,
-                giveaway_message.id,
-                giveaway_message.channel.id,
-                end_timestamp,
-                final_invite_count,
-                prize,
-                winners
+        self.drops[drop_id] = {
+            'guild_id': interaction.guild.id,
+            'channel_id': drop_message.channel.id,
+            'message_id': drop_message.id,
+            'prize': prize,
+            'slots': winners,
+            'claims': {},
+            'saved': set()
+        }
+        async with self.write_lock:
+            await self.con.execute(
+                "INSERT INTO giveaway_drops (drop_id, guild_id, channel_id, message_id, prize, slots) VALUES (?, ?, ?, ?, ?, ?)",
+                (drop_id, interaction.guild.id, drop_message.channel.id, drop_message.id, prize, winners)
             )
-        )
-        self.con.commit()
-        
-        giveaway_data = (
-            interaction.guild.id,
-            giveaway_message.id,
-            giveaway_message.channel.id,
-            final_invite_count,
-            prize,
-            winners
-        )
-        self.bot.loop.create_task(self._schedule_giveaway_end(giveaway_duration.total_seconds(), giveaway_data))
+            await self.con.commit()
     
-    @app_commands.command(name="invites", description="Check invite count")
+    invites_group = app_commands.Group(name="invites", description="Invite tracking")
+    
+    @invites_group.command(name="check", description="Check invite count")
     @app_commands.describe(member="Member to check (defaults to you)")
     async def invites(self, interaction: discord.Interaction, member: discord.Member = None):
         """Check user's invite count"""
         if member is None:
             member = interaction.user
         
-        cur = self.con.cursor()
-        cur.execute(
-            "SELECT invite_count FROM invites WHERE guild_id = ? AND user_id = ?",
+        async with self.con.execute(
+            "SELECT invite_count, joins, leaves, fakes, rejoins FROM invites WHERE guild_id = ? AND user_id = ?",
             (interaction.guild.id, member.id)
-        )
-        total_res = cur.fetchone()
-        total_invs = total_res['invite_count'] if total_res else 0
+        ) as cur:
+            total_res = await cur.fetchone()
         
         embed = discord.Embed(
             title=f"✉️ Invites for {member.display_name}",
             color=discord.Color.green()
         )
         embed.set_thumbnail(url=member.display_avatar.url)
-        embed.add_field(name="Total Invites", value=f"`{total_invs}`", inline=False)
+        embed.add_field(name="Valid Invites", value=f"`{total_res['invite_count'] if total_res else 0}`", inline=False)
+        embed.add_field(name="Joins", value=f"`{total_res['joins'] if total_res else 0}`", inline=True)
+        embed.add_field(name="Left", value=f"`{total_res['leaves'] if total_res else 0}`", inline=True)
+        embed.add_field(name="Fake", value=f"`{total_res['fakes'] if total_res else 0}`", inline=True)
+        embed.add_field(name="Rejoins", value=f"`{total_res['rejoins'] if total_res else 0}`", inline=True)
         
         await interaction.response.send_message(embed=embed)
     
-    @app_commands.command(name="gend", description="End current giveaway")
+    @invites_group.command(name="top", description="Show the invite leaderboard")
+    async def invites_top(self, interaction: discord.Interaction):
+        """Show the members with the most valid invites"""
+        # Answered entirely from idx_invites_leaderboard
+        rows = await self.con.execute_fetchall(
+            """
+            SELECT user_id, invite_count FROM invites
+            WHERE guild_id = ? AND invite_count > 0
+            ORDER BY invite_count DESC LIMIT 10
+            """,
+            (interaction.guild.id,)
+        )
+        
+        if not rows:
+            embed = discord.Embed(
+                description="No one has any valid invites yet.",
+                color=discord.Color.blue()
+            )
+            await interaction.response.send_message(embed=embed)
+            return
+        
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        lines = [
+            f"{medals.get(rank, f'**{rank}.**')} <@{row['user_id']}> — `{row['invite_count']}`"
+            for rank, row in enumerate(rows, start=1)
+        ]
+        embed = discord.Embed(
+            title="🏆 Invite Leaderboard",
+            description="\n".join(lines),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text="Valid invites exclude members who left, fake accounts and rejoins")
+        
+        await interaction.response.send_message(embed=embed)
+    
+    @app_commands.command(name="gend", description="End a running giveaway")
+    @app_commands.describe(message_id="Giveaway message ID (optional if only one is running)")
     @app_commands.checks.has_permissions(manage_guild=True)
-    async def gend(self, interaction: discord.Interaction):
-        """End the current giveaway"""
-        cur = self.con.cursor()
-        cur.execute("SELECT * FROM giveaways WHERE guild_id = ?", (interaction.guild.id,))
-        giveaway_info = cur.fetchone()
+    async def gend(self, interaction: discord.Interaction, message_id: str = None):
+        """End a running giveaway"""
+        running = await self.con.execute_fetchall(
+            "SELECT * FROM giveaways WHERE guild_id = ? ORDER BY end_timestamp", (interaction.guild.id,)
+        )
+        
+        if message_id is not None:
+            running = [gw for gw in running if str(gw['message_id']) == message_id.strip()]
         
-        if not giveaway_info:
+        if not running:
             embed = discord.Embed(
-                description="❌ There is no active giveaway in this server.",
+                description="❌ There is no matching active giveaway in this server.",
                 color=discord.Color.red()
             )
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
         
+        if len(running) > 1:
+            listing = "\n".join(
+                f"`{gw['message_id']}` — {gw['prize']} (ends <t:{gw['end_timestamp']}:R>)"
+                for gw in running[:20]
+            )
+            embed = discord.Embed(
+                title="Several giveaways are running",
+                description=f"Pass `message_id` to choose one:\n{listing}",
+                color=discord.Color.orange()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        giveaway_info = running[0]
         await interaction.response.send_message("✅ Forcing giveaway to end...", ephemeral=True)
         
-        await self._end_giveaway_task((
-            giveaway_info['guild_id'],
-            giveaway_info['message_id'],
-            giveaway_info['channel_id'],
-            giveaway_info['required_invites'],
-            giveaway_info['prize'],
-            giveaway_info['winner_count']
-        ))
+        self.scheduler.cancel(giveaway_info['message_id'])
+        await self._end_giveaway_task(self._giveaway_data(giveaway_info))
+
+    
+    @app_commands.command(name="greroll", description="Draw new winners for an ended giveaway")
+    @app_commands.describe(
+        message_id="Message ID of the ended giveaway",
+        winners="Number of new winners to draw"
+    )
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def greroll(self, interaction: discord.Interaction, message_id: str, winners: int = 1):
+        """Reroll winners from the persisted entrant snapshot"""
+        try:
+            giveaway_id = int(message_id.strip())
+        except ValueError:
+            giveaway_id = None
+        
+        async with self.con.execute(
+            "SELECT * FROM giveaway_snapshots WHERE message_id = ? AND guild_id = ?",
+            (giveaway_id, interaction.guild.id)
+        ) as cur:
+            snapshot = await cur.fetchone()
+        
+        if not snapshot:
+            embed = discord.Embed(
+                description="❌ No ended giveaway with that ID (snapshots expire after "
+                            f"{self.snapshot_retention.days} days).",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        if winners < 1:
+            embed = discord.Embed(
+                description="❌ The number of winners must be at least 1.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        entrants = unpack_ids(snapshot['entrants'])
+        previous_winners = unpack_ids(snapshot['winners'])
+        weights = unpack_weights(snapshot['weights']) if snapshot['weights'] is not None else None
+        
+        # Previous winners get a zero weight so they cannot be drawn again
+        excluded = set(previous_winners)
+        if weights is None:
+            pool = [user_id for user_id in entrants if user_id not in excluded]
+            new_winners = weighted_sample(pool, None, winners)
+        else:
+            pool_weights = [0 if user_id in excluded else w for user_id, w in zip(entrants, weights)]
+            new_winners = weighted_sample(entrants, pool_weights, winners)
+        
+        if not new_winners:
+            embed = discord.Embed(
+                description="❌ There are no eligible entrants left to draw from.",
+                color=discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        
+        async with self.write_lock:
+            await self.con.execute(
+                "UPDATE giveaway_snapshots SET winners = ? WHERE message_id = ?",
+                (pack_ids(previous_winners + new_winners), giveaway_id)
+            )
+            await self.con.commit()
+        
+        winner_mentions = ", ".join(f"<@{user_id}>" for user_id in new_winners)
+        embed = discord.Embed(
+            title="🔁 GIVEAWAY REROLLED 🔁",
+            description=f"**Prize:** {snapshot['prize']}\n**New winner(s):** {winner_mentions}",
+            color=discord.Color.gold()
+        )
+        await interaction.response.send_message(
+            content=f"Congratulations {winner_mentions}! You won the **{snapshot['prize']}**!",
+            embed=embed
+        )
 
 
 async def setup(bot: commands.Bot):
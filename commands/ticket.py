@@ -4,9 +4,21 @@ Supports ticket creation via button, closing via command
 """
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+from collections import defaultdict
 from datetime import datetime
+from functools import partial
+import aiosqlite
+import asyncio
 import json
+import os
+import sqlite3
+import time
+from utils.blob_store import BlobStore
+from utils.category_pool import CategoryPool, find_pool
+from utils.duration_stats import DurationHistogram, format_duration
+from utils.scheduler import DeadlineScheduler
+from utils.transcript import TranscriptIndex, build_transcript, fts_query, transcript_uploads
 
 
 def get_config():
@@ -15,6 +27,22 @@ def get_config():
         return json.load(f)
 
 
+# Overwrite for the member who opened a ticket; the rest comes from the guild template
+CREATOR_OVERWRITE = discord.PermissionOverwrite(
+    view_channel=True,
+    send_messages=True,
+    read_message_history=True,
+    attach_files=True,
+    embed_links=True
+)
+
+CLOSE_INFO_EMBED = discord.Embed(
+    title="📌 How to Close This Ticket",
+    description="To close this ticket, use the command:\n\n`/close`",
+    color=discord.Color.greyple()
+)
+
+
 class TicketFormModal(discord.ui.Modal, title="Create a Support Ticket"):
     """Modal form for creating support tickets"""
     
@@ -43,70 +71,38 @@ class TicketFormModal(discord.ui.Modal, title="Create a Support Ticket"):
         style=discord.TextStyle.paragraph
     )
     
+    def __init__(self, cog: "TicketSystem"):
+        super().__init__()
+        self.cog = cog
+    
     async def on_submit(self, interaction: discord.Interaction):
         """Handle modal submission"""
+        started = time.perf_counter()
+        
+        # Checked and claimed before the first await, so double submits collapse into one ticket
+        blocked = self.cog.begin_ticket_creation(interaction)
+        if blocked:
+            await interaction.response.send_message(blocked, ephemeral=True)
+            return
+        
         await interaction.response.defer(ephemeral=True)
         
         try:
-            config = get_config()
-            guild = interaction.guild
-            
-            # Get category ID from config
-            category_id = config.get('categories', {}).get('ticket_category_id')
-            if not category_id:
-                await interaction.followup.send("❌ Ticket category not configured", ephemeral=True)
-                return
-            
-            category = guild.get_channel(category_id)
-            if not category or not isinstance(category, discord.CategoryChannel):
-                await interaction.followup.send("❌ Ticket category not found", ephemeral=True)
-                return
+            thread_mode = self.cog.ticket_mode(interaction.guild.id) == "thread"
             
             # Create channel name
             channel_name = f"ticket-{interaction.user.name.lower()}-{datetime.now().timestamp():.0f}"
             channel_name = "".join(c if c.isalnum() or c == '-' else '' for c in channel_name)[:100]
             
-            # Get moderator roles
-            moderator_role_ids = config.get('roles', {}).get('moderator_role_ids', [])
-            
-            # Create permission overwrites
-            overwrites = {
-                guild.default_role: discord.PermissionOverwrite(view_channel=False),
-                interaction.user: discord.PermissionOverwrite(
-                    view_channel=True,
-                    send_messages=True,
-                    read_message_history=True,
-                    attach_files=True,
-                    embed_links=True
-                ),
-                guild.me: discord.PermissionOverwrite(
-                    view_channel=True,
-                    send_messages=True,
-                    read_message_history=True,
-                    manage_channels=True,
-                    manage_messages=True
-                )
-            }
-            
-            # Add moderator permissions
-            for role_id in moderator_role_ids:
-                role = guild.get_role(role_id)
-                if role:
-                    overwrites[role] = discord.PermissionOverwrite(
-                        view_channel=True,
-                        send_messages=True,
-                        read_message_history=True
-                    )
-            
-            # Create the ticket channel
-            ticket_channel = await guild.create_text_channel(
-                name=channel_name,
-                category=category,
-                overwrites=overwrites,
-                reason=f"Ticket created by {interaction.user}"
-            )
+            if thread_mode:
+                ticket_channel = await self.create_ticket_thread(interaction, channel_name)
+            else:
+                ticket_channel = await self.create_ticket_channel(interaction, channel_name)
+            if ticket_channel is None:
+                return
             
-            print(f"[TICKET] Created ticket channel: {ticket_channel.name}")
+            channel_created = time.perf_counter()
+            await self.cog.register_ticket(ticket_channel, interaction.user)
             
             # Create embed with ticket info
             embed = discord.Embed(
@@ -121,47 +117,97 @@ class TicketFormModal(discord.ui.Modal, title="Create a Support Ticket"):
             embed.add_field(name="Your Name", value=self.name.value, inline=False)
             embed.set_footer(text="Our team will respond shortly")
             
-            # Send ticket info to the channel
-            await ticket_channel.send(embed=embed)
-            
-            # Mention moderators
-            moderator_mentions = []
-            for role_id in moderator_role_ids:
-                role = guild.get_role(role_id)
-                if role:
-                    moderator_mentions.append(role.mention)
-            
+            # Ticket info, moderator ping and close instructions go out as one message,
+            # sent alongside the confirmation to the user. In a private thread the mentions
+            # are also what add the creator and staff, all in this one request.
+            _, moderator_mentions = self.cog.guild_ticket_template(interaction.guild)
             if moderator_mentions:
-                await ticket_channel.send(f"{' '.join(moderator_mentions)} - New ticket from {interaction.user.mention}")
+                content = f"{moderator_mentions} - New ticket from {interaction.user.mention}"
+            else:
+                content = interaction.user.mention if thread_mode else None
             
-            # Send close command instruction
-            info_embed = discord.Embed(
-                title="📌 How to Close This Ticket",
-                description="To close this ticket, use the command:\n\n`/close`",
-                color=discord.Color.greyple()
-            )
-            await ticket_channel.send(embed=info_embed)
+            async def send_first_message():
+                await ticket_channel.send(content=content, embeds=[embed, CLOSE_INFO_EMBED])
+                return time.perf_counter()
             
-            # Confirm to user
-            await interaction.followup.send(
-                f"✅ Ticket created: {ticket_channel.mention}",
-                ephemeral=True
+            first_message_sent, _ = await asyncio.gather(
+                send_first_message(),
+                interaction.followup.send(f"✅ Ticket created: {ticket_channel.mention}", ephemeral=True)
             )
             
-            print(f"[TICKET] Ticket setup complete for {interaction.user}")
+            print(
+                f"[TICKET] Ticket {ticket_channel.name} ready in {(first_message_sent - started) * 1000:.0f} ms "
+                f"({'thread' if thread_mode else 'channel'} {(channel_created - started) * 1000:.0f} ms, "
+                f"first message {(first_message_sent - channel_created) * 1000:.0f} ms)"
+            )
             
         except discord.Forbidden:
             await interaction.followup.send("❌ I don't have permission to create channels", ephemeral=True)
         except Exception as e:
             print(f"[TICKET] Error creating ticket: {e}")
             await interaction.followup.send(f"❌ Error: {str(e)[:100]}", ephemeral=True)
+        finally:
+            self.cog.end_ticket_creation(interaction)
+    
+    async def create_ticket_channel(self, interaction: discord.Interaction, name: str):
+        """Create a ticket channel in the category pool, or report why not and return None"""
+        guild = interaction.guild
+        
+        # Get category ID from config
+        if not self.cog.config.get('categories', {}).get('ticket_category_id'):
+            await interaction.followup.send("❌ Ticket category not configured", ephemeral=True)
+            return None
+        
+        pool = self.cog.ticket_category_pool(guild)
+        if pool is None:
+            await interaction.followup.send("❌ Ticket category not found", ephemeral=True)
+            return None
+        
+        # Overwrites are precomputed per guild
+        overwrite_template, _ = self.cog.guild_ticket_template(guild)
+        overwrites = dict(overwrite_template)
+        overwrites[interaction.user] = CREATOR_OVERWRITE
+        
+        # Reserve a slot first so concurrent tickets never overfill a category
+        category, reservation = await pool.reserve()
+        try:
+            # Create the ticket channel
+            ticket_channel = await guild.create_text_channel(
+                name=name,
+                category=category,
+                overwrites=overwrites,
+                reason=f"Ticket created by {interaction.user}"
+            )
+        except BaseException:
+            await pool.release(category.id, reservation)
+            raise
+        pool.commit(category.id, reservation, ticket_channel.id)
+        return ticket_channel
+    
+    async def create_ticket_thread(self, interaction: discord.Interaction, name: str):
+        """Open a private thread under the ticket channel, or report why not and return None"""
+        channel_id = self.cog.config.get('channels', {}).get('ticket_channel_id')
+        parent = interaction.guild.get_channel(channel_id) if channel_id else interaction.channel
+        if not isinstance(parent, discord.TextChannel):
+            await interaction.followup.send("❌ Ticket channel not found", ephemeral=True)
+            return None
+        
+        # Thread membership replaces overwrites: the first message's mentions add the creator and staff
+        return await parent.create_thread(
+            name=name,
+            type=discord.ChannelType.private_thread,
+            invitable=False,
+            auto_archive_duration=10080,
+            reason=f"Ticket created by {interaction.user}"
+        )
 
 
 class CreateTicketButton(discord.ui.View):
     """View with create ticket button"""
     
-    def __init__(self):
+    def __init__(self, cog: "TicketSystem"):
         super().__init__(timeout=None)
+        self.cog = cog
     
     @discord.ui.button(
         label="Create Ticket",
@@ -171,7 +217,12 @@ class CreateTicketButton(discord.ui.View):
     )
     async def create_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         """Show ticket creation modal"""
-        await interaction.response.send_modal(TicketFormModal())
+        # Refuse early so blocked users are not asked to fill in the form
+        blocked = self.cog.ticket_creation_blocked(interaction)
+        if blocked:
+            await interaction.response.send_message(blocked, ephemeral=True)
+            return
+        await interaction.response.send_modal(TicketFormModal(self.cog))
 
 
 class TicketSystem(commands.Cog):
@@ -179,13 +230,571 @@ class TicketSystem(commands.Cog):
     
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.config = get_config()
+        self.tickets_db = self.config.get('database', {}).get('tickets_db', "db/tickets.db")
+        self.moderator_role_ids = frozenset(self.config.get('roles', {}).get('moderator_role_ids', []))
+        
+        # channel_id -> creator_id for every open ticket, mirrored from the tickets table,
+        # and the reverse index used by the per-user cap, keyed by (guild_id, creator_id)
+        self.open_tickets = {}
+        self.tickets_by_creator = defaultdict(set)
+        
+        # Flood guard: open tickets per user, creations per window, and submits in flight
+        ticket_config = self.config.get('features', {}).get('ticket', {})
+        self.max_open_per_user = ticket_config.get('max_open_per_user', 1)
+        self.creation_limiter = commands.CooldownMapping(
+            commands.Cooldown(ticket_config.get('creation_threshold', 3), ticket_config.get('creation_window', 600)),
+            lambda interaction: (interaction.guild_id, interaction.user.id)
+        )
+        self.creating = set()
+        
+        # Idle auto-close: last activity per open ticket, written to the tickets table in batches.
+        # Messages only touch the dict; the scheduler re-checks activity when a deadline fires.
+        self.idle_warning = ticket_config.get('idle_warning_hours', 24) * 3600
+        self.idle_close = ticket_config.get('idle_close_hours', 48) * 3600
+        self.last_activity = {}
+        self.dirty_activity = {}
+        self.idle_warned = {}
+        self.idle_scheduler = DeadlineScheduler(self._on_idle_deadline, name="ticket-idle-scheduler")
+        
+        # Response metrics: open time and first staff reply per open ticket, and histograms
+        # per (day, guild_id, moderator_id, metric) merged into ticket_stats on flush.
+        # moderator_id 0 holds the guild-wide rollup.
+        self.ticket_opened = {}
+        self.first_responders = {}
+        self.dirty_first_responses = {}
+        self.pending_stats = defaultdict(DurationHistogram)
+        
+        self.db = None
+        self.write_lock = asyncio.Lock()
+        
+        # Attachments of closed tickets, stored once per SHA-256 under db/blobs
+        self.store_attachments = ticket_config.get('store_attachments', True)
+        self.attachment_max_size = ticket_config.get('attachment_max_mb', 25) * 1024 * 1024
+        self.attachment_downloads = ticket_config.get('attachment_downloads', 4)
+        self.blob_store = None
+        
+        # guild_id -> support role set with /ticket role (tickets_role table)
+        self.support_roles = {}
+        
+        # guild_id -> (overwrite template, moderator mention string); dropped on role changes
+        self.ticket_templates = {}
+        
+        # guild_id -> configured ticket category plus overflow categories past the 50-channel limit
+        self.category_pools = {}
+        self.category_capacity = ticket_config.get('category_capacity', 50)
+        
+        # guild_id -> "channel" or "thread", set with /ticket mode (ticket_settings table)
+        self.default_mode = ticket_config.get('mode', "channel")
+        self.ticket_modes = {}
+    
+    async def cog_load(self):
+        # One long-lived connection for registry writes; write_lock keeps statement + commit pairs together
+        self.db = await aiosqlite.connect(self.tickets_db)
+        if self.store_attachments:
+            self.blob_store = BlobStore(
+                self.db,
+                self.write_lock,
+                max_size=self.attachment_max_size,
+                concurrency=self.attachment_downloads
+            )
+            await self.blob_store.open()
+        
+        for (
+            channel_id, guild_id, creator_id, opened_at, last_activity, idle_warned_at, first_responder_id
+        ) in await self.db.execute_fetchall(
+            """
+            SELECT channel_id, guild_id, creator_id, opened_at, last_activity, idle_warned_at, first_responder_id
+            FROM tickets WHERE status = 'open'
+            """
+        ):
+            self.open_tickets[channel_id] = creator_id
+            self.tickets_by_creator[(guild_id, creator_id)].add(channel_id)
+            self.ticket_opened[channel_id] = (guild_id, opened_at or time.time())
+            if first_responder_id:
+                self.first_responders[channel_id] = first_responder_id
+            self.last_activity[channel_id] = last_activity or opened_at or time.time()
+            if idle_warned_at:
+                self.idle_warned[channel_id] = idle_warned_at
+            self._schedule_idle_check(channel_id)
+        for role_id, guild_id in await self.db.execute_fetchall("SELECT role, guild FROM tickets_role"):
+            self.support_roles[guild_id] = role_id
+        for guild_id, mode in await self.db.execute_fetchall("SELECT guild_id, mode FROM ticket_settings"):
+            self.ticket_modes[guild_id] = mode
     
     @commands.Cog.listener()
     async def on_ready(self):
         """Re-register views when bot starts"""
         print("✓ Ticket system loaded")
-        self.bot.add_view(CreateTicketButton())
+        self.bot.add_view(CreateTicketButton(self))
         print("✓ Ticket views registered")
+        await self.adopt_legacy_tickets()
+        
+        # Deadlines need a logged-in client, so the scheduler starts here
+        self.idle_scheduler.start()
+        if not self.flush_pending.is_running():
+            self.flush_pending.start()
+    
+    async def cog_unload(self):
+        self.idle_scheduler.stop()
+        self.flush_pending.cancel()
+        await self._flush_activity()
+        await self._flush_stats()
+        if self.blob_store is not None:
+            await self.blob_store.close()
+        await self.db.close()
+    
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        """Record ticket activity and first staff replies; coalesced in memory until the next flush"""
+        channel_id = message.channel.id
+        creator_id = self.open_tickets.get(channel_id)
+        if creator_id is None or message.author.bot:
+            return
+        
+        now = time.time()
+        self.last_activity[channel_id] = now
+        self.dirty_activity[channel_id] = now
+        
+        if (
+            channel_id not in self.first_responders
+            and message.author.id != creator_id
+            and isinstance(message.author, discord.Member)
+            and self.is_staff(message.author)
+        ):
+            self.record_first_response(channel_id, message.author.id, now)
+    
+    @tasks.loop(seconds=60)
+    async def flush_pending(self):
+        """Periodically write coalesced ticket activity and metrics"""
+        await self._flush_activity()
+        await self._flush_stats()
+    
+    async def _flush_activity(self):
+        """Write coalesced last-activity timestamps and first responses in one transaction"""
+        if not self.dirty_activity and not self.dirty_first_responses:
+            return
+        
+        pending, self.dirty_activity = self.dirty_activity, {}
+        responses, self.dirty_first_responses = self.dirty_first_responses, {}
+        async with self.write_lock:
+            try:
+                await self.db.executemany(
+                    "UPDATE tickets SET last_activity = ? WHERE channel_id = ?",
+                    [(int(timestamp), channel_id) for channel_id, timestamp in pending.items()]
+                )
+                await self.db.executemany(
+                    "UPDATE tickets SET first_response_at = ?, first_responder_id = ? WHERE channel_id = ?",
+                    [(int(at), responder_id, channel_id) for channel_id, (at, responder_id) in responses.items()]
+                )
+                await self.db.commit()
+            except sqlite3.Error as e:
+                # The connection is shared, so a half-written batch must not ride along with the next commit
+                await self.db.rollback()
+                print(f"[TICKET] Failed to write ticket activity: {e}")
+                
+                # Retried on the next flush; values recorded meanwhile are newer and win
+                for channel_id, timestamp in pending.items():
+                    if channel_id in self.open_tickets:
+                        self.dirty_activity.setdefault(channel_id, timestamp)
+                for channel_id, response in responses.items():
+                    if channel_id in self.open_tickets:
+                        self.dirty_first_responses.setdefault(channel_id, response)
+    
+    def _record_duration(self, guild_id: int, moderator_id, metric: str, seconds: float, at: float):
+        """Add a duration to the guild-wide and (if known) per-moderator rollup of its day"""
+        day = time.strftime("%Y-%m-%d", time.gmtime(at))
+        self.pending_stats[(day, guild_id, 0, metric)].add(seconds)
+        if moderator_id:
+            self.pending_stats[(day, guild_id, moderator_id, metric)].add(seconds)
+    
+    def record_first_response(self, channel_id: int, responder_id: int, at: float):
+        """Record the first staff reply in a ticket"""
+        self.first_responders[channel_id] = responder_id
+        self.dirty_first_responses[channel_id] = (at, responder_id)
+        
+        opened = self.ticket_opened.get(channel_id)
+        if opened is not None:
+            guild_id, opened_at = opened
+            self._record_duration(guild_id, responder_id, "first_response", at - opened_at, at)
+    
+    async def _flush_stats(self):
+        """Merge pending histograms into the daily ticket_stats rollups"""
+        if not self.pending_stats:
+            return
+        
+        pending, self.pending_stats = self.pending_stats, defaultdict(DurationHistogram)
+        
+        # Stored rollups are merged into copies, so a failed flush can put pending back unchanged
+        merged = defaultdict(DurationHistogram)
+        for key, histogram in pending.items():
+            merged[key].merge(histogram)
+        
+        async with self.write_lock:
+            try:
+                # Pending keys almost always share one day per guild, so existing rollups are read per (guild, day)
+                for guild_id, day in {(guild_id, day) for day, guild_id, _, _ in pending}:
+                    for moderator_id, metric, count, total, buckets in await self.db.execute_fetchall(
+                        """
+                        SELECT moderator_id, metric, count, total, histogram FROM ticket_stats
+                        WHERE guild_id = ? AND day = ?
+                        """,
+                        (guild_id, day)
+                    ):
+                        histogram = merged.get((day, guild_id, moderator_id, metric))
+                        if histogram is not None:
+                            histogram.merge(DurationHistogram.loads(buckets, count, total))
+                
+                rows = [
+                    (day, guild_id, moderator_id, metric, histogram.count, histogram.total, histogram.dumps())
+                    for (day, guild_id, moderator_id, metric), histogram in merged.items()
+                ]
+                await self.db.executemany(
+                    """
+                    INSERT OR REPLACE INTO ticket_stats (day, guild_id, moderator_id, metric, count, total, histogram)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    rows
+                )
+                await self.db.commit()
+            except sqlite3.Error as e:
+                await self.db.rollback()
+                print(f"[TICKET] Failed to write ticket stats: {e}")
+                for key, histogram in pending.items():
+                    self.pending_stats[key].merge(histogram)
+    
+    def _schedule_idle_check(self, channel_id: int):
+        """Schedule the next idle warning or auto-close for a ticket"""
+        if not self.idle_close:
+            return
+        
+        last_activity = self.last_activity.get(channel_id, time.time())
+        if channel_id in self.idle_warned or not self.idle_warning:
+            self.idle_scheduler.schedule(channel_id, last_activity + self.idle_close)
+        else:
+            self.idle_scheduler.schedule(channel_id, last_activity + self.idle_warning)
+    
+    async def _set_idle_warned(self, channel_id: int, warned_at):
+        """Persist (or clear, with None) a ticket's idle warning"""
+        if warned_at is None:
+            self.idle_warned.pop(channel_id, None)
+        else:
+            self.idle_warned[channel_id] = warned_at
+        async with self.write_lock:
+            await self.db.execute(
+                "UPDATE tickets SET idle_warned_at = ? WHERE channel_id = ?",
+                (int(warned_at) if warned_at else None, channel_id)
+            )
+            await self.db.commit()
+    
+    async def _on_idle_deadline(self, channel_id: int):
+        """Scheduler callback: warn about or close an idle ticket"""
+        if channel_id not in self.open_tickets:
+            return
+        
+        channel = self.bot.get_channel(channel_id) or await self._fetch_ticket_channel(channel_id)
+        if channel is None:
+            return
+        
+        now = time.time()
+        last_activity = self.last_activity.get(channel_id, now)
+        warned_at = self.idle_warned.get(channel_id)
+        
+        # Someone wrote since the warning, so the ticket is active again
+        if warned_at is not None and last_activity > warned_at:
+            await self._set_idle_warned(channel_id, None)
+            warned_at = None
+        
+        if warned_at is None and self.idle_warning:
+            if now < last_activity + self.idle_warning:
+                self._schedule_idle_check(channel_id)
+                return
+            
+            hours = (self.idle_close - self.idle_warning) / 3600
+            embed = discord.Embed(
+                title="⏰ Inactive Ticket",
+                description=f"This ticket will be closed automatically in **{hours:g} hour(s)** "
+                            f"unless someone replies.",
+                color=discord.Color.orange()
+            )
+            try:
+                await channel.send(embed=embed)
+            except discord.HTTPException as e:
+                print(f"[TICKET] Could not warn idle ticket {channel.name}: {e}")
+            await self._set_idle_warned(channel_id, now)
+            self._schedule_idle_check(channel_id)
+            return
+        
+        if now < last_activity + self.idle_close:
+            self._schedule_idle_check(channel_id)
+            return
+        
+        print(f"[TICKET] Auto-closing idle ticket: {channel.name}")
+        try:
+            closed = await self.close_ticket_channel(
+                channel,
+                channel.guild.me,
+                reason=f"This ticket was closed automatically after {self.idle_close / 3600:g} hour(s) without activity"
+            )
+        except discord.HTTPException as e:
+            print(f"[TICKET] Error auto-closing ticket {channel.name}: {e}")
+            closed = False
+        
+        # Try again later rather than deleting a ticket whose transcript failed
+        if not closed:
+            self.idle_scheduler.schedule(channel_id, now + 3600)
+    
+    async def _fetch_ticket_channel(self, channel_id: int):
+        """Fetch a ticket missing from the cache, reconciling the registry if it is gone"""
+        try:
+            return await self.bot.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            # Deleted (or hidden from the bot) without a delete event reaching us
+            print(f"[TICKET] Ticket channel {channel_id} is gone, marking it closed")
+            await self.mark_ticket_closed(channel_id)
+        except discord.HTTPException as e:
+            print(f"[TICKET] Could not fetch ticket channel {channel_id}: {e}")
+            self.idle_scheduler.schedule(channel_id, time.time() + 3600)
+        return None
+    
+    def staff_role_ids(self, guild_id: int) -> frozenset:
+        """Moderator roles from settings.json plus the guild's support role"""
+        support_role = self.support_roles.get(guild_id)
+        return self.moderator_role_ids | {support_role} if support_role else self.moderator_role_ids
+    
+    def is_staff(self, member: discord.Member) -> bool:
+        """Check whether a member may manage any ticket"""
+        if member.guild_permissions.administrator:
+            return True
+        staff_roles = self.staff_role_ids(member.guild.id)
+        return any(role.id in staff_roles for role in member.roles)
+    
+    def guild_ticket_template(self, guild: discord.Guild) -> tuple:
+        """Get the cached overwrites (without the creator) and moderator mentions for new tickets"""
+        template = self.ticket_templates.get(guild.id)
+        if template is not None:
+            return template
+        
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(
+                view_channel=True,
+                send_messages=True,
+                read_message_history=True,
+                manage_channels=True,
+                manage_messages=True
+            )
+        }
+        
+        staff_overwrite = discord.PermissionOverwrite(
+            view_channel=True,
+            send_messages=True,
+            read_message_history=True
+        )
+        mentions = []
+        for role_id in self.staff_role_ids(guild.id):
+            role = guild.get_role(role_id)
+            if role:
+                overwrites[role] = staff_overwrite
+                mentions.append(role.mention)
+        
+        template = (overwrites, " ".join(mentions))
+        self.ticket_templates[guild.id] = template
+        return template
+    
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self.ticket_templates.pop(role.guild.id, None)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.ticket_templates.pop(role.guild.id, None)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.ticket_templates.pop(after.guild.id, None)
+    
+    def ticket_mode(self, guild_id: int) -> str:
+        """Get how new tickets are opened in a guild ("channel" or "thread")"""
+        return self.ticket_modes.get(guild_id, self.default_mode)
+    
+    def ticket_category_pool(self, guild: discord.Guild):
+        """Get the guild's ticket category pool, or None if the category is missing"""
+        pool = self.category_pools.get(guild.id)
+        if pool is not None:
+            return pool
+        
+        category_id = self.config.get('categories', {}).get('ticket_category_id')
+        category = guild.get_channel(category_id) if category_id else None
+        if not isinstance(category, discord.CategoryChannel):
+            return None
+        
+        pool = CategoryPool(category, self.category_capacity)
+        self.category_pools[guild.id] = pool
+        return pool
+    
+    def ticket_creation_blocked(self, interaction: discord.Interaction):
+        """Get the reason a user may not open a ticket right now, or None"""
+        key = (interaction.guild_id, interaction.user.id)
+        if key in self.creating:
+            return "⏳ Your ticket is already being created"
+        
+        open_count = len(self.tickets_by_creator.get(key, ()))
+        if self.max_open_per_user and open_count >= self.max_open_per_user:
+            return f"❌ You already have {open_count} open ticket(s). Close one before opening another"
+        
+        retry_after = self.creation_limiter.get_bucket(interaction).get_retry_after()
+        if retry_after:
+            return f"⏳ You are opening tickets too quickly. Try again in {retry_after:.0f}s"
+        return None
+    
+    def begin_ticket_creation(self, interaction: discord.Interaction):
+        """Claim a ticket creation for a user, or get the reason it is refused"""
+        blocked = self.ticket_creation_blocked(interaction)
+        if blocked:
+            return blocked
+        self.creation_limiter.update_rate_limit(interaction)
+        self.creating.add((interaction.guild_id, interaction.user.id))
+        return None
+    
+    def end_ticket_creation(self, interaction: discord.Interaction):
+        self.creating.discard((interaction.guild_id, interaction.user.id))
+    
+    async def register_ticket(self, channel: discord.TextChannel, creator: discord.abc.User):
+        """Record a newly opened ticket"""
+        now = time.time()
+        self.open_tickets[channel.id] = creator.id
+        self.tickets_by_creator[(channel.guild.id, creator.id)].add(channel.id)
+        self.ticket_opened[channel.id] = (channel.guild.id, now)
+        self.last_activity[channel.id] = now
+        self._schedule_idle_check(channel.id)
+        async with self.write_lock:
+            await self.db.execute(
+                """
+                INSERT OR REPLACE INTO tickets (channel_id, guild_id, creator_id, status, opened_at, last_activity)
+                VALUES (?, ?, ?, 'open', ?, ?)
+                """,
+                (channel.id, channel.guild.id, creator.id, int(now), int(now))
+            )
+            await self.db.commit()
+    
+    async def mark_ticket_closed(self, channel_id: int):
+        """Record that a ticket was closed"""
+        creator_id = self.open_tickets.pop(channel_id, None)
+        if creator_id is None:
+            return
+        
+        self.idle_scheduler.cancel(channel_id)
+        for state in (self.last_activity, self.dirty_activity, self.idle_warned):
+            state.pop(channel_id, None)
+        
+        # Resolution time counts towards the guild and the moderator who answered first
+        now = time.time()
+        opened = self.ticket_opened.pop(channel_id, None)
+        responder_id = self.first_responders.pop(channel_id, None)
+        if opened is not None:
+            guild_id, opened_at = opened
+            self._record_duration(guild_id, responder_id, "resolution", now - opened_at, now)
+            
+            creator_tickets = self.tickets_by_creator.get((guild_id, creator_id))
+            if creator_tickets is not None:
+                creator_tickets.discard(channel_id)
+                if not creator_tickets:
+                    del self.tickets_by_creator[(guild_id, creator_id)]
+        async with self.write_lock:
+            await self.db.execute(
+                "UPDATE tickets SET status = 'closed', closed_at = ? WHERE channel_id = ?",
+                (int(now), channel_id)
+            )
+            await self.db.commit()
+    
+    async def adopt_legacy_tickets(self):
+        """Register ticket channels opened before the tickets table existed"""
+        for guild in self.bot.guilds:
+            pool = self.ticket_category_pool(guild)
+            if pool is None:
+                continue
+            
+            for channel in (channel for category in pool.categories() for channel in category.text_channels):
+                if channel.id in self.open_tickets or not channel.name.startswith("ticket-"):
+                    continue
+                
+                # The creator is the only member with an explicit overwrite besides the bot
+                creator = next(
+                    (target for target in channel.overwrites
+                     if isinstance(target, discord.Member) and target != guild.me),
+                    None
+                )
+                if creator is not None:
+                    await self.register_ticket(channel, creator)
+                    print(f"[TICKET] Registered existing ticket channel: {channel.name}")
+    
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        """Close the registry entry of a ticket thread deleted by hand"""
+        if payload.thread_id in self.open_tickets:
+            await self.mark_ticket_closed(payload.thread_id)
+    
+    @commands.Cog.listener()
+    async def on_raw_thread_update(self, payload: discord.RawThreadUpdateEvent):
+        """Close a ticket thread once it is archived, by hand or by Discord's auto-archive"""
+        if payload.thread_id not in self.open_tickets:
+            return
+        if not payload.data.get('thread_metadata', {}).get('archived'):
+            return
+        
+        # Archived threads drop out of the cache, so later lookups by ID would miss
+        thread = payload.thread or await self._fetch_ticket_channel(payload.thread_id)
+        if thread is None:
+            return
+        
+        self.idle_scheduler.cancel(payload.thread_id)
+        print(f"[TICKET] Closing archived ticket thread: {thread.name}")
+        try:
+            closed = await self.close_ticket_channel(
+                thread,
+                thread.guild.me,
+                reason="This ticket was closed because its thread was archived"
+            )
+        except discord.HTTPException as e:
+            print(f"[TICKET] Error closing archived ticket {thread.name}: {e}")
+            closed = False
+        
+        if not closed and payload.thread_id in self.open_tickets:
+            self.idle_scheduler.schedule(payload.thread_id, time.time() + 3600)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        pool = find_pool(self.category_pools, channel)
+        if pool is not None:
+            pool.channel_added(channel)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """Keep category counts right when a channel is moved between categories"""
+        if before.category_id == after.category_id:
+            return
+        pool = find_pool(self.category_pools, before)
+        if pool is not None:
+            await pool.channel_removed(before)
+        pool = find_pool(self.category_pools, after)
+        if pool is not None:
+            pool.channel_added(after)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Close the registry entry of a ticket channel deleted by hand"""
+        if channel.id in self.open_tickets:
+            await self.mark_ticket_closed(channel.id)
+        
+        pool = find_pool(self.category_pools, channel)
+        if pool is None:
+            return
+        if channel.id == pool.base_id:
+            # Rebuilt (or reported missing) on the next ticket
+            del self.category_pools[channel.guild.id]
+        else:
+            await pool.channel_removed(channel)
     
     @app_commands.command(
         name="setup_ticket_panel",
@@ -213,7 +822,7 @@ class TicketSystem(commands.Cog):
             
             await interaction.response.send_message(
                 embed=embed,
-                view=CreateTicketButton()
+                view=CreateTicketButton(self)
             )
             
             await interaction.followup.send("✅ Ticket panel setup complete!", ephemeral=True)
@@ -230,7 +839,8 @@ class TicketSystem(commands.Cog):
     async def close_ticket(self, interaction: discord.Interaction):
         """Close a ticket channel"""
         # Verify this is a ticket channel
-        if not interaction.channel.name.startswith("ticket-"):
+        creator_id = self.open_tickets.get(interaction.channel.id)
+        if creator_id is None:
             await interaction.response.send_message(
                 "❌ This command can only be used in ticket channels",
                 ephemeral=True
@@ -238,15 +848,10 @@ class TicketSystem(commands.Cog):
             return
         
         try:
-            config = get_config()
-            moderator_ids = config.get('roles', {}).get('moderator_role_ids', [])
-            
             # Check permissions
-            is_creator = interaction.user == interaction.channel.owner
-            is_moderator = any(role.id in moderator_ids for role in interaction.user.roles)
-            is_admin = interaction.user.guild_permissions.administrator
+            is_creator = interaction.user.id == creator_id
             
-            if not (is_creator or is_moderator or is_admin):
+            if not (is_creator or self.is_staff(interaction.user)):
                 await interaction.response.send_message(
                     "❌ You don't have permission to close this ticket",
                     ephemeral=True
@@ -258,19 +863,11 @@ class TicketSystem(commands.Cog):
             
             print(f"[TICKET] Closing ticket: {interaction.channel.name}")
             
-            # Send closing message
-            closing_embed = discord.Embed(
-                title="🔒 Ticket Closed",
-                description=f"This ticket was closed by {interaction.user.mention}",
-                color=discord.Color.red(),
-                timestamp=datetime.now()
-            )
-            await interaction.channel.send(embed=closing_embed)
-            
-            # Delete channel
-            await interaction.channel.delete(reason=f"Ticket closed by {interaction.user}")
-            
-            print(f"[TICKET] Ticket deleted successfully")
+            if not await self.close_ticket_channel(interaction.channel, interaction.user):
+                await interaction.followup.send(
+                    "❌ Could not save the transcript, so the ticket was not deleted",
+                    ephemeral=True
+                )
             
         except discord.Forbidden:
             await interaction.response.send_message(
@@ -286,6 +883,289 @@ class TicketSystem(commands.Cog):
                 )
             except:
                 pass
+    
+    async def close_ticket_channel(self, channel: discord.TextChannel, closed_by: discord.abc.User, reason: str = None) -> bool:
+        """
+        Announce, archive and delete a ticket channel
+        
+        Args:
+            channel: Ticket channel
+            closed_by: Member (or the bot) closing the ticket
+            reason: Text shown in the closing message
+        
+        Returns:
+            False if the transcript could not be saved; the channel is then kept
+        """
+        # Archived threads reject messages while locked, and close_ticket_channel posts into them
+        if isinstance(channel, discord.Thread) and channel.archived:
+            if channel.locked:
+                await channel.edit(archived=False, locked=False)
+            else:
+                await channel.edit(archived=False)
+        
+        # Archive the conversation before the channel is gone; a failed archive is retried,
+        # so nothing is announced in the ticket until it succeeded
+        transcript_channel_id = self.config.get('channels', {}).get('transcript_channel_id')
+        transcript_channel = channel.guild.get_channel(transcript_channel_id) if transcript_channel_id else None
+        if transcript_channel is not None and not await self.archive_transcript(channel, closed_by, transcript_channel):
+            return False
+        
+        # Send closing message
+        closing_embed = discord.Embed(
+            title="🔒 Ticket Closed",
+            description=reason or f"This ticket was closed by {closed_by.mention}",
+            color=discord.Color.red(),
+            timestamp=datetime.now()
+        )
+        await channel.send(embed=closing_embed)
+        
+        # Delete channel
+        await self.mark_ticket_closed(channel.id)
+        await channel.delete(reason=f"Ticket closed by {closed_by}")
+        
+        print(f"[TICKET] Ticket deleted successfully")
+        return True
+    
+    async def archive_transcript(
+        self,
+        channel: discord.TextChannel,
+        closed_by: discord.abc.User,
+        transcript_channel: discord.TextChannel
+    ) -> bool:
+        """Stream the ticket history into a transcript and upload it"""
+        writer = None
+        
+        try:
+            # Messages are indexed for /ticket search in the same batches as the files are written
+            index_factory = partial(
+                TranscriptIndex, self.tickets_db, channel.id, channel.guild.id, channel.name, closed_by.id
+            )
+            writer = await build_transcript(channel, index_factory, self.blob_store)
+            uploads = await self.bot.loop.run_in_executor(
+                None, transcript_uploads, writer, channel.guild.filesize_limit
+            )
+            
+            embed = discord.Embed(
+                title="📁 Ticket Transcript",
+                description=f"**Ticket:** #{channel.name}\n**Closed by:** {closed_by.mention}",
+                color=discord.Color.blurple(),
+                timestamp=datetime.now()
+            )
+            embed.add_field(name="Messages", value=str(writer.count), inline=True)
+            split = any(path not in (writer.jsonl_path, writer.html_path) for paths in uploads for path in paths)
+            if split or len(uploads) > 1:
+                embed.add_field(
+                    name="Split upload",
+                    value=f"Sent in {len(uploads)} message(s); join `.partN` files in order to restore them",
+                    inline=False
+                )
+            
+            # Every part must be uploaded before the channel may be deleted
+            for number, paths in enumerate(uploads, start=1):
+                files = [discord.File(path, filename=os.path.basename(path)) for path in paths]
+                if number == 1:
+                    await transcript_channel.send(embed=embed, files=files)
+                else:
+                    await transcript_channel.send(f"#{channel.name} transcript, part {number}/{len(uploads)}", files=files)
+            print(f"[TICKET] Archived {writer.count} message(s) from {channel.name}")
+            return True
+        except (discord.HTTPException, OSError, sqlite3.Error) as e:
+            print(f"[TICKET] Error archiving transcript for {channel.name}: {e}")
+            return False
+        finally:
+            if writer is not None:
+                await self.bot.loop.run_in_executor(None, writer.cleanup)
+    
+    ticket_group = app_commands.Group(name="ticket", description="Ticket tools")
+    
+    @ticket_group.command(name="search", description="Search archived ticket transcripts")
+    @app_commands.describe(
+        query="Words to search for",
+        author="Only messages from this member"
+    )
+    async def search_tickets(self, interaction: discord.Interaction, query: str, author: discord.Member = None):
+        """Full-text search over archived ticket messages, best matches first"""
+        if not self.is_staff(interaction.user):
+            await interaction.response.send_message(
+                "❌ You don't have permission to search tickets",
+                ephemeral=True
+            )
+            return
+        
+        match = fts_query(query)
+        if not match:
+            await interaction.response.send_message("❌ Enter something to search for", ephemeral=True)
+            return
+        
+        sql = """
+            SELECT m.ticket_id, m.author, m.created_at, a.channel_name, a.closed_at,
+                   snippet(ticket_messages, 0, '**', '**', '…', 16) AS excerpt
+            FROM ticket_messages m
+            JOIN ticket_archive a ON a.ticket_id = m.ticket_id
+            WHERE ticket_messages MATCH ? AND a.guild_id = ?
+        """
+        params = [match, interaction.guild.id]
+        if author is not None:
+            sql += " AND m.author_id = ?"
+            params.append(author.id)
+        sql += " ORDER BY rank LIMIT 10"
+        
+        try:
+            async with aiosqlite.connect(self.tickets_db) as db:
+                rows = await db.execute_fetchall(sql, params)
+        except sqlite3.Error as e:
+            print(f"[TICKET] Error searching transcripts: {e}")
+            await interaction.response.send_message("❌ Search failed", ephemeral=True)
+            return
+        
+        if not rows:
+            await interaction.response.send_message(f"No archived messages match **{query[:100]}**", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="🔎 Ticket Search",
+            description=f"Best matches for **{discord.utils.escape_markdown(query[:100])}**",
+            color=discord.Color.blue()
+        )
+        for ticket_id, message_author, created_at, channel_name, closed_at, excerpt in rows:
+            embed.add_field(
+                name=f"#{channel_name} · {message_author}"[:256],
+                value=f"{excerpt[:900]}\n<t:{int(datetime.fromisoformat(created_at).timestamp())}:f> · closed <t:{closed_at}:R>",
+                inline=False
+            )
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @ticket_group.command(name="stats", description="Show ticket response and resolution times")
+    @app_commands.describe(
+        days="How many days to include (default 7)",
+        moderator="Only this moderator's tickets"
+    )
+    async def ticket_stats(
+        self,
+        interaction: discord.Interaction,
+        days: app_commands.Range[int, 1, 365] = 7,
+        moderator: discord.Member = None
+    ):
+        """Summarise first-response and resolution times from the daily rollups"""
+        if not self.is_staff(interaction.user):
+            await interaction.response.send_message(
+                "❌ You don't have permission to view ticket stats",
+                ephemeral=True
+            )
+            return
+        
+        # Rollups are merged per day in the database; only the unflushed tail is written first
+        await self._flush_stats()
+        
+        since = time.strftime("%Y-%m-%d", time.gmtime(time.time() - (days - 1) * 86400))
+        sql = """
+            SELECT moderator_id, metric, count, total, histogram FROM ticket_stats
+            WHERE guild_id = ? AND day >= ?
+        """
+        params = [interaction.guild.id, since]
+        if moderator is not None:
+            sql += " AND moderator_id = ?"
+            params.append(moderator.id)
+        
+        try:
+            rows = await self.db.execute_fetchall(sql, params)
+        except sqlite3.Error as e:
+            print(f"[TICKET] Error reading ticket stats: {e}")
+            await interaction.response.send_message("❌ Could not read ticket stats", ephemeral=True)
+            return
+        
+        totals = defaultdict(DurationHistogram)
+        for moderator_id, metric, count, total, buckets in rows:
+            totals[(moderator_id, metric)].merge(DurationHistogram.loads(buckets, count, total))
+        
+        def summary(histogram: DurationHistogram) -> str:
+            if not histogram.count:
+                return "No data"
+            return (
+                f"Median `{format_duration(histogram.quantile(0.5))}` · "
+                f"p90 `{format_duration(histogram.quantile(0.9))}` · "
+                f"Avg `{format_duration(histogram.mean)}` · "
+                f"{histogram.count} ticket(s)"
+            )
+        
+        target = moderator.id if moderator is not None else 0
+        embed = discord.Embed(
+            title="📊 Ticket Stats",
+            description=f"Last **{days}** day(s)" + (f" for {moderator.mention}" if moderator is not None else ""),
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="First Response", value=summary(totals[(target, "first_response")]), inline=False)
+        embed.add_field(name="Resolution", value=summary(totals[(target, "resolution")]), inline=False)
+        
+        if moderator is None:
+            waiting = sum(
+                1 for channel_id, (guild_id, _) in self.ticket_opened.items()
+                if guild_id == interaction.guild.id and channel_id not in self.first_responders
+            )
+            embed.add_field(name="Awaiting First Response", value=str(waiting), inline=False)
+            
+            responders = sorted(
+                (
+                    (histogram, moderator_id) for (moderator_id, metric), histogram in totals.items()
+                    if moderator_id and metric == "first_response"
+                ),
+                key=lambda item: item[0].count,
+                reverse=True
+            )[:10]
+            if responders:
+                embed.add_field(
+                    name="By Moderator (first responses)",
+                    value="\n".join(
+                        f"<@{moderator_id}> — {histogram.count} · median `{format_duration(histogram.quantile(0.5))}`"
+                        for histogram, moderator_id in responders
+                    ),
+                    inline=False
+                )
+        
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @ticket_group.command(name="role", description="Set the support role that can see and close tickets")
+    @app_commands.describe(role="Support role (in addition to the configured moderator roles)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_support_role(self, interaction: discord.Interaction, role: discord.Role):
+        """Set the per-server support role"""
+        async with self.write_lock:
+            await self.db.execute(
+                "INSERT OR REPLACE INTO tickets_role (role, guild) VALUES (?, ?)",
+                (role.id, interaction.guild.id)
+            )
+            await self.db.commit()
+        self.support_roles[interaction.guild.id] = role.id
+        self.ticket_templates.pop(interaction.guild.id, None)
+        
+        await interaction.response.send_message(
+            f"✅ {role.mention} can now see and close new tickets",
+            ephemeral=True
+        )
+
+    
+    @ticket_group.command(name="mode", description="Choose whether new tickets are channels or private threads")
+    @app_commands.describe(mode="channel: one channel per ticket; thread: a private thread under the ticket channel")
+    @app_commands.choices(mode=[
+        app_commands.Choice(name="channel", value="channel"),
+        app_commands.Choice(name="thread", value="thread")
+    ])
+    @app_commands.checks.has_permissions(administrator=True)
+    async def set_ticket_mode(self, interaction: discord.Interaction, mode: app_commands.Choice[str]):
+        """Set the per-server ticket mode; open tickets keep their current form"""
+        async with self.write_lock:
+            await self.db.execute(
+                "INSERT OR REPLACE INTO ticket_settings (guild_id, mode) VALUES (?, ?)",
+                (interaction.guild.id, mode.value)
+            )
+            await self.db.commit()
+        self.ticket_modes[interaction.guild.id] = mode.value
+        
+        await interaction.response.send_message(
+            f"✅ New tickets will be opened as **{mode.value}s**",
+            ephemeral=True
+        )
 
 
 async def setup(bot: commands.Bot):
@@ -0,0 +1,14 @@
+import os
+import shutil
+import pytest
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run a test in a scratch directory holding a copy of config/ (the cogs read relative paths)"""
+    shutil.copytree(os.path.join(REPO_ROOT, "config"), tmp_path / "config")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,204 @@
+"""Tests for the anti-link AutoMod sync against a stubbed Discord HTTP layer"""
+import asyncio
+import itertools
+import json
+from types import SimpleNamespace
+import discord
+import pytest
+from commands.antilink import AntiLink
+from utils.automod_sync import (
+    MANAGED_RULE_PREFIX,
+    _rule_signature,
+    build_antilink_rules,
+    plan_automod_sync,
+    sync_antilink_automod,
+)
+
+
+CONFIG = {
+    'blocked_domains': ['discord.gg', 'Evil.com'],
+    'blocked_keywords': ['*freenitro*'],
+    'timeout_minutes': 5,
+    'whitelist_role_ids': [30, 20],
+    'automod_alert_channel_id': 555,
+}
+
+
+class FakeAutoModHTTP:
+    """Stores rules as API payloads and echoes them back the way Discord does (ids as strings)"""
+
+    def __init__(self):
+        self.rules = {}
+        self.calls = []
+        self.ids = itertools.count(1000)
+
+    def add(self, **payload):
+        rule_id = str(next(self.ids))
+        self.rules[rule_id] = {
+            'id': rule_id,
+            'guild_id': '1',
+            'creator_id': '99',
+            'event_type': 1,
+            'trigger_metadata': {},
+            'actions': [],
+            'enabled': True,
+            'exempt_roles': [],
+            'exempt_channels': [],
+            **payload,
+        }
+        return self.rules[rule_id]
+
+    async def get_auto_moderation_rules(self, guild_id):
+        return [dict(rule) for rule in self.rules.values()]
+
+    async def create_auto_moderation_rule(self, guild_id, *, reason=None, **payload):
+        self.calls.append(('create', payload['name']))
+        payload['exempt_roles'] = payload['exempt_roles'] or []
+        payload['exempt_channels'] = payload['exempt_channels'] or []
+        return dict(self.add(**payload))
+
+    async def edit_auto_moderation_rule(self, guild_id, rule_id, *, reason=None, **payload):
+        rule = self.rules[str(rule_id)]
+        self.calls.append(('edit', rule['name']))
+        payload['exempt_roles'] = [str(role_id) for role_id in payload.get('exempt_roles', rule['exempt_roles'])]
+        rule.update(payload)
+        return dict(rule)
+
+    async def delete_auto_moderation_rule(self, guild_id, rule_id, *, reason=None):
+        self.calls.append(('delete', self.rules.pop(str(rule_id))['name']))
+
+
+class FakeGuild:
+    """Borrows the real Guild methods, which only need an id and the HTTP client"""
+
+    fetch_automod_rules = discord.Guild.fetch_automod_rules
+    create_automod_rule = discord.Guild.create_automod_rule
+
+    def __init__(self):
+        self.id = 1
+        self._state = SimpleNamespace(http=FakeAutoModHTTP())
+
+    @property
+    def http(self):
+        return self._state.http
+
+    def rule(self, payload):
+        return discord.AutoModRule(data=payload, guild=self, state=self._state)
+
+
+def sync(guild, config):
+    return asyncio.run(sync_antilink_automod(guild, config, reason="test"))
+
+
+def test_signature_survives_the_api_round_trip():
+    guild = FakeGuild()
+    spec = build_antilink_rules(CONFIG)[0]
+
+    created = asyncio.run(guild.create_automod_rule(
+        name=spec['name'],
+        event_type=discord.AutoModRuleEventType.message_send,
+        trigger=spec['trigger'],
+        actions=spec['actions'],
+        enabled=True,
+        exempt_roles=[discord.Object(id=role_id) for role_id in spec['exempt_roles']],
+    ))
+
+    assert _rule_signature(created.trigger, created.actions, created.exempt_role_ids, created.enabled) == \
+        _rule_signature(spec['trigger'], spec['actions'], spec['exempt_roles'], True)
+    assert plan_automod_sync([created], [spec]) == ([], [], [])
+
+
+def test_first_sync_creates_the_rule():
+    guild = FakeGuild()
+
+    assert sync(guild, CONFIG) == {'created': 1, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    (rule,) = guild.http.rules.values()
+    assert rule['name'] == f"{MANAGED_RULE_PREFIX} Blocked links"
+    assert rule['trigger_metadata']['keyword_filter'] == ['*discord.gg*', '*evil.com*', '*freenitro*']
+    assert sorted(rule['exempt_roles']) == ['20', '30']
+    assert {action['type'] for action in rule['actions']} == {1, 2, 3}
+
+
+def test_unchanged_config_is_a_no_op():
+    guild = FakeGuild()
+    sync(guild, CONFIG)
+    guild.http.calls.clear()
+
+    assert sync(guild, CONFIG) == {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 1}
+    assert guild.http.calls == []
+
+
+@pytest.mark.parametrize("change", [
+    {'blocked_domains': ['discord.gg']},
+    {'timeout_minutes': 10},
+    {'whitelist_role_ids': [20]},
+    {'automod_alert_channel_id': None},
+])
+def test_changed_config_updates_the_rule_in_place(change):
+    guild = FakeGuild()
+    sync(guild, CONFIG)
+    (rule_id,) = guild.http.rules
+    guild.http.calls.clear()
+
+    assert sync(guild, {**CONFIG, **change}) == {'created': 0, 'updated': 1, 'deleted': 0, 'unchanged': 0}
+    assert guild.http.calls == [('edit', f"{MANAGED_RULE_PREFIX} Blocked links")]
+    assert list(guild.http.rules) == [rule_id]
+
+    # The edited rule now matches the new config
+    assert sync(guild, {**CONFIG, **change})['unchanged'] == 1
+
+
+def test_stale_managed_rules_are_deleted_and_others_left_alone():
+    guild = FakeGuild()
+    guild.http.add(name=f"{MANAGED_RULE_PREFIX} Blocked links 2", trigger_type=1,
+                   trigger_metadata={'keyword_filter': ['*old.com*'], 'regex_patterns': []})
+    guild.http.add(name="Spam filter", trigger_type=1,
+                   trigger_metadata={'keyword_filter': ['*spam*'], 'regex_patterns': []})
+
+    assert sync(guild, CONFIG) == {'created': 1, 'updated': 0, 'deleted': 1, 'unchanged': 0}
+    assert {rule['name'] for rule in guild.http.rules.values()} == {
+        f"{MANAGED_RULE_PREFIX} Blocked links", "Spam filter"
+    }
+    # Deleted first, so the replacement does not count against the rule limit
+    assert [call[0] for call in guild.http.calls] == ['delete', 'create']
+
+
+def test_trigger_type_change_replaces_the_rule():
+    guild = FakeGuild()
+    existing = guild.rule(guild.http.add(
+        name=f"{MANAGED_RULE_PREFIX} Blocked links", trigger_type=5,
+        trigger_metadata={'mention_total_limit': 5}
+    ))
+    spec = build_antilink_rules(CONFIG)[0]
+
+    assert plan_automod_sync([existing], [spec]) == ([spec], [], [existing])
+
+
+def test_sync_command_rebuilds_the_local_filter(workdir):
+    cog = AntiLink(bot=None)
+    assert cog.is_link("grab it at freenitro now") is None
+
+    settings_path = workdir / "config" / "settings.json"
+    settings = json.loads(settings_path.read_text(encoding="utf-8"))
+    settings['features']['antilink']['blocked_keywords'] = ['*freenitro*']
+    settings_path.write_text(json.dumps(settings), encoding="utf-8")
+
+    guild = FakeGuild()
+    sent = []
+
+    async def defer(ephemeral=False):
+        pass
+
+    async def send(embed=None, ephemeral=False):
+        sent.append(embed)
+
+    interaction = SimpleNamespace(
+        guild=guild, user="admin",
+        response=SimpleNamespace(defer=defer), followup=SimpleNamespace(send=send)
+    )
+    asyncio.run(AntiLink.automod_sync.callback(cog, interaction))
+
+    assert sent[0].title == "AutoMod Sync Complete"
+    assert guild.http.calls == [('create', f"{MANAGED_RULE_PREFIX} Blocked links")]
+    assert cog.is_link("grab it at freenitro now") == "link"
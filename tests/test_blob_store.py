@@ -0,0 +1,192 @@
+"""Tests for utils.blob_store against a local aiohttp server"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import aiosqlite
+import pytest
+from aiohttp import web
+from utils.blob_store import BlobStore
+from utils.database import create_database_tables
+
+
+FILES = {
+    "a.png": os.urandom(200_000),
+    "b.png": os.urandom(50_000),
+    "big.bin": os.urandom(300_000),
+}
+
+
+def attachment(attachment_id, name, port, size=None):
+    return {
+        'id': attachment_id,
+        'filename': name,
+        'url': f"http://127.0.0.1:{port}/{name}",
+        'size': len(FILES.get(name, b"")) if size is None else size
+    }
+
+
+async def serve(request):
+    name = request.match_info['name']
+    if name not in FILES:
+        raise web.HTTPNotFound()
+    return web.Response(body=FILES[name])
+
+
+def blob_files(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        if os.path.basename(root) != "tmp"
+        for name in names
+    )
+
+
+def run_with_store(tmp_path, scenario, max_size=250_000):
+    """Run scenario(store, db, port) against a fresh database, blob directory and server"""
+    async def main():
+        db_path = str(tmp_path / "tickets.db")
+        await create_database_tables(db_path)
+
+        app = web.Application()
+        app.router.add_get("/{name}", serve)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        db = await aiosqlite.connect(db_path)
+        store = BlobStore(db, asyncio.Lock(), directory=str(tmp_path / "blobs"), max_size=max_size)
+        await store.open()
+        try:
+            return await scenario(store, db, port)
+        finally:
+            await store.close()
+            await db.close()
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_same_content_is_stored_once(tmp_path):
+    async def scenario(store, db, port):
+        first = [{'id': 1, 'attachments': [attachment(10, "a.png", port), attachment(11, "a.png", port)]}]
+        second = [{'id': 2, 'attachments': [attachment(20, "a.png", port), attachment(21, "b.png", port)]}]
+        await store.store_attachments(1, first)
+        await store.store_attachments(2, second)
+        blobs = dict(await db.execute_fetchall("SELECT sha256, refcount FROM ticket_blobs"))
+        return first, second, blobs
+
+    first, second, blobs = run_with_store(tmp_path, scenario)
+
+    sha_a = hashlib.sha256(FILES["a.png"]).hexdigest()
+    sha_b = hashlib.sha256(FILES["b.png"]).hexdigest()
+    assert [a['sha256'] for a in first[0]['attachments'] + second[0]['attachments']] == [sha_a, sha_a, sha_a, sha_b]
+    assert blobs == {sha_a: 3, sha_b: 1}
+
+    files = blob_files(tmp_path / "blobs")
+    assert len(files) == 2
+    for path in files:
+        with open(path, "rb") as f:
+            assert hashlib.sha256(f.read()).hexdigest() == os.path.basename(os.path.dirname(path)) + os.path.basename(path)
+
+
+def test_retry_reuses_stored_attachments(tmp_path):
+    async def scenario(store, db, port):
+        await store.store_attachments(1, [{'id': 1, 'attachments': [attachment(10, "a.png", port)]}])
+
+        # The URL is dead by now; the stored row must be used instead of a download
+        retry = [{'id': 1, 'attachments': [dict(attachment(10, "a.png", port), url=f"http://127.0.0.1:{port}/gone")]}]
+        await store.store_attachments(1, retry)
+        return retry, await db.execute_fetchall("SELECT refcount FROM ticket_blobs")
+
+    retry, refcounts = run_with_store(tmp_path, scenario)
+
+    assert retry[0]['attachments'][0]['sha256'] == hashlib.sha256(FILES["a.png"]).hexdigest()
+    assert refcounts == [(1,)]
+
+
+def test_release_drops_unreferenced_blobs_only(tmp_path):
+    async def scenario(store, db, port):
+        await store.store_attachments(1, [{'id': 1, 'attachments': [attachment(10, "a.png", port), attachment(11, "b.png", port)]}])
+        await store.store_attachments(2, [{'id': 2, 'attachments': [attachment(20, "a.png", port)]}])
+
+        await store.release_ticket(1)
+        after_first = (
+            dict(await db.execute_fetchall("SELECT sha256, refcount FROM ticket_blobs")),
+            blob_files(tmp_path / "blobs")
+        )
+        await store.release_ticket(2)
+        after_second = (
+            await db.execute_fetchall("SELECT count(*) FROM ticket_blobs"),
+            await db.execute_fetchall("SELECT count(*) FROM ticket_attachments"),
+            blob_files(tmp_path / "blobs")
+        )
+        return after_first, after_second
+
+    (blobs, files), (blob_rows, attachment_rows, files_left) = run_with_store(tmp_path, scenario)
+
+    sha_a = hashlib.sha256(FILES["a.png"]).hexdigest()
+    assert blobs == {sha_a: 1}
+    assert files == [str(tmp_path / "blobs" / sha_a[:2] / sha_a[2:])]
+    assert blob_rows == [(0,)] and attachment_rows == [(0,)] and files_left == []
+
+
+def test_failed_and_oversized_downloads_keep_only_the_url(tmp_path):
+    async def scenario(store, db, port):
+        records = [{'id': 1, 'attachments': [
+            attachment(10, "missing.png", port, size=10),
+            attachment(11, "big.bin", port, size=100),  # reported small, streams past max_size
+            attachment(12, "big.bin", port),  # reported too large, never downloaded
+            attachment(13, "b.png", port),
+        ]}]
+        await store.store_attachments(1, records)
+        return records, await db.execute_fetchall("SELECT attachment_id FROM ticket_attachments")
+
+    records, stored = run_with_store(tmp_path, scenario)
+
+    assert ['sha256' in a for a in records[0]['attachments']] == [False, False, False, True]
+    assert stored == [(13,)]
+    assert len(blob_files(tmp_path / "blobs")) == 1
+    assert os.listdir(tmp_path / "blobs" / "tmp") == []
+
+
+def test_temp_files_are_removed_when_storing_fails(tmp_path):
+    async def scenario(store, db, port):
+        # The downloads finish, then writing the references fails
+        async def fail(*args):
+            raise sqlite3.OperationalError("database is locked")
+        store._add_reference = fail
+
+        with pytest.raises(sqlite3.OperationalError):
+            await store.store_attachments(1, [{'id': 1, 'attachments': [attachment(10, "a.png", port), attachment(11, "b.png", port)]}])
+        return os.listdir(tmp_path / "blobs" / "tmp"), blob_files(tmp_path / "blobs")
+
+    # Neither partial downloads nor blobs placed without a reference are left behind
+    assert run_with_store(tmp_path, scenario) == ([], [])
+
+
+def test_failed_reference_write_is_rolled_back(tmp_path):
+    async def scenario(store, db, port):
+        add_reference = store._add_reference
+        calls = []
+
+        async def fail_second(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise sqlite3.OperationalError("disk I/O error")
+            await add_reference(*args)
+        store._add_reference = fail_second
+
+        with pytest.raises(sqlite3.OperationalError):
+            await store.store_attachments(1, [{'id': 1, 'attachments': [attachment(10, "a.png", port), attachment(11, "b.png", port)]}])
+
+        # An unrelated commit on the shared connection must not persist the first reference
+        await db.commit()
+        return (
+            await db.execute_fetchall("SELECT count(*) FROM ticket_attachments"),
+            await db.execute_fetchall("SELECT count(*) FROM ticket_blobs")
+        )
+
+    assert run_with_store(tmp_path, scenario) == ([(0,)], [(0,)])
@@ -0,0 +1,60 @@
+"""Tests for the debounced live entrant counter"""
+import asyncio
+import time
+from types import SimpleNamespace
+from commands.giveaway import GiveawayCog, get_config
+from utils.database import init_databases
+
+
+INTERVAL = 0.2
+MESSAGE_ID = 10
+
+
+async def run_reactions(duration):
+    await init_databases(get_config()['database'])
+    edits = []
+
+    async def edit(embed):
+        # The edit itself takes a while, like a REST call
+        await asyncio.sleep(0.02)
+        edits.append(time.monotonic())
+
+    channel = SimpleNamespace(get_partial_message=lambda message_id: SimpleNamespace(edit=edit))
+    cog = GiveawayCog(SimpleNamespace(get_channel=lambda channel_id: channel, user=SimpleNamespace(id=999)))
+    cog.counter_interval = INTERVAL
+    await cog.cog_load()
+    async with cog.write_lock:
+        await cog.con.execute(
+            """
+            INSERT INTO giveaways (guild_id, message_id, channel_id, end_timestamp, required_invites, prize, winner_count)
+            VALUES (1, ?, 2, ?, 0, 'Nitro', 1)
+            """,
+            (MESSAGE_ID, int(time.time()) + 3600)
+        )
+        await cog.con.commit()
+    cog.active_giveaways.add(MESSAGE_ID)
+
+    # Steady reactions, including while the editor awaits its SELECT and the edit
+    user_id = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        user_id += 1
+        await cog.on_raw_reaction_add(SimpleNamespace(
+            message_id=MESSAGE_ID, user_id=user_id, emoji=cog.reaction_emoji, member=None
+        ))
+        await asyncio.sleep(0.003)
+
+    await asyncio.sleep(INTERVAL * 2)
+    rendered = cog.rendered_counts.get(MESSAGE_ID)
+    await cog.con.close()
+    return edits, rendered, user_id
+
+
+def test_edits_are_spaced_by_the_interval(workdir):
+    edits, rendered, reactions = asyncio.run(run_reactions(1.5))
+
+    gaps = [later - earlier for earlier, later in zip(edits, edits[1:])]
+    assert len(edits) >= 5
+    assert min(gaps) >= INTERVAL * 0.95
+    # The last edit shows the final count
+    assert rendered == reactions
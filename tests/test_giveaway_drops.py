@@ -0,0 +1,112 @@
+"""Load test for first-come drops: thousands of concurrent clicks on one drop"""
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+import discord
+from commands.giveaway import DROP_CUSTOM_ID_PREFIX, GiveawayCog, get_config
+from utils.database import init_databases
+
+
+CLICKS = 3000
+SLOTS = 25
+
+
+def make_click(drop_id, user_id, responses):
+    async def answer(content, ephemeral=False, deferred=False):
+        # Every winner must already be on disk when they are told they won
+        with sqlite3.connect("db/giveaway.db") as con:
+            saved = con.execute(
+                "SELECT 1 FROM drop_claims WHERE drop_id = ? AND user_id = ?", (drop_id, user_id)
+            ).fetchone() is not None
+        responses.append((user_id, content, saved, deferred))
+
+    async def send_message(content, ephemeral=False):
+        await answer(content)
+
+    async def followup(content, ephemeral=False):
+        await answer(content, deferred=True)
+
+    async def defer(ephemeral=False):
+        pass
+
+    return SimpleNamespace(
+        type=discord.InteractionType.component,
+        data={'custom_id': f"{DROP_CUSTOM_ID_PREFIX}{drop_id}"},
+        user=SimpleNamespace(id=user_id),
+        response=SimpleNamespace(send_message=send_message, defer=defer),
+        followup=SimpleNamespace(send=followup)
+    )
+
+
+async def run_drop(busy_seconds=0.0):
+    await init_databases(get_config()['database'])
+    cog = GiveawayCog(SimpleNamespace(get_channel=lambda channel_id: None))
+    await cog.cog_load()
+
+    drop_id = 1
+    cog.drops[drop_id] = {
+        'guild_id': 1, 'channel_id': 2, 'message_id': 3, 'prize': "Nitro", 'slots': SLOTS,
+        'claims': {}, 'saved': set()
+    }
+    async with cog.write_lock:
+        await cog.con.execute(
+            "INSERT INTO giveaway_drops (drop_id, guild_id, channel_id, message_id, prize, slots) VALUES (?, ?, ?, ?, ?, ?)",
+            (drop_id, 1, 2, 3, "Nitro", SLOTS)
+        )
+        await cog.con.commit()
+
+    batches = []
+    executemany = cog.con.executemany
+
+    async def counting_executemany(sql, rows):
+        if "drop_claims" in sql:
+            batches.append(len(rows))
+        return await executemany(sql, rows)
+    cog.con.executemany = counting_executemany
+
+    async def hold_write_lock():
+        # Stands in for a large entry flush or a giveaway ending
+        async with cog.write_lock:
+            await asyncio.sleep(busy_seconds)
+
+    responses = []
+    await asyncio.gather(hold_write_lock(), *(
+        cog.on_interaction(make_click(drop_id, user_id, responses)) for user_id in range(1, CLICKS + 1)
+    ))
+    # Let the finishing task mark the drop as ended
+    await asyncio.sleep(0.1)
+
+    claims = await cog.con.execute_fetchall("SELECT user_id FROM drop_claims WHERE drop_id = ?", (drop_id,))
+    ended = await cog.con.execute_fetchall("SELECT ended FROM giveaway_drops WHERE drop_id = ?", (drop_id,))
+    await cog.con.close()
+    return responses, {row['user_id'] for row in claims}, ended[0]['ended'], drop_id in cog.drops, batches
+
+
+def check_drop(responses, claimed, ended, still_open, batches):
+    winners = {user_id for user_id, content, *_ in responses if content.startswith("🎉")}
+    assert len(responses) == CLICKS
+    assert len(winners) == SLOTS
+    assert winners == claimed
+    assert all(saved for user_id, _, saved, _ in responses if user_id in winners)
+    assert ended == 1 and not still_open
+
+    # Winners clicking together are written as one group commit, not one transaction each
+    assert sum(batches) == SLOTS and len(batches) <= 2
+
+
+def test_concurrent_clicks_fill_exactly_the_slots(workdir):
+    result = asyncio.run(run_drop())
+    check_drop(*result)
+
+    # Losers never wait for the database, and nobody needed a deferred answer
+    assert not any(deferred for *_, deferred in result[0])
+
+
+def test_busy_write_lock_defers_winners_instead_of_missing_the_deadline(workdir, monkeypatch):
+    monkeypatch.setattr("commands.giveaway.CLAIM_ACK_SECONDS", 0.1)
+    result = asyncio.run(run_drop(busy_seconds=0.3))
+    check_drop(*result)
+
+    responses = result[0]
+    assert all(deferred for _, content, _, deferred in responses if content.startswith("🎉"))
+    assert not any(deferred for _, content, _, deferred in responses if not content.startswith("🎉"))
@@ -0,0 +1,46 @@
+"""Tests for buffered giveaway entry writes on the shared connection"""
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+from commands.giveaway import GiveawayCog, get_config
+from utils.database import init_databases
+
+
+async def run_failed_flush():
+    await init_databases(get_config()['database'])
+    cog = GiveawayCog(SimpleNamespace(get_channel=lambda channel_id: None))
+    await cog.cog_load()
+    cog.active_giveaways.add(10)
+    cog.entrants[10] = {1, 2}
+    cog.pending_entries = {(10, 1): True, (10, 2): True, (10, 3): False}
+
+    executemany = cog.con.executemany
+
+    async def failing_executemany(sql, rows):
+        # The inserts succeed, then the deletes fail
+        if sql.startswith("DELETE"):
+            raise sqlite3.OperationalError("database is locked")
+        return await executemany(sql, rows)
+    cog.con.executemany = failing_executemany
+
+    await cog._flush_pending_entries()
+    # A reaction recorded after the failed flush is newer than the buffered one
+    cog.pending_entries[(10, 2)] = False
+    # An unrelated commit must not persist the half-written batch
+    await cog.con.commit()
+    stored = await cog.con.execute_fetchall("SELECT user_id FROM entries")
+    pending = dict(cog.pending_entries)
+
+    cog.con.executemany = executemany
+    await cog._flush_pending_entries()
+    retried = await cog.con.execute_fetchall("SELECT user_id FROM entries")
+    await cog.con.close()
+    return stored, pending, [row['user_id'] for row in retried]
+
+
+def test_failed_entry_flush_is_rolled_back_and_retried(workdir):
+    stored, pending, retried = asyncio.run(run_failed_flush())
+
+    assert stored == []
+    assert pending == {(10, 1): True, (10, 2): False, (10, 3): False}
+    assert retried == [1]
@@ -0,0 +1,59 @@
+"""Tests for invite attribution when an invite is used up by the join it attributes"""
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+import discord
+import commands.giveaway as giveaway
+from commands.giveaway import GiveawayCog
+
+
+class Guild:
+    id = 1
+    name = "guild"
+
+    async def invites(self):
+        # The used-up invite is already gone; nothing else gained uses
+        return []
+
+
+def member(guild, member_id):
+    now = discord.utils.utcnow()
+    return SimpleNamespace(
+        id=member_id, bot=False, guild=guild, joined_at=now, created_at=now - timedelta(days=365)
+    )
+
+
+async def run_join(delete_age=None):
+    guild = Guild()
+    cog = GiveawayCog(SimpleNamespace())
+    cog.server_invites[guild.id] = {"abc": (42, 4, 5)}
+
+    # INVITE_DELETE is dispatched before the GUILD_MEMBER_ADD of the join that used the invite
+    await cog.on_invite_delete(SimpleNamespace(guild=guild, code="abc"))
+    if delete_age is not None:
+        entry, deleted_at = cog.deleted_invites[guild.id]["abc"]
+        cog.deleted_invites[guild.id]["abc"] = (entry, deleted_at - delete_age)
+
+    await cog.on_member_join(member(guild, 7))
+    await cog.join_diff_tasks[guild.id]
+    return cog
+
+
+def test_invite_deleted_before_the_join_is_attributed(workdir, monkeypatch):
+    monkeypatch.setattr(giveaway, "JOIN_COALESCE_SECONDS", 0)
+    cog = asyncio.run(run_join())
+
+    (event,) = cog.pending_invite_events
+    assert event[:2] == ('join', 1)
+    assert event[2] == 7
+    assert event[4:6] == (42, "abc")
+    assert cog.deleted_invites == {}
+
+
+def test_stale_deleted_invites_are_not_attributed(workdir, monkeypatch):
+    monkeypatch.setattr(giveaway, "JOIN_COALESCE_SECONDS", 0)
+    cog = asyncio.run(run_join(delete_age=giveaway.DELETED_INVITE_SECONDS + 1))
+
+    (event,) = cog.pending_invite_events
+    assert event[4:6] == (None, None)
+    assert cog.deleted_invites == {}
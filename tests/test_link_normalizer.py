@@ -0,0 +1,59 @@
+"""Tests for utils.link_normalizer and the anti-link matcher built on it"""
+import os
+import pytest
+from commands.antilink import AntiLink
+from utils.link_normalizer import normalize_link_text
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def antilink(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    return AntiLink(bot=None)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("discord . gg/abc", "discord.gg/abc"),
+    ("discord .gg/abc", "discord.gg/abc"),
+    ("discord. gg/abc", "discord.gg/abc"),
+    ("Discord . GG/abc", "discord.gg/abc"),
+    ("discord dot gg/abc", "discord.gg/abc"),
+    ("discord[.]gg/abc", "discord.gg/abc"),
+    ("DISCORD[DOT]GG/abc", "discord.gg/abc"),
+    ("HXXPS://evil.com", "https://evil.com"),
+    ("ｄｉｓｃｏｒｄ．ｇｇ/abc", "discord.gg/abc"),
+    ("dis​cord.gg/abc", "discord.gg/abc"),
+])
+def test_obfuscated_links_are_folded(text, expected):
+    assert normalize_link_text(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "see you on discord. GG everyone",
+    "I reported it to discordapp. Com support said no",
+    "meet me on discord. gg everyone",
+    "That was fun. Me and him should play again.",
+])
+def test_sentences_are_not_joined(text):
+    assert normalize_link_text(text) == text.lower()
+
+
+@pytest.mark.parametrize("text", [
+    "see you on discord. GG everyone",
+    "I reported it to discordapp. Com support said no",
+    "the discord. Gg was fun",
+])
+def test_sentences_are_not_links(antilink, text):
+    assert antilink.is_link(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "join discord . gg/abc",
+    "join discord. gg/abc",
+    "join discord dot gg/abc",
+    "[free nitro](hxxps://discord . gg/abc)",
+])
+def test_obfuscated_invites_are_links(antilink, text):
+    assert antilink.is_link(text) == "discord_invite"
@@ -0,0 +1,87 @@
+"""Tests for utils.rule_engine"""
+import re
+from types import SimpleNamespace
+import pytest
+from utils.rule_engine import build_regex_prefilter, compile_guild_rules, validate_rule
+
+
+def make_message(content, channel_id=1, role_ids=(), mentions=0):
+    return SimpleNamespace(
+        content=content,
+        embeds=[],
+        attachments=[],
+        channel=SimpleNamespace(id=channel_id),
+        author=SimpleNamespace(id=42, roles=[SimpleNamespace(id=i) for i in role_ids]),
+        raw_mentions=list(range(mentions)),
+        raw_role_mentions=[],
+        jump_url="https://discord.com/channels/1/1/1"
+    )
+
+
+def make_rule(name, **conditions):
+    return {"name": name, "conditions": conditions, "actions": ["delete"]}
+
+
+@pytest.mark.parametrize("conditions", [
+    {"regex": []},
+    {"domains": []},
+    {"min_mentions": 0},
+    {"exempt_roles": [1]},
+    {"exempt_channels": [1], "roles": []},
+])
+def test_rules_without_positive_condition_are_rejected(conditions):
+    with pytest.raises(ValueError):
+        validate_rule(make_rule("empty", **conditions))
+
+
+def test_rule_with_positive_condition_is_accepted():
+    validate_rule(make_rule("mentions", min_mentions=3, exempt_roles=[1]))
+
+
+PATTERNS = [r"(x)", r"(y)\1", r"free\s+nitro", r"(?P<word>spam)(?P=word)", r"(a)?(?(1)b|c)", r"(?i)steam", r"gift\.\w+"]
+TEXTS = ["x", "yy", "yx", "FREE   nitro", "spamspam", "spam", "ab", "c", "steam", "gift.ly", "nothing here"]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_prefilter_union_agrees_with_each_pattern(text):
+    regexes = [re.compile(p, re.IGNORECASE) for p in PATTERNS]
+    union = build_regex_prefilter(regexes)
+    merged = [r for r in regexes if r.pattern in union.pattern]
+
+    # Patterns with groups or inline global flags stay out of the union
+    assert [r.pattern for r in merged] == [r"free\s+nitro", r"gift\.\w+"]
+    assert (union.search(text) is not None) == any(r.search(text) for r in merged)
+
+
+def test_backreference_rule_matches_after_grouped_rule():
+    evaluate = compile_guild_rules([
+        make_rule("first", regex=[r"(x)"]),
+        make_rule("repeat", regex=[r"(y)\1"]),
+        make_rule("nitro", regex=[r"free\s+nitro"]),
+    ])
+
+    assert evaluate(make_message("yy")).name == "repeat"
+    assert evaluate(make_message("free nitro")).name == "nitro"
+    assert evaluate(make_message("hello")) is None
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_evaluation_agrees_with_rules_on_their_own(text):
+    rules = [make_rule(f"rule{i}", regex=[p]) for i, p in enumerate(PATTERNS)]
+    evaluate = compile_guild_rules(rules)
+    expected = next((r["name"] for r in rules if re.search(r["conditions"]["regex"][0], text, re.IGNORECASE)), None)
+
+    matched = evaluate(make_message(text))
+    assert (matched.name if matched else None) == expected
+
+
+def test_conditions_combine():
+    evaluate = compile_guild_rules([
+        make_rule("invites", domains=["discord.gg"], exempt_roles=[7]),
+        make_rule("mass-mention", min_mentions=5, channels=[3]),
+    ])
+
+    assert evaluate(make_message("join discord.gg/abc")).name == "invites"
+    assert evaluate(make_message("join discord.gg/abc", role_ids=[7])) is None
+    assert evaluate(make_message("hi", channel_id=3, mentions=5)).name == "mass-mention"
+    assert evaluate(make_message("hi", channel_id=4, mentions=5)) is None
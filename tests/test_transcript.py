@@ -0,0 +1,49 @@
+"""Tests for splitting transcripts into uploads"""
+import gzip
+import os
+from utils.transcript import TranscriptWriter, transcript_uploads
+
+
+def write_transcript(tmp_path, count):
+    writer = TranscriptWriter("ticket-1", directory=str(tmp_path))
+    writer.write_batch([
+        {
+            'id': i, 'author_id': 1, 'author': "user", 'content': os.urandom(300).hex(),
+            'created_at': "2026-01-01T00:00:00", 'edited_at': None, 'attachments': [], 'embeds': []
+        }
+        for i in range(count)
+    ])
+    writer.close()
+    return writer
+
+
+def test_small_transcript_is_one_upload(tmp_path):
+    writer = write_transcript(tmp_path, 10)
+    assert transcript_uploads(writer, 8 << 20) == [[writer.jsonl_path, writer.html_path]]
+    writer.cleanup()
+    assert not os.path.exists(writer.directory)
+
+
+def test_oversized_transcript_is_split_into_parts_that_restore_it(tmp_path):
+    writer = write_transcript(tmp_path, 2000)
+    limit = 200_000
+    uploads = transcript_uploads(writer, limit)
+
+    paths = [path for paths in uploads for path in paths]
+    assert any(".part" in path for path in paths)
+    assert all(sum(os.path.getsize(path) for path in paths) <= limit for paths in uploads)
+    assert all(len(paths) <= 10 for paths in uploads)
+
+    for original in (writer.jsonl_path, writer.html_path):
+        with open(original, "rb") as f:
+            expected = f.read()
+        if len(expected) <= limit:
+            assert original in paths
+            continue
+        parts = [path for path in paths if path.startswith(original + ".part")]
+        assert len(parts) > 1
+        assert b"".join(open(path, "rb").read() for path in parts) == expected
+        gzip.decompress(expected)
+
+    writer.cleanup()
+    assert not os.path.exists(writer.directory)
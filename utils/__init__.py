@@ -7,6 +7,7 @@ from .helpers import (
     xp_for_next_level,
     create_embed
 )
+from .link_normalizer import normalize_link_text, collect_message_text
 
 __all__ = [
     'load_config',
@@ -17,5 +18,7 @@ __all__ = [
     'parse_time_string',
     'create_permission_overwrite',
     'xp_for_next_level',
-    'create_embed'
+    'create_embed',
+    'normalize_link_text',
+    'collect_message_text'
 ]
@@ -0,0 +1,208 @@
+"""
+Discord AutoMod synchronization for anti-link rules
+
+Translates the anti-link configuration into native AutoMod keyword rules and
+diffs them against the rules that already exist in a guild, so a sync only
+issues the REST calls that are actually needed.
+"""
+import discord
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+# Rules owned by the bot are recognised by this name prefix
+MANAGED_RULE_PREFIX = "[Anti-Link]"
+
+# Discord limits for keyword triggers
+MAX_KEYWORDS_PER_RULE = 1000
+MAX_KEYWORD_LENGTH = 60
+MAX_REGEX_PER_RULE = 10
+
+# Rust-flavoured regexes evaluated by Discord itself
+INVITE_REGEX_PATTERNS = [
+    r"(?i)discord(?:app)?\.(?:gg|com/invite)/[\w-]+",
+    r"(?i)https?://[\w.-]+",
+]
+
+DEFAULT_BLOCK_MESSAGE = "Links are not allowed in this server."
+
+
+def build_antilink_rules(antilink_config: dict) -> List[dict]:
+    """
+    Build the desired AutoMod rules for an anti-link configuration
+
+    Args:
+        antilink_config: The ``features.antilink`` section of settings.json
+
+    Returns:
+        List of rule specs with name, trigger, actions and exempt_roles keys
+    """
+    keywords = []
+    for domain in antilink_config.get('blocked_domains', []):
+        keywords.append(f"*{domain.lower()}*")
+    for keyword in antilink_config.get('blocked_keywords', []):
+        keywords.append(keyword.lower())
+
+    # AutoMod rejects over-long keywords; those stay with the in-process filter
+    keywords = sorted({k for k in keywords if len(k) <= MAX_KEYWORD_LENGTH})
+
+    actions = [
+        discord.AutoModRuleAction(
+            custom_message=antilink_config.get('automod_block_message', DEFAULT_BLOCK_MESSAGE)
+        )
+    ]
+
+    timeout_minutes = antilink_config.get('timeout_minutes', 5)
+    if timeout_minutes:
+        actions.append(discord.AutoModRuleAction(duration=timedelta(minutes=timeout_minutes)))
+
+    alert_channel_id = antilink_config.get('automod_alert_channel_id')
+    if alert_channel_id:
+        actions.append(discord.AutoModRuleAction(channel_id=alert_channel_id))
+
+    exempt_roles = sorted(antilink_config.get('whitelist_role_ids', []))
+
+    chunks = [
+        keywords[i:i + MAX_KEYWORDS_PER_RULE]
+        for i in range(0, len(keywords), MAX_KEYWORDS_PER_RULE)
+    ] or [[]]
+
+    rules = []
+    for index, chunk in enumerate(chunks, start=1):
+        name = f"{MANAGED_RULE_PREFIX} Blocked links"
+        if index > 1:
+            name = f"{name} {index}"
+
+        rules.append({
+            'name': name,
+            'trigger': discord.AutoModTrigger(
+                type=discord.AutoModRuleTriggerType.keyword,
+                keyword_filter=chunk,
+                regex_patterns=INVITE_REGEX_PATTERNS[:MAX_REGEX_PER_RULE] if index == 1 else []
+            ),
+            'actions': actions,
+            'exempt_roles': exempt_roles
+        })
+
+    return rules
+
+
+def _rule_signature(
+    trigger: discord.AutoModTrigger,
+    actions: List[discord.AutoModRuleAction],
+    exempt_role_ids,
+    enabled: bool
+) -> tuple:
+    """Comparable representation of the parts of a rule the bot manages"""
+    return (
+        tuple(sorted(trigger.keyword_filter)),
+        tuple(sorted(trigger.regex_patterns)),
+        tuple(sorted(repr(sorted(action.to_dict().items())) for action in actions)),
+        tuple(sorted(exempt_role_ids)),
+        enabled
+    )
+
+
+def plan_automod_sync(
+    existing_rules: List[discord.AutoModRule],
+    desired_rules: List[dict]
+) -> Tuple[List[dict], List[Tuple[discord.AutoModRule, dict]], List[discord.AutoModRule]]:
+    """
+    Diff existing guild rules against the desired anti-link rules
+
+    Only rules whose name starts with MANAGED_RULE_PREFIX are touched.
+
+    Args:
+        existing_rules: Rules returned by ``guild.fetch_automod_rules()``
+        desired_rules: Rule specs from build_antilink_rules
+
+    Returns:
+        Tuple of (rules to create, (rule, spec) pairs to update, rules to delete)
+    """
+    managed = {
+        rule.name: rule for rule in existing_rules
+        if rule.name.startswith(MANAGED_RULE_PREFIX)
+    }
+
+    to_create = []
+    to_update = []
+    to_delete = []
+
+    for spec in desired_rules:
+        rule = managed.pop(spec['name'], None)
+        if rule is None:
+            to_create.append(spec)
+            continue
+
+        # Discord does not allow changing a rule's trigger type in place
+        if rule.trigger.type != spec['trigger'].type:
+            to_delete.append(rule)
+            to_create.append(spec)
+            continue
+
+        current = _rule_signature(rule.trigger, rule.actions, rule.exempt_role_ids, rule.enabled)
+        desired = _rule_signature(spec['trigger'], spec['actions'], spec['exempt_roles'], True)
+        if current != desired:
+            to_update.append((rule, spec))
+
+    to_delete.extend(managed.values())
+    return to_create, to_update, to_delete
+
+
+async def sync_antilink_automod(
+    guild: discord.Guild,
+    antilink_config: dict,
+    reason: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Push the anti-link configuration to a guild's native AutoMod
+
+    Args:
+        guild: Guild to sync
+        antilink_config: The ``features.antilink`` section of settings.json
+        reason: Audit log reason
+
+    Returns:
+        Counts of created, updated, deleted and unchanged rules
+
+    Raises:
+        discord.Forbidden: If the bot lacks Manage Server
+    """
+    try:
+        existing_rules = await guild.fetch_automod_rules()
+    except discord.NotFound:
+        existing_rules = []
+
+    desired_rules = build_antilink_rules(antilink_config)
+    to_create, to_update, to_delete = plan_automod_sync(existing_rules, desired_rules)
+
+    # Delete first so replaced rules do not count against the per-guild rule limit
+    for rule in to_delete:
+        await rule.delete(reason=reason)
+
+    for spec in to_create:
+        await guild.create_automod_rule(
+            name=spec['name'],
+            event_type=discord.AutoModRuleEventType.message_send,
+            trigger=spec['trigger'],
+            actions=spec['actions'],
+            enabled=True,
+            exempt_roles=[discord.Object(id=role_id) for role_id in spec['exempt_roles']],
+            reason=reason
+        )
+
+    for rule, spec in to_update:
+        await rule.edit(
+            trigger=spec['trigger'],
+            actions=spec['actions'],
+            enabled=True,
+            exempt_roles=[discord.Object(id=role_id) for role_id in spec['exempt_roles']],
+            reason=reason
+        )
+
+    return {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+        'unchanged': len(desired_rules) - len(to_create) - len(to_update)
+    }
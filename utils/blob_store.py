@@ -0,0 +1,219 @@
+"""
+Content-addressed attachment store
+
+Attachments of archived tickets are streamed to disk in chunks and stored
+once per SHA-256 under db/blobs/<first two hex digits>/<rest>. The tickets
+database maps every archived attachment to its blob and keeps a reference
+count per blob, so the same screenshot posted in a hundred tickets takes
+disk space once and is only removed when its last reference goes away.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from typing import List, Optional, Tuple
+import aiohttp
+import aiosqlite
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _write_chunk(file, hasher, chunk: bytes) -> None:
+    hasher.update(chunk)
+    file.write(chunk)
+
+
+class BlobStore:
+    """SHA-256 keyed attachment files with reference counts in the tickets database"""
+
+    def __init__(
+        self,
+        db: aiosqlite.Connection,
+        write_lock: asyncio.Lock,
+        directory: str = "db/blobs",
+        max_size: int = 25 * 1024 * 1024,
+        concurrency: int = 4
+    ):
+        self.db = db
+        self.write_lock = write_lock
+        self.directory = directory
+        self.max_size = max_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        # Partial downloads live next to the blobs so finishing one is an atomic rename
+        self.tmp_directory = os.path.join(directory, "tmp")
+        os.makedirs(self.tmp_directory, exist_ok=True)
+
+    async def open(self) -> None:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300, sock_read=60))
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def path(self, sha256: str) -> str:
+        """Path of a blob on disk"""
+        return os.path.join(self.directory, sha256[:2], sha256[2:])
+
+    async def store_attachments(self, ticket_id: int, records: List[dict]) -> None:
+        """
+        Store the attachments of a batch of transcript records
+
+        Every stored attachment gets a ``sha256`` key in its record. Attachments
+        that fail to download or exceed the size limit keep only their URL.
+
+        Args:
+            ticket_id: Ticket the records belong to
+            records: Transcript records (see ``utils.transcript.message_to_record``)
+        """
+        attachments = [
+            (record['id'], attachment)
+            for record in records
+            for attachment in record['attachments']
+            if attachment['size'] <= self.max_size
+        ]
+        if not attachments:
+            return
+
+        # Attachments already stored by an earlier attempt at archiving this ticket
+        known = dict(await self.db.execute_fetchall(
+            f"""
+            SELECT attachment_id, sha256 FROM ticket_attachments
+            WHERE ticket_id = ? AND attachment_id IN ({','.join('?' * len(attachments))})
+            """,
+            [ticket_id, *(attachment['id'] for _, attachment in attachments)]
+        ))
+        for _, attachment in attachments:
+            if attachment['id'] in known:
+                attachment['sha256'] = known[attachment['id']]
+
+        missing = [(message_id, attachment) for message_id, attachment in attachments if 'sha256' not in attachment]
+        results = await asyncio.gather(*(self._download(attachment['url']) for _, attachment in missing))
+
+        rows = []
+        for (message_id, attachment), result in zip(missing, results):
+            if result is None:
+                continue
+            sha256, size, tmp_path = result
+            rows.append((attachment, message_id, sha256, size, tmp_path))
+        if not rows:
+            return
+
+        now = int(time.time())
+        placed = []
+        try:
+            # Blobs are placed and removed under the write lock, so a blob is never
+            # deleted by release_ticket() between its dedupe check and its new reference
+            async with self.write_lock:
+                try:
+                    for attachment, message_id, sha256, size, tmp_path in rows:
+                        if self._place(sha256, tmp_path):
+                            placed.append(sha256)
+                        await self._add_reference(ticket_id, attachment, message_id, sha256, size, now)
+                    await self.db.commit()
+                except sqlite3.Error:
+                    # The connection is shared, so the half-written references must not ride along
+                    # with the next commit, and blobs placed by this batch have no reference left
+                    await self.db.rollback()
+                    for sha256 in placed:
+                        os.remove(self.path(sha256))
+                    raise
+            for attachment, _, sha256, _, _ in rows:
+                attachment['sha256'] = sha256
+        finally:
+            for *_, tmp_path in rows:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _place(self, sha256: str, tmp_path: str) -> bool:
+        """Move a finished download into place, or drop it if the blob is already stored; True if placed"""
+        path = self.path(sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    async def _add_reference(self, ticket_id: int, attachment: dict, message_id: int, sha256: str, size: int, now: int) -> None:
+        cursor = await self.db.execute(
+            """
+            INSERT OR IGNORE INTO ticket_attachments (ticket_id, attachment_id, message_id, filename, sha256)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (ticket_id, attachment['id'], message_id, attachment['filename'], sha256)
+        )
+        if cursor.rowcount:
+            await self.db.execute(
+                """
+                INSERT INTO ticket_blobs (sha256, size, refcount, created_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT (sha256) DO UPDATE SET refcount = refcount + 1
+                """,
+                (sha256, size, now)
+            )
+
+    async def release_ticket(self, ticket_id: int) -> None:
+        """Drop a ticket's attachment references and delete blobs nobody references any more"""
+        async with self.write_lock:
+            hashes = [sha256 for sha256, in await self.db.execute_fetchall(
+                "SELECT sha256 FROM ticket_attachments WHERE ticket_id = ?", (ticket_id,)
+            )]
+            if not hashes:
+                return
+
+            try:
+                await self.db.execute("DELETE FROM ticket_attachments WHERE ticket_id = ?", (ticket_id,))
+                await self.db.executemany(
+                    "UPDATE ticket_blobs SET refcount = refcount - 1 WHERE sha256 = ?",
+                    [(sha256,) for sha256 in hashes]
+                )
+                unreferenced = [sha256 for sha256, in await self.db.execute_fetchall(
+                    f"SELECT sha256 FROM ticket_blobs WHERE sha256 IN ({','.join('?' * len(hashes))}) AND refcount <= 0",
+                    hashes
+                )]
+                await self.db.executemany(
+                    "DELETE FROM ticket_blobs WHERE sha256 = ?", [(sha256,) for sha256 in unreferenced]
+                )
+                await self.db.commit()
+            except sqlite3.Error:
+                await self.db.rollback()
+                raise
+
+            for sha256 in unreferenced:
+                try:
+                    os.remove(self.path(sha256))
+                except FileNotFoundError:
+                    pass
+
+    async def _download(self, url: str) -> Optional[Tuple[str, int, str]]:
+        """Stream a URL to a temporary file; returns (sha256, size, temporary path) or None on failure"""
+        loop = asyncio.get_running_loop()
+        hasher = hashlib.sha256()
+        size = 0
+
+        async with self.semaphore:
+            fd, tmp_path = tempfile.mkstemp(dir=self.tmp_directory)
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    async with self.session.get(url) as response:
+                        response.raise_for_status()
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            size += len(chunk)
+                            if size > self.max_size:
+                                raise ValueError(f"larger than {self.max_size} bytes")
+                            await loop.run_in_executor(None, _write_chunk, file, hasher, chunk)
+
+                return hasher.hexdigest(), size, tmp_path
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+                print(f"[TICKET] Could not store attachment {url}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                return None
@@ -0,0 +1,176 @@
+"""
+Ticket category pool
+
+Discord caps a category at 50 channels. The pool spreads ticket channels over
+the configured category and numbered overflow categories next to it
+("Tickets (2)", "Tickets (3)", ...), creating overflow categories on demand
+and deleting them again once they are empty. Membership is tracked in memory
+from gateway events plus reservations for channels still being created, so
+concurrent ticket creations never overfill a category.
+"""
+import asyncio
+import itertools
+import re
+from typing import Dict, List, Optional, Set, Tuple
+import discord
+
+
+# Hard Discord limit on channels per category
+CATEGORY_CHANNEL_LIMIT = 50
+
+
+class CategoryPool:
+    """The configured ticket category of one guild plus its overflow categories"""
+
+    def __init__(self, base: discord.CategoryChannel, capacity: int = CATEGORY_CHANNEL_LIMIT):
+        self.guild = base.guild
+        self.base_id = base.id
+        self.capacity = max(1, min(capacity, CATEGORY_CHANNEL_LIMIT))
+        self.name_pattern = re.compile(rf"^{re.escape(base.name)} \((\d+)\)$")
+        self.lock = asyncio.Lock()
+
+        # Reservation tokens are negative so they never collide with channel ids
+        self._tokens = itertools.count(1)
+
+        # category_id -> ids of its channels plus tokens of channels being created, base first
+        self.members: Dict[int, Set[int]] = {}
+        self.numbers: Dict[int, int] = {base.id: 1}
+
+        # Categories created here are used before their gateway event puts them in the cache
+        self.created: Dict[int, discord.CategoryChannel] = {}
+        self.track(base)
+
+        # Overflow categories left over from before a restart are reused
+        overflow = []
+        for category in self.guild.categories:
+            match = self.name_pattern.match(category.name)
+            if match and category.id != base.id:
+                overflow.append((int(match.group(1)), category))
+        for number, category in sorted(overflow, key=lambda item: item[0]):
+            self.numbers[category.id] = number
+            self.track(category)
+
+    def __contains__(self, category_id: int) -> bool:
+        return category_id in self.members
+
+    def track(self, category: discord.CategoryChannel) -> None:
+        """Start tracking a category with the channels currently in it"""
+        self.members[category.id] = {channel.id for channel in category.channels}
+
+    def categories(self) -> List[discord.CategoryChannel]:
+        """Pool categories that still exist, base first"""
+        categories = (
+            self.guild.get_channel(category_id) or self.created.get(category_id)
+            for category_id in self.members
+        )
+        return [category for category in categories if isinstance(category, discord.CategoryChannel)]
+
+    def open_channels(self) -> int:
+        return sum(len(channels) for channels in self.members.values())
+
+    async def reserve(self) -> Tuple[discord.CategoryChannel, int]:
+        """
+        Reserve a slot for a new channel
+
+        Returns:
+            Tuple of (category to create the channel in, reservation token);
+            pass the token to commit() or release()
+
+        Raises:
+            discord.ClientException: If the base category no longer exists
+            discord.HTTPException: If a needed overflow category could not be created
+        """
+        async with self.lock:
+            category = next(
+                (category for category in self.categories() if len(self.members[category.id]) < self.capacity),
+                None
+            )
+            if category is None:
+                category = await self._create_overflow()
+
+            token = -next(self._tokens)
+            self.members[category.id].add(token)
+            return category, token
+
+    def commit(self, category_id: int, token: int, channel_id: int) -> None:
+        """Replace a reservation with the channel that was created for it"""
+        channels = self.members.get(category_id)
+        if channels is not None:
+            channels.discard(token)
+            channels.add(channel_id)
+
+    async def release(self, category_id: int, token: int) -> None:
+        """Give back a reservation whose channel was never created"""
+        channels = self.members.get(category_id)
+        if channels is not None:
+            channels.discard(token)
+            await self.prune(category_id)
+
+    def channel_added(self, channel: discord.abc.GuildChannel) -> None:
+        channels = self.members.get(channel.category_id)
+        if channels is not None:
+            channels.add(channel.id)
+
+    async def channel_removed(self, channel: discord.abc.GuildChannel) -> None:
+        if channel.id in self.members:
+            # A pool category was deleted by hand
+            del self.members[channel.id]
+            self.numbers.pop(channel.id, None)
+            self.created.pop(channel.id, None)
+            return
+
+        channels = self.members.get(channel.category_id)
+        if channels is not None:
+            channels.discard(channel.id)
+            await self.prune(channel.category_id)
+
+    async def prune(self, category_id: int) -> None:
+        """Delete an overflow category once its last channel is gone"""
+        if category_id == self.base_id or self.members.get(category_id, True):
+            return
+
+        async with self.lock:
+            # A reservation may have landed while waiting for the lock
+            if self.members.get(category_id, True):
+                return
+            del self.members[category_id]
+            self.numbers.pop(category_id, None)
+
+            category = self.guild.get_channel(category_id) or self.created.pop(category_id, None)
+            if category is None:
+                return
+            try:
+                await category.delete(reason="Empty ticket overflow category")
+                print(f"[TICKET] Deleted empty overflow category: {category.name}")
+            except discord.HTTPException as e:
+                print(f"[TICKET] Could not delete overflow category {category.name}: {e}")
+
+    async def _create_overflow(self) -> discord.CategoryChannel:
+        """Create the next numbered overflow category; caller holds the lock"""
+        base = self.guild.get_channel(self.base_id)
+        if not isinstance(base, discord.CategoryChannel):
+            raise discord.ClientException("Ticket category not found")
+
+        used = set(self.numbers.values())
+        number = next(n for n in itertools.count(2) if n not in used)
+        last = max(self.categories(), key=lambda category: category.position)
+
+        category = await self.guild.create_category(
+            name=f"{base.name} ({number})",
+            overwrites=base.overwrites,
+            position=last.position + 1,
+            reason="Ticket category is full"
+        )
+        self.numbers[category.id] = number
+        self.members[category.id] = set()
+        self.created[category.id] = category
+        print(f"[TICKET] Created overflow category: {category.name}")
+        return category
+
+
+def find_pool(pools: Dict[int, CategoryPool], channel: discord.abc.GuildChannel) -> Optional[CategoryPool]:
+    """Get the pool a channel or category belongs to, if any"""
+    pool = pools.get(channel.guild.id)
+    if pool is not None and (channel.id in pool or channel.category_id in pool):
+        return pool
+    return None
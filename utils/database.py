@@ -61,17 +61,96 @@ async def create_database_tables(db_path: str) -> None:
                     end_timestamp INTEGER,
                     required_invites INTEGER,
                     prize TEXT,
-                    winner_count INTEGER DEFAULT 1
+                    winner_count INTEGER DEFAULT 1,
+                    weight_by TEXT DEFAULT 'none',
+                    min_level INTEGER DEFAULT 0,
+                    required_role_id INTEGER,
+                    min_account_age_days INTEGER DEFAULT 0
                 )
             """)
+            await add_missing_columns(db, "giveaways", {
+                "weight_by": "TEXT DEFAULT 'none'",
+                "min_level": "INTEGER DEFAULT 0",
+                "required_role_id": "INTEGER",
+                "min_account_age_days": "INTEGER DEFAULT 0"
+            })
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_giveaways_end_timestamp ON giveaways (end_timestamp)"
+            )
+            # invite_count holds net valid invites (joins minus leaves, fakes and rejoins)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS invites (
                     guild_id INTEGER,
                     user_id INTEGER,
                     invite_count INTEGER DEFAULT 0,
+                    joins INTEGER DEFAULT 0,
+                    leaves INTEGER DEFAULT 0,
+                    fakes INTEGER DEFAULT 0,
+                    rejoins INTEGER DEFAULT 0,
                     PRIMARY KEY (guild_id, user_id)
                 )
             """)
+            await add_missing_columns(db, "invites", {
+                "joins": "INTEGER DEFAULT 0",
+                "leaves": "INTEGER DEFAULT 0",
+                "fakes": "INTEGER DEFAULT 0",
+                "rejoins": "INTEGER DEFAULT 0"
+            })
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_invites_leaderboard ON invites (guild_id, invite_count DESC, user_id)"
+            )
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS invite_joins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    guild_id INTEGER,
+                    inviter_id INTEGER,
+                    joiner_id INTEGER,
+                    invite_code TEXT,
+                    joined_at INTEGER,
+                    left_at INTEGER,
+                    counted INTEGER DEFAULT 0
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_invite_joins_joiner ON invite_joins (guild_id, joiner_id, joined_at)"
+            )
+            # First-come button drops and the slots claimed in them
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS giveaway_drops (
+                    drop_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER,
+                    channel_id INTEGER,
+                    message_id INTEGER,
+                    prize TEXT,
+                    slots INTEGER,
+                    ended INTEGER DEFAULT 0
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS drop_claims (
+                    drop_id INTEGER,
+                    user_id INTEGER,
+                    claimed_at REAL,
+                    PRIMARY KEY (drop_id, user_id)
+                )
+            """)
+            # Compact entrant snapshot (packed uint64 user IDs) kept for rerolls
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS giveaway_snapshots (
+                    message_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER,
+                    channel_id INTEGER,
+                    prize TEXT,
+                    weight_by TEXT,
+                    entrants BLOB,
+                    weights BLOB,
+                    winners BLOB,
+                    ended_at INTEGER
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_giveaway_snapshots_ended_at ON giveaway_snapshots (ended_at)"
+            )
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS entries (
                     giveaway_message_id INTEGER,
@@ -101,10 +180,114 @@ async def create_database_tables(db_path: str) -> None:
                     guild INTEGER PRIMARY KEY
                 )
             """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_settings (
+                    guild_id INTEGER PRIMARY KEY,
+                    mode TEXT DEFAULT 'channel'
+                )
+            """)
+            # Ticket registry; open tickets are mirrored in memory by the ticket cog
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS tickets (
+                    channel_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER,
+                    creator_id INTEGER,
+                    status TEXT DEFAULT 'open',
+                    opened_at INTEGER,
+                    closed_at INTEGER,
+                    last_activity INTEGER,
+                    idle_warned_at INTEGER,
+                    first_response_at INTEGER,
+                    first_responder_id INTEGER
+                )
+            """)
+            await add_missing_columns(db, "tickets", {
+                "last_activity": "INTEGER",
+                "idle_warned_at": "INTEGER",
+                "first_response_at": "INTEGER",
+                "first_responder_id": "INTEGER"
+            })
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets (status)"
+            )
+            # Content-addressed attachment blobs (files under db/blobs) and the archived attachments using them
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER,
+                    refcount INTEGER DEFAULT 0,
+                    created_at INTEGER
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_attachments (
+                    ticket_id INTEGER,
+                    attachment_id INTEGER,
+                    message_id INTEGER,
+                    filename TEXT,
+                    sha256 TEXT,
+                    PRIMARY KEY (ticket_id, attachment_id)
+                )
+            """)
+            # Daily response/resolution rollups; histogram is a JSON map of log bucket -> count
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_stats (
+                    day TEXT,
+                    guild_id INTEGER,
+                    moderator_id INTEGER,
+                    metric TEXT,
+                    count INTEGER,
+                    total REAL,
+                    histogram TEXT,
+                    PRIMARY KEY (guild_id, day, moderator_id, metric)
+                )
+            """)
+            # Archived tickets and their messages, indexed for /ticket search
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_archive (
+                    ticket_id INTEGER PRIMARY KEY,
+                    guild_id INTEGER,
+                    channel_name TEXT,
+                    closed_by INTEGER,
+                    closed_at INTEGER,
+                    message_count INTEGER DEFAULT 0
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ticket_archive_guild ON ticket_archive (guild_id, closed_at)"
+            )
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS ticket_messages USING fts5(
+                    content,
+                    author,
+                    ticket_id UNINDEXED,
+                    author_id UNINDEXED,
+                    message_id UNINDEXED,
+                    created_at UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
         
         await db.commit()
 
 
+async def add_missing_columns(db: aiosqlite.Connection, table: str, columns: dict) -> None:
+    """
+    Add columns introduced after a table was first created
+    
+    Args:
+        db: Open database connection
+        table: Table name
+        columns: Mapping of column name to column definition
+    """
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    
+    for name, definition in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
 def get_sync_connection(db_path: str) -> sqlite3.Connection:
     """
     Get a synchronous database connection
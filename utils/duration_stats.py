@@ -0,0 +1,87 @@
+"""
+Duration histograms
+
+Log-bucketed histograms for response and resolution times. Each bucket is
+5% wider than the one before, so any percentile is known to within about 5%
+while a month-long range still needs only ~300 buckets. Histograms merge by
+adding bucket counts, which lets daily rollups be combined into any range
+without keeping individual samples.
+"""
+import json
+import math
+from typing import Dict
+
+
+GROWTH = 1.05
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class DurationHistogram:
+    """Sparse log-bucketed histogram of durations in seconds"""
+
+    __slots__ = ('buckets', 'count', 'total')
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        seconds = max(seconds, 0.0)
+        bucket = int(math.log1p(seconds) / _LOG_GROWTH)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other: "DurationHistogram") -> None:
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            Duration in seconds (the geometric middle of the matching bucket), 0 if empty
+        """
+        if not self.count:
+            return 0.0
+
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return math.expm1((bucket + 0.5) * _LOG_GROWTH)
+        return math.expm1((max(self.buckets) + 0.5) * _LOG_GROWTH)
+
+    def dumps(self) -> str:
+        return json.dumps(self.buckets, separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, buckets: str, count: int, total: float) -> "DurationHistogram":
+        histogram = cls()
+        histogram.buckets = {int(bucket): n for bucket, n in json.loads(buckets).items()}
+        histogram.count = count
+        histogram.total = total
+        return histogram
+
+
+def format_duration(seconds: float) -> str:
+    """Short human-readable duration, e.g. 45s, 12m, 3.5h, 2.1d"""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
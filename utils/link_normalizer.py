@@ -0,0 +1,127 @@
+"""
+Link normalization utilities
+
+Folds common link obfuscation (fullwidth characters, zero-width joiners,
+``hxxps://``, ``discord . gg``, ``[.]``, markdown masking) into a canonical
+form so the anti-link patterns only have to match one spelling.
+"""
+import re
+import discord
+
+
+# Characters that are removed outright: zero-width/bidi marks and markdown noise
+_STRIP_CHARS = (
+    "­᠎​‌‍‎‏⁠﻿"
+    "‪‫‬‭‮⁦⁧⁨⁩"
+    "\\`*_~|<>"
+)
+
+# Lookalikes that are folded onto their ASCII counterpart
+_LOOKALIKES = {
+    ".": "。｡․‧﹒·۔٫",
+    "/": "⁄∕⧸",
+    ":": "꞉ː",
+    " ": "　              ",
+}
+
+
+def _build_translation_table() -> dict:
+    """
+    Build the str.translate table used by normalize_link_text
+
+    Returns:
+        Mapping of code points to replacement strings (or None to delete)
+    """
+    table = {}
+
+    # Fullwidth ASCII (U+FF01-U+FF5E) maps onto printable ASCII
+    for code_point in range(0xFF01, 0xFF5F):
+        table[code_point] = chr(code_point - 0xFEE0).lower()
+
+    for replacement, lookalikes in _LOOKALIKES.items():
+        for char in lookalikes:
+            table[ord(char)] = replacement
+
+    for char in _STRIP_CHARS:
+        table[ord(char)] = None
+
+    return table
+
+
+_TRANSLATION_TABLE = _build_translation_table()
+
+# Case is folded after de-obfuscation, so "discord. Com" can still be told apart from a link
+_LOWER_TABLE = {code_point: code_point + 32 for code_point in range(ord("A"), ord("Z") + 1)}
+
+# A spaced dot is only folded in front of a TLD or invite host: "discord . gg" is a link,
+# "see you on discord. GG everyone" is a sentence
+_LINK_TAIL = r"(?:gg|com|net|org|io|me|co|app|xyz|ly|link|gift|invite|ru|tk|info|biz)\b"
+
+# One alternation so the de-obfuscation pass is a single scan over the text
+_DEOBFUSCATE_PATTERN = re.compile(
+    r"\[(?P<label>[^\]\n]*)\]\((?P<target>[^)\s]*)\)"
+    r"|(?P<scheme>(?i:hxxps?))"
+    r"|(?P<colon>\s*:\s*/\s*/\s*)"
+    r"|(?P<slash>(?<=\w)\s+/\s*(?=\w)|(?<=\w)\s*/\s+(?=\w))"
+    r"|(?P<dot>\s*(?i:\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\)|\{dot\})\s*"
+    rf"|(?<=\w)\s+(?i:\.|dot)\s+(?=(?i:{_LINK_TAIL}))|(?<=\w)\s+\.(?=(?i:{_LINK_TAIL}))"
+    # "word. Tld" is how sentences look, so that form needs a lowercase TLD followed by a path
+    rf"|(?<=\w)\.\s+(?={_LINK_TAIL}[/.]))"
+)
+
+
+def _fold_match(match: re.Match) -> str:
+    """Replacement callback for the de-obfuscation pass"""
+    kind = match.lastgroup
+
+    if kind == "target":
+        # Masked link: keep both the visible label and the real target
+        label = _DEOBFUSCATE_PATTERN.sub(_fold_match, match.group("label"))
+        target = _DEOBFUSCATE_PATTERN.sub(_fold_match, match.group("target"))
+        return f"{label} {target}"
+    if kind == "scheme":
+        return match.group().lower().replace("xx", "tt")
+    if kind == "colon":
+        return "://"
+    if kind == "slash":
+        return "/"
+    return "."
+
+
+def normalize_link_text(text: str) -> str:
+    """
+    Fold obfuscated links into canonical, lowercase form
+
+    Args:
+        text: Raw message text
+
+    Returns:
+        Normalized text suitable for link pattern matching
+    """
+    if not text:
+        return ""
+
+    folded = _DEOBFUSCATE_PATTERN.sub(_fold_match, text.translate(_TRANSLATION_TABLE))
+    return folded.translate(_LOWER_TABLE)
+
+
+def collect_message_text(message: discord.Message) -> str:
+    """
+    Gather every user-controlled string of a message that can carry a link
+
+    Args:
+        message: Message to collect text from
+
+    Returns:
+        Message content, embed URLs and attachment filenames joined by newlines
+    """
+    parts = [message.content] if message.content else []
+
+    for embed in message.embeds:
+        if embed.url:
+            parts.append(embed.url)
+
+    for attachment in message.attachments:
+        parts.append(attachment.filename)
+
+    return "\n".join(parts)
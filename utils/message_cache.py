@@ -0,0 +1,75 @@
+"""
+Message edit helpers
+
+Lets message filters rescan edited messages without re-running on the
+(far more common) edits that do not touch the message text.
+"""
+from collections import OrderedDict
+from typing import Optional
+import discord
+from discord.ext import commands
+
+
+class EditDedupeCache:
+    """Bounded LRU of message_id -> content hash"""
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._hashes: "OrderedDict[int, int]" = OrderedDict()
+
+    def remember(self, message_id: int, content: str) -> None:
+        """
+        Record the current content of a message
+
+        Args:
+            message_id: Message ID
+            content: Message text
+        """
+        self._hashes[message_id] = hash(content)
+        self._hashes.move_to_end(message_id)
+
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+
+    def changed(self, message_id: int, content: str) -> bool:
+        """
+        Check whether an edit changed the message text, remembering the new text
+
+        Args:
+            message_id: Message ID
+            content: Edited message text
+
+        Returns:
+            True if the text differs from the last seen version (or is unknown)
+        """
+        content_hash = hash(content)
+        if self._hashes.get(message_id) == content_hash:
+            self._hashes.move_to_end(message_id)
+            return False
+
+        self.remember(message_id, content)
+        return True
+
+
+def message_from_edit_payload(
+    bot: commands.Bot,
+    payload: discord.RawMessageUpdateEvent
+) -> Optional[discord.Message]:
+    """
+    Build a Message from a raw edit payload without a REST fetch
+
+    Args:
+        bot: Bot instance
+        payload: Raw message update event
+
+    Returns:
+        Message object, or None if the payload is partial or the channel is unknown
+    """
+    channel = bot.get_channel(payload.channel_id)
+    if channel is None or 'author' not in payload.data:
+        return None
+
+    try:
+        return discord.Message(state=bot._connection, channel=channel, data=payload.data)
+    except (KeyError, TypeError, ValueError):
+        return None
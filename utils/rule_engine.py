@@ -0,0 +1,351 @@
+"""
+Declarative automod rule engine
+
+Rules are plain dicts (stored per guild in settings.json) and are compiled
+into one evaluation function per guild. Message features such as normalized
+text, matched domains and mention counts are computed at most once per
+message and shared by every rule, and evaluation stops at the first rule
+that matches.
+
+Example rule::
+
+    {
+        "name": "no-invites",
+        "conditions": {
+            "domains": ["discord.gg", "discord.com/invite"],
+            "regex": ["free\\\\s+nitro"],
+            "min_mentions": 5,
+            "roles": [],
+            "exempt_roles": [1234567890],
+            "channels": [],
+            "exempt_channels": []
+        },
+        "actions": ["delete", "timeout", "log"],
+        "timeout_minutes": 10,
+        "mode": "enforce"
+    }
+
+Rules in ``"shadow"`` mode are evaluated against live traffic but never
+act; every rule records hit counts, sample matches and evaluation time.
+"""
+import re
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+import discord
+from .link_normalizer import normalize_link_text, collect_message_text
+
+
+VALID_ACTIONS = ("delete", "timeout", "kick", "log")
+VALID_MODES = ("enforce", "shadow")
+VALID_CONDITIONS = (
+    "regex",
+    "domains",
+    "min_mentions",
+    "roles",
+    "exempt_roles",
+    "channels",
+    "exempt_channels"
+)
+
+# Conditions that select messages; exempt_* conditions only narrow a selection
+POSITIVE_CONDITIONS = ("regex", "domains", "min_mentions", "roles", "channels")
+
+
+class MessageFeatures:
+    """Lazily computed message features shared by all rules of a guild"""
+
+    __slots__ = (
+        'message', 'channel_ids', '_domain_regex', '_domain_covers', '_regex_prefilter',
+        '_role_ids', '_text', '_domain_hits', '_regex_hit'
+    )
+
+    def __init__(self, message: discord.Message, domain_regex=None, domain_covers=None, regex_prefilter=None):
+        self.message = message
+        self._domain_regex = domain_regex
+        self._domain_covers = domain_covers
+        self._regex_prefilter = regex_prefilter
+
+        # Threads inherit channel conditions from their parent channel
+        channel = message.channel
+        parent_id = getattr(channel, 'parent_id', None)
+        self.channel_ids = {channel.id, parent_id} if parent_id else {channel.id}
+
+        self._role_ids = None
+        self._text = None
+        self._domain_hits = None
+        self._regex_hit = None
+
+    @property
+    def role_ids(self) -> set:
+        if self._role_ids is None:
+            self._role_ids = {role.id for role in getattr(self.message.author, 'roles', ())}
+        return self._role_ids
+
+    @property
+    def mention_count(self) -> int:
+        return len(self.message.raw_mentions) + len(self.message.raw_role_mentions)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = normalize_link_text(collect_message_text(self.message))
+        return self._text
+
+    @property
+    def domain_hits(self) -> set:
+        """Configured domains found in the text, from one scan shared by all rules"""
+        if self._domain_hits is None:
+            self._domain_hits = set()
+            if self._domain_regex is not None:
+                for hit in set(self._domain_regex.findall(self.text)):
+                    self._domain_hits |= self._domain_covers[hit]
+        return self._domain_hits
+
+    @property
+    def regex_hit(self) -> bool:
+        """False when the union of every rule regex misses, so no regex condition can match"""
+        if self._regex_hit is None:
+            self._regex_hit = self._regex_prefilter is None or self._regex_prefilter.search(self.text) is not None
+        return self._regex_hit
+
+
+class RuleStats:
+    """In-memory hit and cost counters for one rule"""
+
+    __slots__ = ('evaluated', 'hits', 'total_ns', 'max_ns', 'samples')
+
+    def __init__(self, sample_size: int = 5):
+        self.evaluated = 0
+        self.hits = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.samples = deque(maxlen=sample_size)
+
+    def record(self, elapsed_ns: int, hit: bool, message: discord.Message) -> None:
+        self.evaluated += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+        if hit:
+            self.hits += 1
+            self.samples.append((message.author.id, message.jump_url, (message.content or "")[:100]))
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.evaluated if self.evaluated else 0.0
+
+    @property
+    def avg_ns(self) -> float:
+        return self.total_ns / self.evaluated if self.evaluated else 0.0
+
+
+def _prefilter_safe(regex: re.Pattern) -> bool:
+    """
+    Whether a pattern can be merged into the prefilter union unchanged
+
+    Capture groups are renumbered inside a union, which breaks backreferences
+    and conditionals, and inline global flags are rejected mid-pattern.
+    """
+    if regex.groups:
+        return False
+    try:
+        re.compile(f"(?:{regex.pattern})", re.IGNORECASE)
+    except re.error:
+        return False
+    return True
+
+
+def build_regex_prefilter(regexes: List[re.Pattern]) -> Optional[re.Pattern]:
+    """
+    Build the union of every pattern that can be merged safely
+
+    Args:
+        regexes: Compiled rule patterns
+
+    Returns:
+        Case-insensitive union pattern, or None if no pattern can be merged
+    """
+    patterns = list(dict.fromkeys(r.pattern for r in regexes if _prefilter_safe(r)))
+    if not patterns:
+        return None
+    return re.compile('|'.join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+class CompiledRule:
+    """A validated rule with its precompiled per-rule checks"""
+
+    __slots__ = (
+        'name', 'spec', 'actions', 'timeout_minutes', 'reason', 'shadow',
+        'stats', 'checks', 'domains', 'regexes'
+    )
+
+    def __init__(self, spec: dict, stats: Optional[RuleStats] = None):
+        self.spec = spec
+        self.name = spec['name']
+        self.shadow = spec.get('mode', 'enforce') == 'shadow'
+        self.stats = stats if stats is not None else RuleStats()
+        self.actions = tuple(spec.get('actions', []))
+        self.timeout_minutes = spec.get('timeout_minutes', 5)
+        self.reason = spec.get('reason') or f"Automod rule: {self.name}"
+
+        conditions = spec.get('conditions', {})
+        self.domains = frozenset(domain.lower() for domain in conditions.get('domains', []))
+        self.regexes = [re.compile(pattern, re.IGNORECASE) for pattern in conditions.get('regex', [])]
+        self.checks = self._build_checks(conditions)
+
+    def _build_checks(self, conditions: dict) -> List[Callable[[MessageFeatures], bool]]:
+        """Build condition checks ordered from cheapest to most expensive"""
+        checks = []
+
+        channels = frozenset(conditions.get('channels', []))
+        if channels:
+            checks.append(lambda f: not channels.isdisjoint(f.channel_ids))
+
+        exempt_channels = frozenset(conditions.get('exempt_channels', []))
+        if exempt_channels:
+            checks.append(lambda f: exempt_channels.isdisjoint(f.channel_ids))
+
+        roles = frozenset(conditions.get('roles', []))
+        if roles:
+            checks.append(lambda f: not roles.isdisjoint(f.role_ids))
+
+        exempt_roles = frozenset(conditions.get('exempt_roles', []))
+        if exempt_roles:
+            checks.append(lambda f: exempt_roles.isdisjoint(f.role_ids))
+
+        min_mentions = conditions.get('min_mentions')
+        if min_mentions:
+            checks.append(lambda f: f.mention_count >= min_mentions)
+
+        if self.domains:
+            domains = self.domains
+            checks.append(lambda f: not domains.isdisjoint(f.domain_hits))
+
+        if self.regexes:
+            regexes = self.regexes
+            if all(_prefilter_safe(r) for r in regexes):
+                checks.append(lambda f: f.regex_hit and any(r.search(f.text) for r in regexes))
+            else:
+                # At least one pattern is not in the prefilter union, so a union miss proves nothing
+                checks.append(lambda f: any(r.search(f.text) for r in regexes))
+
+        return checks
+
+    def matches(self, features: MessageFeatures) -> bool:
+        for check in self.checks:
+            if not check(features):
+                return False
+        return True
+
+
+def validate_rule(spec: dict) -> None:
+    """
+    Validate a rule spec
+
+    Args:
+        spec: Rule dictionary
+
+    Raises:
+        ValueError: If the rule is malformed
+    """
+    if not isinstance(spec, dict) or not spec.get('name'):
+        raise ValueError("Rule must be an object with a 'name'.")
+
+    conditions = spec.get('conditions', {})
+    if not isinstance(conditions, dict) or not conditions:
+        raise ValueError(f"Rule '{spec['name']}' needs at least one condition.")
+
+    unknown = set(conditions) - set(VALID_CONDITIONS)
+    if unknown:
+        raise ValueError(f"Unknown condition(s): {', '.join(sorted(unknown))}")
+
+    # Empty conditions add no check, so a rule without a positive one would match every message
+    if not any(conditions.get(name) for name in POSITIVE_CONDITIONS):
+        raise ValueError(
+            f"Rule '{spec['name']}' needs a non-empty {', '.join(POSITIVE_CONDITIONS)} condition."
+        )
+
+    min_mentions = conditions.get('min_mentions', 0)
+    if not isinstance(min_mentions, int) or min_mentions < 0:
+        raise ValueError("min_mentions must be a non-negative integer.")
+
+    if spec.get('mode', 'enforce') not in VALID_MODES:
+        raise ValueError(f"Mode must be one of: {', '.join(VALID_MODES)}")
+
+    actions = spec.get('actions', [])
+    if not actions or any(action not in VALID_ACTIONS for action in actions):
+        raise ValueError(f"Actions must be a non-empty list of: {', '.join(VALID_ACTIONS)}")
+
+    for pattern in conditions.get('regex', []):
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid regex {pattern!r}: {e}") from e
+
+
+def compile_guild_rules(
+    rules: List[dict],
+    stats: Optional[Dict[str, RuleStats]] = None
+) -> Callable[[discord.Message], Optional[CompiledRule]]:
+    """
+    Compile a guild's rules into a single evaluation function
+
+    Enforced rules stop at the first match; shadow rules are always evaluated
+    but never returned. The time spent computing a shared feature is charged
+    to the first rule that needs it.
+
+    Args:
+        rules: Rule specs in priority order
+        stats: Counters keyed by rule name, kept across recompiles
+
+    Returns:
+        Function taking a message and returning the first matching enforced rule or None
+
+    Raises:
+        ValueError: If any rule is malformed
+    """
+    for spec in rules:
+        validate_rule(spec)
+
+    if stats is None:
+        stats = {}
+    compiled = [CompiledRule(spec, stats.setdefault(spec['name'], RuleStats())) for spec in rules]
+    assert all(rule.checks for rule in compiled), "every validated rule has at least one check"
+
+    # Once an enforced rule matched, only shadow rules after it still need evaluating
+    last_shadow = max((i for i, rule in enumerate(compiled) if rule.shadow), default=-1)
+
+    # One union pattern per guild: a single scan finds every configured domain
+    all_domains = sorted({domain for rule in compiled for domain in rule.domains}, key=len, reverse=True)
+    domain_regex = re.compile('|'.join(re.escape(d) for d in all_domains)) if all_domains else None
+
+    # A hit on "discord.com/invite" also counts as a hit on "discord.com"
+    domain_covers = {d: {other for other in all_domains if other in d} for d in all_domains}
+
+    # Prefilter: if the union misses, no regex condition of a rule whose patterns are all in it can match
+    regex_prefilter = build_regex_prefilter([r for rule in compiled for r in rule.regexes])
+
+    def evaluate(message: discord.Message) -> Optional[CompiledRule]:
+        features = MessageFeatures(message, domain_regex, domain_covers, regex_prefilter)
+        matched = None
+
+        for index, rule in enumerate(compiled):
+            if matched is not None:
+                if index > last_shadow:
+                    break
+                if not rule.shadow:
+                    continue
+
+            start = time.perf_counter_ns()
+            hit = rule.matches(features)
+            rule.stats.record(time.perf_counter_ns() - start, hit, message)
+
+            if hit and not rule.shadow:
+                matched = rule
+
+        return matched
+
+    evaluate.rules = compiled
+    return evaluate
@@ -0,0 +1,104 @@
+"""
+Weighted random sampling
+
+Vose's alias method: O(n) to build, O(1) per draw. Used to pick giveaway
+winners weighted by invites or level from large entrant pools.
+"""
+import random
+from typing import List, Optional, Sequence, TypeVar
+
+
+T = TypeVar("T")
+
+
+class AliasTable:
+    """Alias table over a sequence of non-negative weights"""
+
+    __slots__ = ('probability', 'alias', 'size')
+
+    def __init__(self, weights: Sequence[float]):
+        size = len(weights)
+        total = float(sum(weights))
+        if size == 0 or total <= 0:
+            raise ValueError("Alias table needs at least one positive weight.")
+
+        self.size = size
+        self.probability = [0.0] * size
+        self.alias = [0] * size
+
+        scaled = [w * size / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.probability[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # Leftovers are 1.0 up to floating point error
+        for i in large + small:
+            self.probability[i] = 1.0
+
+    def draw(self, rng: random.Random = random) -> int:
+        """
+        Draw one index
+
+        Args:
+            rng: Random number generator
+
+        Returns:
+            Index into the weights the table was built from
+        """
+        i = int(rng.random() * self.size)
+        return i if rng.random() < self.probability[i] else self.alias[i]
+
+
+def weighted_sample(
+    items: Sequence[T],
+    weights: Optional[Sequence[float]],
+    k: int,
+    rng: random.Random = random
+) -> List[T]:
+    """
+    Sample k distinct items, each draw proportional to its weight
+
+    Draws that hit an already picked item are rejected. The alias table is
+    rebuilt over the remaining items only once the picked items hold half of
+    the weight, so the expected number of draws per winner stays below two.
+
+    Args:
+        items: Population
+        weights: Non-negative weight per item, or None for a uniform draw
+        k: Number of items to pick
+        rng: Random number generator
+
+    Returns:
+        Up to k distinct items (fewer if fewer have positive weight)
+    """
+    if weights is None:
+        return rng.sample(list(items), k=min(k, len(items)))
+
+    pool = [(item, w) for item, w in zip(items, weights) if w > 0]
+    k = min(k, len(pool))
+    picked = []
+
+    while len(picked) < k:
+        table = AliasTable([w for _, w in pool])
+        total = sum(w for _, w in pool)
+        chosen = set()
+        chosen_weight = 0.0
+
+        while len(picked) < k and chosen_weight * 2 < total:
+            index = table.draw(rng)
+            if index in chosen:
+                continue
+            chosen.add(index)
+            chosen_weight += pool[index][1]
+            picked.append(pool[index][0])
+
+        pool = [entry for i, entry in enumerate(pool) if i not in chosen]
+
+    return picked
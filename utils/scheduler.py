@@ -0,0 +1,117 @@
+"""
+Deadline scheduler
+
+A single asyncio task driven by a min-heap of absolute deadlines. It sleeps
+until the earliest deadline (or until an earlier one is scheduled), so any
+number of pending deadlines costs one task and no polling.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class DeadlineScheduler:
+    """Run a callback for each key when its unix-timestamp deadline passes"""
+
+    def __init__(self, callback: Callable[[Hashable], Awaitable[None]], name: str = "scheduler"):
+        self.callback = callback
+        self.name = name
+        self._heap = []
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """
+        Schedule (or reschedule) a key
+
+        Args:
+            key: Identifier passed to the callback
+            deadline: Unix timestamp at which the callback should run
+        """
+        seq = next(self._counter)
+        self._entries[key] = (deadline, seq)
+        heapq.heappush(self._heap, (deadline, seq, key))
+
+        # Only an entry that becomes the new head changes when the runner must wake
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Cancel a scheduled key
+
+        Args:
+            key: Identifier to cancel
+
+        Returns:
+            True if the key was scheduled
+        """
+        # Heap entries are discarded lazily when they reach the top
+        return self._entries.pop(key, None) is not None
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def start(self) -> None:
+        """Start the runner task if it is not already running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    def stop(self) -> None:
+        """Stop the runner task; scheduled keys are kept"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_stale(self) -> None:
+        while self._heap:
+            deadline, seq, key = self._heap[0]
+            if self._entries.get(key) == (deadline, seq):
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self) -> None:
+        while True:
+            self._pop_stale()
+
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Delay is recomputed from the wall clock every time, so it never drifts
+            deadline, _, key = self._heap[0]
+            delay = deadline - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._entries[key]
+
+            # Run callbacks concurrently so a slow one does not delay later deadlines
+            task = asyncio.create_task(self._fire(key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key: Hashable) -> None:
+        try:
+            await self.callback(key)
+        except Exception as e:
+            print(f"[ERROR] {self.name} callback failed for {key}: {e}")
@@ -0,0 +1,319 @@
+"""
+Ticket transcripts
+
+Streams a channel's history into gzip-compressed JSONL and HTML files.
+Messages are converted to plain dicts on the event loop in small batches;
+rendering and compression of each batch run in an executor while the next
+page of history is being fetched, so memory stays bounded by the batch size
+no matter how long the ticket is. The same batches can be indexed into the
+tickets database's FTS5 table for /ticket search, and their attachments
+saved to the blob store so transcripts outlive Discord's CDN links.
+"""
+import asyncio
+import gzip
+import html
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import List, Optional, Tuple
+import discord
+
+
+# Messages converted per executor hand-off (history pages are 100 messages)
+BATCH_SIZE = 500
+
+# Discord accepts at most 10 attachments per message
+MAX_FILES_PER_MESSAGE = 10
+COPY_CHUNK_SIZE = 1024 * 1024
+
+HTML_HEADER = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Transcript #{name}</title>
+<style>
+body {{ background: #313338; color: #dbdee1; font-family: sans-serif; margin: 24px; }}
+.msg {{ padding: 4px 0; border-bottom: 1px solid #3f4147; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+.time {{ color: #949ba4; font-size: 12px; margin-left: 6px; }}
+.content {{ white-space: pre-wrap; }}
+.attachment, .embed {{ color: #00a8fc; font-size: 13px; }}
+</style>
+</head>
+<body>
+<h2>#{name}</h2>
+"""
+
+HTML_FOOTER = "<p>{count} message(s)</p>\n</body>\n</html>\n"
+
+
+def message_to_record(message: discord.Message) -> dict:
+    """
+    Convert a message into a JSON-serialisable transcript record
+
+    Args:
+        message: Message to convert
+
+    Returns:
+        Dictionary with the fields kept in transcripts
+    """
+    return {
+        'id': message.id,
+        'author_id': message.author.id,
+        'author': str(message.author),
+        'bot': message.author.bot,
+        'created_at': message.created_at.isoformat(),
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+        'content': message.content,
+        'attachments': [
+            {
+                'id': attachment.id,
+                'filename': attachment.filename,
+                'url': attachment.url,
+                'size': attachment.size
+            }
+            for attachment in message.attachments
+        ],
+        'embeds': [embed.title or embed.description or "" for embed in message.embeds]
+    }
+
+
+def render_record_html(record: dict) -> str:
+    """Render one transcript record as an HTML block"""
+    parts = [
+        '<div class="msg">',
+        f'<span class="author">{html.escape(record["author"])}</span>',
+        f'<span class="time">{html.escape(record["created_at"][:19].replace("T", " "))}</span>',
+        f'<div class="content">{html.escape(record["content"])}</div>'
+    ]
+    for attachment in record['attachments']:
+        url = html.escape(attachment['url'])
+        stored = f' <span class="time">sha256:{attachment["sha256"]}</span>' if 'sha256' in attachment else ''
+        parts.append(f'<div class="attachment"><a href="{url}">{html.escape(attachment["filename"])}</a>{stored}</div>')
+    for text in record['embeds']:
+        parts.append(f'<div class="embed">[embed] {html.escape(text[:200])}</div>')
+    parts.append('</div>\n')
+    return "".join(parts)
+
+
+def fts_query(text: str) -> str:
+    """Quote every term of a user query so FTS5 operators cannot break it"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+class TranscriptIndex:
+    """Batched FTS5 indexing of one ticket's messages; every method is blocking"""
+
+    def __init__(self, db_path: str, ticket_id: int, guild_id: int, channel_name: str, closed_by: int):
+        self.ticket_id = ticket_id
+        self.guild_id = guild_id
+        self.channel_name = channel_name
+        self.closed_by = closed_by
+
+        # Batches run on executor threads, one at a time
+        self.con = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+
+        # ticket_id is UNINDEXED, so deleting by it scans the whole index; only a ticket
+        # whose earlier close failed part-way (archive row present) needs it
+        retried = self.con.execute(
+            "SELECT 1 FROM ticket_archive WHERE ticket_id = ?", (ticket_id,)
+        ).fetchone() is not None
+        if retried:
+            self.con.execute("DELETE FROM ticket_messages WHERE ticket_id = ?", (ticket_id,))
+        self.con.execute(
+            """
+            INSERT OR REPLACE INTO ticket_archive (ticket_id, guild_id, channel_name, closed_by, closed_at, message_count)
+            VALUES (?, ?, ?, ?, ?, 0)
+            """,
+            (ticket_id, guild_id, channel_name, closed_by, int(time.time()))
+        )
+        self.con.commit()
+
+    def add_batch(self, records: List[dict]) -> None:
+        """Index a batch of records in one transaction"""
+        self.con.executemany(
+            """
+            INSERT INTO ticket_messages (content, author, ticket_id, author_id, message_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    record['content'],
+                    record['author'],
+                    self.ticket_id,
+                    record['author_id'],
+                    record['id'],
+                    record['created_at']
+                )
+                for record in records if record['content']
+            ]
+        )
+        self.con.commit()
+
+    def close(self, message_count: int) -> None:
+        """Record the archived message count and close the connection"""
+        self.con.execute(
+            "UPDATE ticket_archive SET closed_at = ?, message_count = ? WHERE ticket_id = ?",
+            (int(time.time()), message_count, self.ticket_id)
+        )
+        self.con.commit()
+        self.con.close()
+
+
+class TranscriptWriter:
+    """Incremental gzip JSONL + HTML writer; every method is blocking"""
+
+    def __init__(self, channel_name: str, directory: Optional[str] = None, index: Optional[TranscriptIndex] = None):
+        self.index = index
+        self.directory = tempfile.mkdtemp(prefix="transcript-", dir=directory)
+        self.jsonl_path = os.path.join(self.directory, f"{channel_name}.jsonl.gz")
+        self.html_path = os.path.join(self.directory, f"{channel_name}.html.gz")
+        self.count = 0
+
+        self._jsonl = gzip.open(self.jsonl_path, "wt", encoding="utf-8")
+        self._html = gzip.open(self.html_path, "wt", encoding="utf-8")
+        self._html.write(HTML_HEADER.format(name=html.escape(channel_name)))
+
+    def write_batch(self, records: List[dict]) -> None:
+        """Render and compress a batch of records"""
+        self._jsonl.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._html.write("".join(render_record_html(record) for record in records))
+        self.count += len(records)
+        if self.index is not None:
+            self.index.add_batch(records)
+
+    def close(self) -> None:
+        """Write the HTML footer and flush both files"""
+        self._html.write(HTML_FOOTER.format(count=self.count))
+        self._html.close()
+        self._jsonl.close()
+        if self.index is not None:
+            self.index.close(self.count)
+            self.index = None
+
+    def cleanup(self) -> None:
+        """Delete the transcript files and any parts split from them"""
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+
+async def build_transcript(channel: discord.TextChannel, index_factory=None, blob_store=None) -> TranscriptWriter:
+    """
+    Stream a channel's full history into transcript files
+
+    Args:
+        channel: Channel to archive
+        index_factory: Optional blocking callable returning a TranscriptIndex to fill
+        blob_store: Optional BlobStore; attachments are stored and referenced by hash
+
+    Returns:
+        Closed TranscriptWriter; call cleanup() once the files are uploaded
+    """
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(None, index_factory) if index_factory else None
+    writer = await loop.run_in_executor(None, TranscriptWriter, channel.name, None, index)
+    pending = None
+    batch = []
+
+    async def write(records):
+        # Attachments go first so the written records carry their blob hashes
+        if blob_store is not None:
+            await blob_store.store_attachments(channel.id, records)
+        await loop.run_in_executor(None, writer.write_batch, records)
+
+    try:
+        async for message in channel.history(limit=None, oldest_first=True):
+            batch.append(message_to_record(message))
+            if len(batch) < BATCH_SIZE:
+                continue
+
+            # At most one batch is being written while the next one is fetched
+            if pending is not None:
+                await pending
+            pending = asyncio.ensure_future(write(batch))
+            batch = []
+
+        if pending is not None:
+            await pending
+        if batch:
+            await write(batch)
+        await loop.run_in_executor(None, writer.close)
+    except BaseException:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        writer.index = None
+        if index is not None:
+            await loop.run_in_executor(None, index.con.close)
+        if blob_store is not None:
+            # The transcript is discarded, so are the references it made
+            await blob_store.release_ticket(channel.id)
+        await loop.run_in_executor(None, writer.close)
+        await loop.run_in_executor(None, writer.cleanup)
+        raise
+
+    return writer
+
+
+def _split_file(path: str, part_size: int) -> List[str]:
+    """Cut a file into ``.partN`` pieces of at most part_size bytes that concatenate back into it"""
+    parts = []
+    with open(path, "rb") as source:
+        while True:
+            part_path = f"{path}.part{len(parts) + 1}"
+            written = 0
+            with open(part_path, "wb") as part:
+                while written < part_size:
+                    chunk = source.read(min(COPY_CHUNK_SIZE, part_size - written))
+                    if not chunk:
+                        break
+                    part.write(chunk)
+                    written += len(chunk)
+            if not written:
+                os.remove(part_path)
+                break
+            parts.append(part_path)
+    return parts
+
+
+def transcript_uploads(writer: TranscriptWriter, size_limit: int) -> List[List[str]]:
+    """
+    Group a finished transcript's files into uploads that fit the guild's limit
+
+    Files larger than the limit are split into ``.partN`` pieces, so nothing is
+    left behind when the ticket is deleted. Blocking; run it in an executor.
+
+    Args:
+        writer: Finished transcript writer
+        size_limit: Maximum upload size per message in bytes (``guild.filesize_limit``)
+
+    Returns:
+        File paths grouped per message, in upload order
+    """
+    paths = []
+    for path in (writer.jsonl_path, writer.html_path):
+        if os.path.getsize(path) > size_limit:
+            paths.extend(_split_file(path, size_limit))
+        else:
+            paths.append(path)
+
+    uploads = []
+    current, current_size = [], 0
+    for path in paths:
+        size = os.path.getsize(path)
+        if current and (current_size + size > size_limit or len(current) >= MAX_FILES_PER_MESSAGE):
+            uploads.append(current)
+            current, current_size = [], 0
+        current.append(path)
+        current_size += size
+    if current:
+        uploads.append(current)
+    return uploads